@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures overhead of retry decorators
+
+Scenarios:
+    success   overhead of decorated call which doesn't fail
+    failure   cost of a failed attempt (delays are simulated)
+    threads   throughput of decorated calls from concurrent threads
+    logger    cost of logger lookup and disabled retry warnings
+    import    import time of the package in a fresh interpreter
+    simulation  cost of a simulated call with 20% of failed attempts
+
+Results are printed as a table or written as JSON to compare runs:
+
+    PYTHONPATH=. python benchmarks/suite.py --json before.json
+    PYTHONPATH=. python benchmarks/suite.py --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+from retrylib import budget
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib import network
+from retrylib import registry
+from retrylib import shared
+from retrylib import simulation
+
+
+REPEAT = 3
+
+
+class FailingError(Exception):
+    pass
+
+
+def plain(value):
+    return value
+
+
+def measure(func, number):
+    """Returns the best time of func call in nanoseconds"""
+    elapsed = min(timeit.repeat(func, number=number, repeat=REPEAT))
+    return elapsed / number * 1e9
+
+
+def success_scenario(number):
+    cases = [
+        ("undecorated", plain),
+        ("decorators.retry", decorators.retry(3, delay=1)(plain)),
+        ("decorators.retry(retry_on=func)", decorators.retry(
+            3, delay=1, retry_on=network.is_network_failure)(plain)),
+        ("decorators.retry(circuit_breaker, retry_budget)",
+         decorators.retry(3, delay=1,
+                          circuit_breaker=circuit.CircuitBreaker(),
+                          retry_budget=budget.RetryBudget())(plain)),
+        ("decorators.retry(shared circuit_breaker, retry_budget)",
+         decorators.retry(
+             3, delay=1,
+             circuit_breaker=shared.SharedCircuitBreaker(
+                 shared.MemoryBackend(), "benchmark"),
+             retry_budget=shared.SharedRetryBudget(
+                 shared.MemoryBackend(), "benchmark"))(plain)),
+        ("network.retry()", network.retry()(plain)),
+        ("network.retry(3, delay=1)", network.retry(3, delay=1)(plain)),
+        ("registry.retry(name)", registry.PolicyRegistry(
+            {"name": {"attempts_number": 3, "delay": 1}}).retry(
+                "name")(plain)),
+    ]
+    for name, func in cases:
+        yield name, measure(lambda: func(1), number)
+
+
+def failure_scenario(number):
+    attempts = 5
+    number = max(number // (attempts * 10), 1)
+
+    def raise_and_catch():
+        for _ in range(attempts - 1):
+            try:
+                raise FailingError()
+            except FailingError:
+                pass
+
+    state = {"failures": 0}
+
+    def flaky():
+        if state["failures"] < attempts - 1:
+            state["failures"] += 1
+            raise FailingError()
+        state["failures"] = 0
+
+    cases = [
+        ("raise and catch", raise_and_catch),
+        ("decorators.retry", decorators.retry(
+            attempts, delay=1, step=1)(flaky)),
+        ("decorators.retry(retry_on=func)", decorators.retry(
+            attempts, delay=1, step=1,
+            retry_on=lambda e: isinstance(e, FailingError))(flaky)),
+        ("network.retry(retry_on=FailingError)", network.retry(
+            attempts, delay=1, retry_on=FailingError)(flaky)),
+    ]
+    with clocks.VirtualClock().patch():
+        for name, func in cases:
+            # Cost of one failed attempt
+            yield name, measure(func, number) / (attempts - 1)
+
+
+def run_threads(func, threads, number):
+    calls = number // threads
+
+    def worker():
+        for _ in range(calls):
+            func(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (time.time() - started) / (calls * threads) * 1e9
+
+
+def threads_scenario(number):
+    cases = [
+        ("undecorated", plain),
+        ("decorators.retry", decorators.retry(3, delay=1)(plain)),
+        ("decorators.retry(circuit_breaker, retry_budget)",
+         decorators.retry(3, delay=1,
+                          circuit_breaker=circuit.CircuitBreaker(),
+                          retry_budget=budget.RetryBudget())(plain)),
+    ]
+    for threads in (1, 4, 16):
+        for name, func in cases:
+            elapsed = min(run_threads(func, threads, number)
+                          for _ in range(REPEAT))
+            yield "%s, %s threads" % (name, threads), elapsed
+
+
+class WithLogger(object):
+
+    logger = logging.getLogger("benchmark")
+
+    def get_logger(self):
+        return self.logger
+
+
+class WithoutLogger(object):
+    pass
+
+
+def logger_scenario(number):
+    policy = decorators.RetryPolicy(3, logger=logging.getLogger("benchmark"))
+    with_logger = (WithLogger(), )
+    without_logger = (WithoutLogger(), )
+    disabled = logging.getLogger("benchmark.disabled")
+    disabled.setLevel(logging.ERROR)
+    error = FailingError()
+    cases = [
+        ("get_logger(function)", lambda: policy.get_logger(())),
+        ("get_logger(object with get_logger)",
+         lambda: policy.get_logger(with_logger)),
+        ("get_logger(object without get_logger)",
+         lambda: policy.get_logger(without_logger)),
+        ("log_retry(disabled logger)",
+         lambda: policy.log_retry(disabled, plain, error, 1, 1)),
+    ]
+    for name, func in cases:
+        yield name, measure(func, number)
+
+
+def import_scenario(number):
+    # Interpreters are started number // 20000 times (at least 5)
+    runs = max(number // 20000, 5)
+    cases = [("python -c pass", "pass"),
+             ("import retrylib", "import retrylib"),
+             ("import retrylib.decorators", "import retrylib.decorators"),
+             ("import retrylib.network", "import retrylib.network")]
+    for name, code in cases:
+        best = None
+        for _ in range(runs):
+            started = time.time()
+            subprocess.check_call([sys.executable, "-c", code])
+            elapsed = time.time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        yield name, best * 1e9
+
+
+def simulation_scenario(number):
+    calls = max(number // 10, 1)
+    model = simulation.BernoulliFailures(0.2, latency=0.05)
+
+    def simulate_shared_breaker():
+        clock = clocks.VirtualClock()
+        policy = decorators.RetryPolicy(
+            3, delay=1, circuit_breaker=circuit.CircuitBreaker(clock=clock))
+        simulation.simulate(policy, model, calls, 0.01, clock=clock)
+
+    cases = [
+        ("independent calls", lambda: simulation.simulate(
+            decorators.RetryPolicy(3, delay=1), model, calls, 0.01)),
+        ("calls sharing circuit_breaker", simulate_shared_breaker),
+    ]
+    for name, func in cases:
+        # Simulation is measured as a whole, result is per call
+        yield name, measure(func, 1) / calls
+
+
+SCENARIOS = [("success", success_scenario),
+             ("failure", failure_scenario),
+             ("threads", threads_scenario),
+             ("logger", logger_scenario),
+             ("import", import_scenario),
+             ("simulation", simulation_scenario)]
+
+
+def run(scenarios, number):
+    """Returns list of results of scenarios
+
+    Overhead is computed against the first case of every scenario.
+    """
+    results = []
+    for scenario, function in SCENARIOS:
+        if scenario not in scenarios:
+            continue
+        baseline = None
+        for name, ns in function(number):
+            if baseline is None:
+                baseline = ns
+            results.append({"scenario": scenario, "name": name,
+                            "ns": round(ns, 1),
+                            "overhead_ns": round(ns - baseline, 1)})
+    return results
+
+
+def print_results(results, previous=None):
+    previous = dict(((result["scenario"], result["name"]), result["ns"])
+                    for result in previous or ())
+    scenario = None
+    for result in results:
+        if result["scenario"] != scenario:
+            scenario = result["scenario"]
+            print("\n[%s]" % scenario)
+        line = "%-62s %10.1f ns  overhead %+10.1f ns" % (
+            result["name"], result["ns"], result["overhead_ns"])
+        before = previous.get((scenario, result["name"]))
+        if before:
+            line += "  %+6.1f%%" % ((result["ns"] - before) / before * 100)
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=200000,
+                        help="number of calls per measurement")
+    parser.add_argument("-s", "--scenario", action="append",
+                        choices=[name for name, _ in SCENARIOS],
+                        help="scenario to run (default: all)")
+    parser.add_argument("--json", metavar="PATH",
+                        help="write results as JSON to PATH ('-' for "
+                             "stdout)")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="JSON results of previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args.scenario or [name for name, _ in SCENARIOS],
+                  args.number)
+    report = {"python": platform.python_version(),
+              "implementation": platform.python_implementation(),
+              "number": args.number,
+              "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print("")
+        return
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    previous = None
+    if args.compare:
+        with open(args.compare) as source:
+            previous = json.load(source)["results"]
+    print_results(results, previous)
+
+
+if __name__ == "__main__":
+    main()
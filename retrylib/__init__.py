@@ -1,8 +1,44 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import sys
+
 from retrylib import decorators  # noqa
 from retrylib import defaults    # noqa
-from retrylib import network     # noqa
 
 from retrylib.decorators import *  # noqa
 
+# Submodules imported on first access, so that importing retrylib for
+# decorators doesn't pull in requests and other dependencies of network
+_LAZY_MODULES = ("adaptive", "backoff", "batches", "budget", "caching",
+                 "circuit", "classifier", "clocks", "executors", "hedging",
+                 "listeners", "network", "ratelimit", "registry", "sessions",
+                 "shared", "simulation", "streams", "tracing")
+
+__all__ = ["decorators", "defaults"] + sorted(_LAZY_MODULES)
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return importlib.import_module("retrylib." + name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 
-__all__ = ["decorators", "defaults", "network"]
+if sys.version_info < (3, 7):
+    # Module __getattr__ isn't supported, network is imported as before,
+    # other submodules are imported with "from retrylib import <name>"
+    from retrylib import network  # noqa
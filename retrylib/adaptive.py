@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Adaptive retries driven by observed failure rate and latency
+
+For every decorated function exponentially weighted moving averages of
+failure rate and first attempt latency are kept. Delays grow with both of
+them. Number of permitted attempts follows AIMD rule like TCP congestion
+window: it grows additively with each successful call and is cut
+multiplicatively each time a call gives up.
+
+Statistics are updated without locks, concurrent updates may be lost,
+which is harmless for averages.
+"""
+
+import threading
+
+
+class AdaptiveStats(object):
+
+    __slots__ = ("failure_rate", "latency", "attempts")
+
+    def __init__(self, attempts):
+        self.failure_rate = 0.0
+        self.latency = None
+        self.attempts = float(attempts)
+
+
+class AdaptivePolicy(object):
+
+    def __init__(self, delay=0.1, max_delay=30, factor=2, latency_factor=1,
+                 min_attempts=1, max_attempts=5, increase=0.1,
+                 decrease=0.5, alpha=0.1, max_failure_rate=0.95):
+        """Creates policy adapting retries to observed failure rate
+
+        @param delay: minimal delay before the first retry
+        @param max_delay: maximum delay value
+        @param factor: multiplier of delay for each next retry
+        @param latency_factor: delay before the first retry is at least
+                               average latency multiplied by it
+        @param min_attempts: lower bound of permitted attempts
+        @param max_attempts: upper bound of permitted attempts, it is also
+                             limited by attempts_number of decorator
+        @param increase: permitted attempts added by each success
+        @param decrease: permitted attempts multiplier applied on give up
+        @param alpha: weight of a new observation in moving averages
+        @param max_failure_rate: failure rate is capped by it, delay is
+                                 scaled by 1 / (1 - failure_rate)
+        """
+        self.delay = delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.latency_factor = latency_factor
+        self.min_attempts = min_attempts
+        self.max_attempts = max_attempts
+        self.increase = increase
+        self.decrease = decrease
+        self.alpha = alpha
+        self.max_failure_rate = max_failure_rate
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get_stats(self, func):
+        stats = self._stats.get(func)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(
+                    func, AdaptiveStats(self.max_attempts))
+        return stats
+
+    def get_attempts_number(self, func, limit):
+        """Returns number of attempts permitted for func now
+
+        @param limit: attempts_number of decorator (< 0 means no limit)
+        """
+        attempts = int(self.get_stats(func).attempts)
+        if limit >= 0:
+            attempts = min(attempts, limit)
+        return attempts
+
+    def get_delay(self, func, attempt):
+        stats = self.get_stats(func)
+        delay = self.delay
+        if stats.latency is not None:
+            delay = max(delay, stats.latency * self.latency_factor)
+        delay /= 1 - min(stats.failure_rate, self.max_failure_rate)
+        delay *= self.factor ** min(attempt - 1, 64)
+        return min(delay, self.max_delay)
+
+    def _observe(self, stats, failed):
+        stats.failure_rate += self.alpha * (failed - stats.failure_rate)
+
+    def record_success(self, func, latency=None):
+        """Records successful attempt
+
+        @param latency: duration of the attempt
+        """
+        stats = self.get_stats(func)
+        self._observe(stats, 0.0)
+        if latency is not None:
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.alpha * (latency - stats.latency)
+        stats.attempts = min(stats.attempts + self.increase,
+                             self.max_attempts)
+
+    def record_failure(self, func):
+        """Records attempt failed with retriable error"""
+        self._observe(self.get_stats(func), 1.0)
+
+    def record_giveup(self, func):
+        """Records call that has exhausted permitted attempts"""
+        stats = self.get_stats(func)
+        stats.attempts = max(stats.attempts * self.decrease,
+                             self.min_attempts)
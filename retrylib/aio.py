@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio support for retry decorators (Python 3.5+ only)"""
+
+import asyncio
+import functools
+
+from retrylib import decorators
+
+
+async def retry_failed(policy, func, args, kwargs, error, started=None,
+                       state=None):
+    """Retries coroutine function after its first call has failed"""
+    if state is None:
+        state = decorators.RetryState(policy, func, args, kwargs, started)
+    while True:
+        await asyncio.sleep(state.next_delay(error))
+        state.before_attempt(error)
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # It is an Exception before Python 3.8
+            policy.cancel_attempt()
+            raise
+        except Exception as e:
+            error = e
+        except BaseException:
+            policy.cancel_attempt()
+            raise
+        else:
+            state.on_success()
+            return result
+
+
+def wrap(policy, func):
+    """Returns coroutine function func wrapped with retries of policy"""
+
+    breaker = policy.circuit_breaker
+
+    listeners = policy.listeners
+
+    async def call(args, kwargs, started):
+        state = None
+        if listeners:
+            state = decorators.RetryState(policy, func, args, kwargs,
+                                          started)
+        elif started is None and policy.adaptive is not None:
+            started = decorators.monotonic()
+        if breaker is not None:
+            breaker.before_call()
+        wait = policy.reserve_first_attempt()
+        if wait:
+            await asyncio.sleep(wait)
+        if state is not None:
+            policy.notify("on_attempt", state, 1)
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            policy.cancel_attempt()
+            raise
+        except Exception as e:
+            error = e
+        except BaseException:
+            policy.cancel_attempt()
+            raise
+        else:
+            if state is None:
+                policy.record_success(func, started)
+            else:
+                state.on_success()
+            return result
+        # Retried outside of except block, so that errors of retries
+        # aren't chained to the first one
+        return await retry_failed(policy, func, args, kwargs, error, started,
+                                  state)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if policy.attempts_number == 0:
+            return None
+        if policy.deadline is None:
+            return await call(args, kwargs, None)
+        started, token = policy.start_deadline(kwargs)
+        try:
+            return await call(args, kwargs, started)
+        finally:
+            policy.finish_deadline(token)
+
+    wrapper.retry_policy = policy
+    return wrapper
+
+
+def wrap_dynamic(func, get_wrapped):
+    """Returns coroutine function awaiting get_wrapped()(*args, **kwargs)
+
+    Used when retried function is chosen on every call.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await get_wrapped()(*args, **kwargs)
+
+    return wrapper
+
+
+async def _timed(hedger, func, args, kwargs):
+    started = decorators.monotonic()
+    result = await func(*args, **kwargs)
+    hedger.latency.record(decorators.monotonic() - started)
+    return result
+
+
+def _start(hedger, func, args, kwargs, hedge):
+    task = asyncio.ensure_future(_timed(hedger, func, args, kwargs))
+    if hedge:
+        task.add_done_callback(hedger.release_hedge)
+    return task
+
+
+async def hedged_call(hedger, func, args, kwargs):
+    """Awaits coroutine function hedging slow attempts with tasks"""
+    pending = set([_start(hedger, func, args, kwargs, hedge=False)])
+    hedges = 0
+    failed = None
+    try:
+        while True:
+            timeout = (hedger.get_delay() if hedges < hedger.max_hedges
+                       else None)
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if exc is None or not hedger.need_to_retry(exc):
+                    # Error is raised with traceback of the attempt
+                    return task.result()
+                failed = task
+            if pending and done:
+                continue
+            if not hedger.acquire_hedge(hedges):
+                if pending:
+                    hedges = hedger.max_hedges
+                    continue
+                return failed.result()
+            hedges += 1
+            pending.add(_start(hedger, func, args, kwargs, hedge=True))
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def wrap_hedged(hedger, func):
+    """Returns coroutine function func wrapped with hedging"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await hedged_call(hedger, func, args, kwargs)
+
+    wrapper.hedger = hedger
+    return wrapper
+
+
+async def call_batch(policy, func, args, kwargs, items_arg=0,
+                     chunk_size=None):
+    """Awaits batch coroutine function retrying failed items"""
+    from retrylib import batches
+    batch = batches.BatchRetry(policy, func, args, kwargs, items_arg,
+                               chunk_size)
+    for chunk in batch.chunks():
+        arguments = batch.start(chunk)
+        wait = policy.reserve_first_attempt()
+        if wait:
+            await asyncio.sleep(wait)
+        while arguments is not None:
+            try:
+                results = await func(*arguments[0], **arguments[1])
+            except Exception as e:
+                error = batch.collect(error=e)
+            else:
+                error = batch.collect(results)
+            if error is None:
+                break
+            delay = batch.next_delay(error)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            arguments = batch.retry(error)
+    return batch.get_results()
+
+
+def wrap_batch(policy, func, items_arg=0, chunk_size=None):
+    """Returns batch coroutine function func retrying failed items"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if policy.attempts_number == 0:
+            return None
+        return await call_batch(policy, func, args, kwargs, items_arg,
+                                chunk_size)
+
+    wrapper.retry_policy = policy
+    return wrapper
+
+
+def virtual_sleep(clock, real_sleep):
+    """Returns asyncio.sleep replacement advancing clock instead of waiting
+
+    Control is still yielded to event loop with real_sleep(0).
+    """
+
+    async def sleep(delay, result=None):
+        clock.sleep(delay)
+        return await real_sleep(0, result)
+
+    return sleep
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Retries of async generators (Python 3.6+ only)"""
+
+import asyncio
+import functools
+
+from retrylib import streams
+
+
+async def iterate(policy, func, args, kwargs, resume=None):
+    """Yields items of async generator reopening it on failures"""
+    retry = streams.StreamRetry(policy, func, args, kwargs, resume)
+    args, kwargs = retry.start()
+    wait = policy.reserve_first_attempt()
+    if wait:
+        await asyncio.sleep(wait)
+    stream = None
+    try:
+        while True:
+            try:
+                if stream is None:
+                    stream = func(*args, **kwargs).__aiter__()
+                item = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                stream = None
+                await asyncio.sleep(retry.next_delay(e))
+                args, kwargs = retry.reopen(e)
+                continue
+            if retry.accept(item):
+                yield item
+    finally:
+        if stream is not None and hasattr(stream, "aclose"):
+            await stream.aclose()
+    retry.finish()
+
+
+def wrap_stream(policy, func, resume=None):
+    """Returns async generator function func wrapped with retries"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if policy.attempts_number == 0:
+            return
+        async for item in iterate(policy, func, args, kwargs, resume):
+            yield item
+
+    wrapper.retry_policy = policy
+    return wrapper
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Strategies computing delays between attempts
+
+Strategies are stateless and may be shared between functions and threads:
+everything related to a particular call is passed to get_delay.
+"""
+
+import abc
+import random
+
+import six
+
+
+# Exponent is capped to avoid float overflow on infinite retries
+MAX_EXPONENT = 64
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BackoffStrategy(object):
+
+    @abc.abstractmethod
+    def get_delay(self, attempt, previous_delay):
+        """Returns delay before retry
+
+        @param attempt: number of failed attempt (starts from 1)
+        @param previous_delay: delay before previous retry
+                               (None before the first retry)
+        """
+
+
+def _clamp(value, max_delay):
+    if 0 <= max_delay < value:
+        return max_delay
+    return value
+
+
+class LinearBackoff(BackoffStrategy):
+    """Delay grows by step after each retry (default strategy)"""
+
+    def __init__(self, delay=0, step=0, max_delay=-1):
+        super(LinearBackoff, self).__init__()
+        self._delay = delay
+        self._step = step
+        self._max_delay = max_delay
+
+    def get_delay(self, attempt, previous_delay):
+        if previous_delay is None:
+            return self._delay
+        return _clamp(previous_delay + self._step, self._max_delay)
+
+
+class ExponentialBackoff(BackoffStrategy):
+    """Delay is multiplied by factor after each retry"""
+
+    def __init__(self, delay=1, factor=2, max_delay=-1):
+        super(ExponentialBackoff, self).__init__()
+        self._delay = delay
+        self._factor = factor
+        self._max_delay = max_delay
+
+    def get_delay(self, attempt, previous_delay):
+        exponent = min(attempt - 1, MAX_EXPONENT)
+        return _clamp(self._delay * self._factor ** exponent,
+                      self._max_delay)
+
+
+class FullJitterBackoff(ExponentialBackoff):
+    """Random delay between 0 and exponential delay"""
+
+    def __init__(self, delay=1, factor=2, max_delay=-1, rng=None):
+        super(FullJitterBackoff, self).__init__(delay, factor, max_delay)
+        self._rng = rng or random
+
+    def get_delay(self, attempt, previous_delay):
+        ceiling = super(FullJitterBackoff, self).get_delay(attempt,
+                                                           previous_delay)
+        return self._rng.uniform(0, ceiling)
+
+
+class EqualJitterBackoff(FullJitterBackoff):
+    """Half of exponential delay plus random value up to the other half"""
+
+    def get_delay(self, attempt, previous_delay):
+        half = ExponentialBackoff.get_delay(self, attempt,
+                                            previous_delay) / 2.0
+        return half + self._rng.uniform(0, half)
+
+
+class DecorrelatedJitterBackoff(BackoffStrategy):
+    """Random delay between base delay and tripled previous delay"""
+
+    def __init__(self, delay=1, max_delay=-1, rng=None):
+        super(DecorrelatedJitterBackoff, self).__init__()
+        self._delay = delay
+        self._max_delay = max_delay
+        self._rng = rng or random
+
+    def get_delay(self, attempt, previous_delay):
+        if previous_delay is None:
+            # The first delays of concurrent calls are spread too
+            previous_delay = self._delay
+        return _clamp(self._rng.uniform(self._delay, previous_delay * 3),
+                      self._max_delay)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Retries of batch operations re-submitting failed items only"""
+
+import time
+
+from retrylib import decorators
+
+
+class BatchError(Exception):
+    """Raised when some items of a batch have failed
+
+    Batch functions raise it to report per-item results, retried batch
+    functions raise it when failed items are given up.
+
+    @ivar results: list of per-item results in order of items, failed
+                   items have exceptions as results
+    """
+
+    def __init__(self, results, message=None):
+        self.results = list(results)
+        if message is None:
+            message = "%s of %s items failed" % (len(self.failed),
+                                                 len(self.results))
+        super(BatchError, self).__init__(message)
+
+    @property
+    def failed(self):
+        """Indexes of failed items"""
+        return [index for index, result in enumerate(self.results)
+                if isinstance(result, Exception)]
+
+    @property
+    def errors(self):
+        """Exceptions of failed items"""
+        return [result for result in self.results
+                if isinstance(result, Exception)]
+
+
+class BatchRetry(object):
+    """State of a single call to retried batch function
+
+    Batch function takes list of items as positional argument items_arg
+    and returns list of per-item results (exceptions for failed items) or
+    raises BatchError with them. Only items failed with retriable
+    exceptions are passed to the next attempt.
+    """
+
+    __slots__ = ("policy", "func", "items", "items_arg", "args", "kwargs",
+                 "chunk_size", "results", "pending", "started", "state")
+
+    def __init__(self, policy, func, args, kwargs, items_arg=0,
+                 chunk_size=None):
+        self.policy = policy
+        self.func = func
+        self.items = list(args[items_arg])
+        self.items_arg = items_arg
+        self.args = list(args)
+        self.kwargs = kwargs
+        self.chunk_size = chunk_size
+        self.results = [None] * len(self.items)
+        self.pending = None
+        self.started = None
+        self.state = None
+
+    def chunks(self):
+        """Yields lists of indexes of items submitted together"""
+        size = self.chunk_size or len(self.items) or 1
+        for start in range(0, len(self.items), size):
+            yield list(range(start, min(start + size, len(self.items))))
+
+    def start(self, chunk):
+        """Starts retrying chunk, returns arguments of the first attempt"""
+        self.pending = chunk
+        self.started, self.state = self.policy.start_call(
+            self.func, self.args, self.kwargs)
+        return self.arguments()
+
+    def arguments(self):
+        """Returns arguments to call batch function with pending items"""
+        args = list(self.args)
+        args[self.items_arg] = [self.items[index] for index in self.pending]
+        return args, self.kwargs
+
+    def collect(self, results=None, error=None):
+        """Stores results of an attempt
+
+        @param results: per-item results of pending items
+        @param error: exception raised by batch function instead of results
+        @return: exception to retry pending items on or None if chunk is
+                 finished
+        """
+        if isinstance(error, BatchError):
+            results = error.results
+        elif error is not None:
+            if not self.policy.need_to_retry(error):
+                self.give_up(error)
+                raise error
+            results = [error] * len(self.pending)
+        results = list(results)
+        if len(results) != len(self.pending):
+            raise ValueError("Batch function returned %s results for %s "
+                             "items" % (len(results), len(self.pending)))
+
+        pending = []
+        retry_on = None
+        need_to_retry = self.policy.need_to_retry
+        for index, result in zip(self.pending, results):
+            self.results[index] = result
+            if isinstance(result, Exception) and need_to_retry(result):
+                pending.append(index)
+                if retry_on is None:
+                    retry_on = result
+        self.pending = pending
+        if retry_on is None:
+            if all(isinstance(result, Exception) for result in results):
+                # Every item has failed without retry, so has the attempt
+                self.give_up(results[0])
+            elif self.state is None:
+                self.policy.finish_call(self.func, self.started)
+            else:
+                self.state.on_success()
+        return retry_on
+
+    def next_delay(self, error):
+        """Returns delay before the next attempt or None to give up"""
+        if self.state is None:
+            self.state = decorators.RetryState(
+                self.policy, self.func, self.args, self.kwargs,
+                self.started)
+        try:
+            return self.state.next_delay(error)
+        except Exception as e:
+            if e is not error:
+                raise
+            return None
+
+    def give_up(self, error):
+        """Records failure of the attempt with not retriable error"""
+        self.next_delay(error)
+
+    def retry(self, error):
+        """Returns arguments of the next attempt or None to give up"""
+        try:
+            self.state.before_attempt(error)
+        except Exception as e:
+            if e is not error:
+                raise
+            return None
+        return self.arguments()
+
+    def get_results(self):
+        """Returns merged results or raises BatchError if some failed"""
+        for result in self.results:
+            if isinstance(result, Exception):
+                raise BatchError(self.results)
+        return self.results
+
+
+def call(policy, func, args, kwargs, items_arg=0, chunk_size=None):
+    """Calls batch function func retrying failed items"""
+    batch = BatchRetry(policy, func, args, kwargs, items_arg, chunk_size)
+    for chunk in batch.chunks():
+        arguments = batch.start(chunk)
+        wait = policy.reserve_first_attempt()
+        if wait:
+            time.sleep(wait)
+        while arguments is not None:
+            try:
+                results = func(*arguments[0], **arguments[1])
+            except Exception as e:
+                error = batch.collect(error=e)
+            else:
+                error = batch.collect(results)
+            if error is None:
+                break
+            delay = batch.next_delay(error)
+            if delay is None:
+                break
+            time.sleep(delay)
+            arguments = batch.retry(error)
+    return batch.get_results()
+
+
+def retry_batch(policy, items_arg=0, chunk_size=None):
+    """Returns decorator retrying failed items of batch function with policy
+
+    Coroutine functions are retried without blocking event loop.
+
+    @param policy: decorators.RetryPolicy
+    @param items_arg: position of items argument (1 for methods)
+    @param chunk_size: maximum number of items passed to one call, larger
+                       batches are split into chunks
+    """
+
+    def decorator(func):
+        return policy.wrap_batch(func, items_arg, chunk_size)
+
+    return decorator
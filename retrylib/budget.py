@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Retry budget shared between retried functions
+
+Budget limits retries to a fraction of successful calls made during the
+last window seconds (plus a small fixed allowance), so that retries can't
+multiply load on a dependency during an incident.
+
+Counters are split into shards assigned to threads in turn and updated
+without locks. Concurrent updates of the same shard may occasionally be
+lost, it only makes the budget a bit more or less permissive.
+"""
+
+import itertools
+import threading
+import time
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+
+class _Shard(object):
+
+    __slots__ = ("epochs", "successes", "retries")
+
+    def __init__(self, window):
+        self.epochs = [-1] * window
+        self.successes = [0] * window
+        self.retries = [0] * window
+
+
+class RetryBudget(object):
+
+    def __init__(self, ratio=0.1, min_retries_per_second=10, window=10,
+                 shards=16, clock=None):
+        """Creates budget allowing retries of a share of calls
+
+        @param ratio: allowed number of retries per successful call
+        @param min_retries_per_second: retries allowed regardless of
+                                       successful calls
+        @param window: number of seconds successes and retries are kept
+        @param shards: number of counter shards
+        @param clock: function returning monotonic time in seconds
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = int(window)
+        self._clock = clock or monotonic
+        self._shards = [_Shard(self.window) for _ in range(shards)]
+        # Thread ids are aligned addresses, their remainders would leave
+        # most shards unused
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+
+    def _bucket(self):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = self._shards[
+                next(self._next_shard) % len(self._shards)]
+        epoch = int(self._clock())
+        index = epoch % self.window
+        if shard.epochs[index] != epoch:
+            shard.epochs[index] = epoch
+            shard.successes[index] = 0
+            shard.retries[index] = 0
+        return shard, index
+
+    def _totals(self):
+        oldest = int(self._clock()) - self.window
+        successes = retries = 0
+        for shard in self._shards:
+            for index, epoch in enumerate(shard.epochs):
+                if epoch > oldest:
+                    successes += shard.successes[index]
+                    retries += shard.retries[index]
+        return successes, retries
+
+    def deposit(self):
+        """Records successful call"""
+        shard, index = self._bucket()
+        shard.successes[index] += 1
+
+    def can_retry(self):
+        successes, retries = self._totals()
+        allowed = (self.min_retries_per_second * self.window +
+                   self.ratio * successes)
+        return retries < allowed
+
+    def try_withdraw(self):
+        """Returns True and records retry if budget allows it"""
+        if not self.can_retry():
+            return False
+        shard, index = self._bucket()
+        shard.retries[index] += 1
+        return True
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Caching of retried function results with stale-on-error fallback
+
+Fresh results are returned without calling function. When cached result
+has expired, function is called again, and if it fails or circuit breaker
+is open, result which is stale by at most max_stale seconds is returned
+instead of waiting for retries. Results close to expiration are refreshed
+in background.
+"""
+
+import collections
+import functools
+import logging
+import sys
+import threading
+import time
+
+from retrylib import circuit
+
+
+LOG = logging.getLogger(__name__)
+
+monotonic = getattr(time, "monotonic", time.time)
+
+_KWARGS_MARK = object()
+_RETRYING = object()
+
+
+def make_key(args, kwargs):
+    """Returns cache key of call arguments"""
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK, ) + tuple(sorted(kwargs.items()))
+
+
+class RetryCache(object):
+    """Bounded LRU cache of results with TTL for retried functions
+
+    It is passed to retry decorators as cache. Every decorated function
+    has its own entries, arguments must be hashable for results to be
+    cached.
+    """
+
+    def __init__(self, maxsize=128, ttl=60, max_stale=300,
+                 stale_while_retrying=True, refresh_ahead=None, key=None,
+                 clock=None):
+        """Creates cache of results of retried calls
+
+        @param maxsize: maximum number of cached results, least recently
+                        used ones are evicted
+        @param ttl: seconds result is fresh and is returned without call
+        @param max_stale: seconds after expiration expired result may be
+                          returned if function fails
+        @param stale_while_retrying: return stale result right after the
+                                     first failed attempt and retry in
+                                     background. Otherwise stale result is
+                                     returned when all attempts fail
+        @param refresh_ahead: part of ttl (e.g. 0.8) after which fresh
+                              result is refreshed in background
+        @param key: function making cache key of args and kwargs
+        @param clock: function returning monotonic time in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.stale_while_retrying = stale_while_retrying
+        self.refresh_ahead = refresh_ahead
+        self.make_key = key or make_key
+        self._clock = clock or monotonic
+        self._entries = collections.OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns (result, age) or None if key isn't cached"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            # The most recently used entries are the last ones
+            self._entries[key] = entry
+        return entry[0], self._clock() - entry[1]
+
+    def set(self, key, result):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (result, self._clock())
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _start_refresh(self, key):
+        """Returns False if key is already being refreshed"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _finish_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def refresh(self, policy, func, key, args, kwargs):
+        """Calls func with retries in background thread to update result
+
+        Only one refresh of a key runs at a time.
+        """
+        if self._start_refresh(key):
+            self._retry_in_background(
+                key, lambda: policy.call(func, *args, **kwargs), func)
+
+    def _retry_in_background(self, key, call, func):
+        """Stores result of call() made in background thread
+
+        Refresh of key must be started with _start_refresh.
+        """
+
+        def run():
+            try:
+                self.set(key, call())
+            except Exception:
+                LOG.debug("Background refresh of %s failed", func,
+                          exc_info=True)
+            finally:
+                self._finish_refresh(key)
+
+        thread = threading.Thread(target=run, name="RetryCache refresh")
+        thread.daemon = True
+        thread.start()
+
+    def _call_once(self, policy, func, key, args, kwargs):
+        """Makes the first attempt of func call with policy
+
+        If it fails with retriable error, the call is retried in
+        background and _RETRYING is returned.
+        """
+        started, state = policy.start_call(func, args, kwargs)
+        wait = policy.reserve_first_attempt()
+        if wait:
+            time.sleep(wait)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            error, tb = e, sys.exc_info()[2]
+        except BaseException:
+            policy.cancel_attempt()
+            raise
+        else:
+            if state is None:
+                policy.finish_call(func, started)
+            else:
+                state.on_success()
+            return result
+        if not policy.need_to_retry(error):
+            # Failure is recorded and error is raised
+            return policy.retry_failed(func, args, kwargs, error, started,
+                                       state, tb)
+        self._retry_in_background(
+            key, lambda: policy.retry_failed(func, args, kwargs, error,
+                                             started, state, tb), func)
+        return _RETRYING
+
+    def wrap(self, policy, func):
+        """Returns func wrapped with cache and retries of policy"""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = (func, self.make_key(args, kwargs))
+                hash(key)
+            except TypeError:
+                return policy.call(func, *args, **kwargs)
+
+            cached = self.get(key)
+            if cached is not None:
+                result, age = cached
+                if age < self.ttl:
+                    if (self.refresh_ahead is not None and
+                            age >= self.ttl * self.refresh_ahead):
+                        self.refresh(policy, func, key, args, kwargs)
+                    return result
+                if age >= self.ttl + self.max_stale:
+                    cached = None
+
+            if cached is None:
+                result = policy.call(func, *args, **kwargs)
+            elif self.stale_while_retrying:
+                if not self._start_refresh(key):
+                    # The call is being retried by another caller
+                    return cached[0]
+                try:
+                    result = self._call_once(policy, func, key, args, kwargs)
+                except circuit.CircuitOpenError:
+                    self._finish_refresh(key)
+                    return cached[0]
+                except BaseException:
+                    self._finish_refresh(key)
+                    raise
+                if result is _RETRYING:
+                    return cached[0]
+                self._finish_refresh(key)
+            else:
+                try:
+                    result = policy.call(func, *args, **kwargs)
+                except circuit.CircuitOpenError:
+                    return cached[0]
+                except Exception as e:
+                    if not policy.need_to_retry(e):
+                        raise
+                    return cached[0]
+            self.set(key, result)
+            return result
+
+        wrapper.retry_policy = policy
+        wrapper.retry_cache = self
+        return wrapper
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Circuit breaker shared between retried functions
+
+Breaker is closed while dependency works. After failure_threshold
+consecutive failures it opens and calls fail immediately with
+CircuitOpenError. After recovery_timeout breaker becomes half-open and lets
+a limited number of trial calls through: success closes it, failure opens
+it again. Trial calls ended without outcome (cancelled or interrupted)
+give their slots back, lost ones expire after recovery_timeout.
+"""
+
+import threading
+import time
+
+from retrylib import decorators
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+monotonic = getattr(time, "monotonic", time.time)
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, breaker):
+        super(CircuitOpenError, self).__init__(
+            "Circuit %s is open" % breaker.name)
+        self.breaker = breaker
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30,
+                 half_open_calls=1, retry_on=None, name=None, clock=None):
+        """Creates closed circuit breaker
+
+        @param failure_threshold: number of consecutive failures opening
+                                  the circuit
+        @param recovery_timeout: seconds before open circuit lets trial
+                                 calls through
+        @param half_open_calls: number of concurrent trial calls in
+                                half-open state
+        @param retry_on: exception, function or CatchStrategy classifying
+                         failures. By default retry_on of decorator is used,
+                         so only errors that are retried open the circuit
+        @param name: name used in error messages
+        @param clock: function returning monotonic time in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.name = name or "circuit-%x" % id(self)
+        self._catch_strategy = (None if retry_on is None
+                                else decorators.get_catch_strategy(retry_on))
+        self._clock = clock or monotonic
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trial_calls = 0
+        self._trial_started = 0
+
+    @property
+    def state(self):
+        if (self._state == OPEN and
+                self._clock() - self._opened_at >= self.recovery_timeout):
+            return HALF_OPEN
+        return self._state
+
+    def is_open(self):
+        """Returns True if circuit has been opened and not probed yet"""
+        return self._state == OPEN
+
+    def allow_request(self):
+        """Returns True if call may be done now"""
+        # Closed circuit is checked without lock
+        if self._state == CLOSED:
+            return True
+        with self._lock:
+            now = self._clock()
+            if self._state == OPEN:
+                if now - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._trial_calls = 0
+            if self._state == HALF_OPEN:
+                if self._trial_calls >= self.half_open_calls:
+                    if now - self._trial_started < self.recovery_timeout:
+                        return False
+                    # Trial calls have been lost without outcome
+                    self._trial_calls = 0
+                self._trial_calls += 1
+                self._trial_started = now
+            return True
+
+    def release_trial(self):
+        """Gives back trial call slot of a call ended without outcome
+
+        Called when attempt is cancelled or interrupted by BaseException.
+        """
+        if self._state != HALF_OPEN:
+            return
+        with self._lock:
+            if self._state == HALF_OPEN and self._trial_calls:
+                self._trial_calls -= 1
+
+    def before_call(self):
+        """Raises CircuitOpenError if call isn't allowed now"""
+        if not self.allow_request():
+            raise CircuitOpenError(self)
+
+    def is_failure(self, error, retriable):
+        """Returns True if error should be counted as dependency failure
+
+        @param retriable: decision of retry decorator about error
+        """
+        if self._catch_strategy is None:
+            return retriable
+        return self._catch_strategy.need_to_retry(error)
+
+    def record_success(self):
+        # Nothing to reset in the common case, so lock isn't taken
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._state == HALF_OPEN or
+                    self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def record_error(self, error, retriable):
+        """Records result of a call failed with error"""
+        if self.is_failure(error, retriable):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_calls = 0
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exception classification compiled once
+
+Rules are checked in the following order:
+ * status rules: exception of rule type is retriable only if its status
+   code is one of status_codes,
+ * exception types: exception of one of the types is retriable,
+ * predicates: exception is retriable if any of functions returns True.
+
+What type rules say about exception class (walking its MRO) is cached per
+class in a bounded cache, so a failure costs one dict lookup unless
+status rules or predicates have to look at the exception itself.
+"""
+
+import collections
+import threading
+
+
+# Cache entries: class is retriable, class isn't retriable (predicates
+# still may say it is), otherwise tuple of status code getters to apply
+RETRIABLE = True
+NOT_RETRIABLE = False
+
+
+class StatusRule(object):
+
+    def __init__(self, exceptions, get_status):
+        """Creates rule reading status code of exceptions
+
+        @param exceptions: exception class or tuple of classes
+        @param get_status: function returning status code of exception
+        """
+        self.exceptions = exceptions
+        self.get_status = get_status
+
+
+def _to_tuple(exceptions):
+    if isinstance(exceptions, type):
+        return (exceptions,)
+    return tuple(exceptions)
+
+
+class ExceptionClassifier(object):
+
+    def __init__(self, exceptions=(), status_rules=(), status_codes=(),
+                 predicates=(), cache_size=256):
+        """Creates classifier deciding which exceptions are retried
+
+        @param exceptions: exception classes to retry
+        @param status_rules: StatusRule objects
+        @param status_codes: status codes to retry
+        @param predicates: functions checking if exception should be
+                           retried
+        @param cache_size: maximum number of cached exception classes
+        """
+        self.exceptions = _to_tuple(exceptions)
+        self.status_rules = tuple(status_rules)
+        self.status_codes = frozenset(status_codes)
+        self.predicates = tuple(predicates)
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _compile(self, exc_class):
+        getters = tuple(rule.get_status for rule in self.status_rules
+                        if issubclass(exc_class, rule.exceptions))
+        if getters:
+            entry = getters
+        elif issubclass(exc_class, self.exceptions):
+            entry = RETRIABLE
+        else:
+            entry = NOT_RETRIABLE
+        with self._lock:
+            while self._cache and len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+            self._cache[exc_class] = entry
+        return entry
+
+    def need_to_retry(self, exc):
+        entry = self._cache.get(exc.__class__)
+        if entry is None:
+            entry = self._compile(exc.__class__)
+        if entry is RETRIABLE:
+            return True
+        if entry is not NOT_RETRIABLE:
+            codes = self.status_codes
+            for get_status in entry:
+                try:
+                    if get_status(exc) in codes:
+                        return True
+                except AttributeError:
+                    pass
+        for predicate in self.predicates:
+            if predicate(exc):
+                return True
+        return False
+
+    __call__ = need_to_retry
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
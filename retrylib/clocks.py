@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Virtual clock simulating long backoff schedules instantly
+
+Tests and benchmarks install VirtualClock in place of time.sleep and
+monotonic clocks of retrylib, so delays advance virtual time instead of
+blocking:
+
+    clock = VirtualClock()
+    with clock.patch():
+        function()
+    clock.sleeps  # delays slept by retries
+"""
+
+import contextlib
+import importlib
+import threading
+import time
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+
+# Modules keeping monotonic function replaced by VirtualClock.patch
+PATCHED_MODULES = ("retrylib.decorators", "retrylib.budget",
+                   "retrylib.circuit", "retrylib.hedging", "retrylib.logs",
+                   "retrylib.ratelimit")
+
+
+class VirtualClock(object):
+    """Clock which time advances only by sleep and advance calls
+
+    It is callable, so it can be passed as clock to CircuitBreaker,
+    RetryBudget and RetryLogLimiter.
+    """
+
+    def __init__(self, start=0):
+        self.now = start
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        """Returns virtual time in seconds"""
+        return self.now
+
+    __call__ = monotonic
+
+    def advance(self, seconds):
+        """Moves virtual time forward by seconds"""
+        with self._lock:
+            self.now += seconds
+
+    def sleep(self, seconds):
+        """Records delay and advances virtual time instead of sleeping"""
+        with self._lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+    @property
+    def slept(self):
+        """Total number of seconds slept"""
+        return sum(self.sleeps)
+
+    @contextlib.contextmanager
+    def patch(self):
+        """Replaces time.sleep, asyncio.sleep and retrylib clocks
+
+        Objects created inside the context bind virtual clock, objects
+        created before keep real one.
+        """
+        patches = [(time, "sleep", self.sleep)]
+        if asyncio is not None:
+            patches.append((asyncio, "sleep", self._async_sleep()))
+        for name in PATCHED_MODULES:
+            patches.append((importlib.import_module(name), "monotonic",
+                            self.monotonic))
+
+        originals = [(module, attr, getattr(module, attr))
+                     for module, attr, _ in patches]
+        for module, attr, value in patches:
+            setattr(module, attr, value)
+        try:
+            yield self
+        finally:
+            for module, attr, value in originals:
+                setattr(module, attr, value)
+
+    def _async_sleep(self):
+        from retrylib import aio
+        return aio.virtual_sleep(self, asyncio.sleep)
@@ -15,10 +15,65 @@
 # limitations under the License.
 
 import abc
-import collections
 import functools
+import inspect
+import logging
+import sys
 import time
 import types
+import weakref
+
+import six
+
+from retrylib import backoff as backoff_strategies
+from retrylib import classifier
+from retrylib import listeners as retry_listeners
+from retrylib import logs
+from retrylib import ratelimit
+
+try:
+    from collections import abc as collections_abc
+except ImportError:  # pragma: no cover
+    import collections as collections_abc
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+# Monotonic time when the retried call being executed must be finished
+if contextvars is not None:
+    _deadline = contextvars.ContextVar("retrylib_deadline", default=None)
+else:
+    _deadline = None
+
+
+def _reraise(error, tb=None):
+    """Raises error with traceback tb of sys.exc_info()
+
+    Python 2 exceptions don't keep traceback, so it is lost when error is
+    raised again outside of its except block.
+    """
+    if tb is None:
+        raise error
+    six.reraise(type(error), error, tb)
+
+
+def remaining_time():
+    """Returns seconds left till deadline of the current retried call
+
+    Retried function may use it to set its own timeouts. None is returned
+    if the call has no deadline.
+    """
+    if _deadline is None:
+        return None
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - monotonic(), 0)
 
 
 class CatchStrategy(object):
@@ -44,20 +99,597 @@ class CatchExceptionStrategy(CatchFunctionStrategy):
 
     def __init__(self, exceptions_to_retry):
         self._exceptions_to_retry = exceptions_to_retry
-        retry_exceptions = self._to_tuple()
+        self._classifier = classifier.ExceptionClassifier(self._to_tuple())
         super(CatchExceptionStrategy, self).__init__(
-            lambda exc: isinstance(exc, retry_exceptions))
+            self._classifier.need_to_retry)
 
     def _to_tuple(self):
-        if isinstance(self._exceptions_to_retry, collections.Iterable):
+        if isinstance(self._exceptions_to_retry, collections_abc.Iterable):
             retry_exceptions = tuple(self._exceptions_to_retry)
         else:
             retry_exceptions = (self._exceptions_to_retry,)
         return retry_exceptions
 
 
+def get_catch_strategy(retry_on):
+    """Builds CatchStrategy for retry_on decorator parameter
+
+    @param retry_on: CatchStrategy, classifier.ExceptionClassifier,
+                     exception (or iterable of exceptions) or function that
+                     checks if retry should be executed
+
+    @return: CatchStrategy instance (or ExceptionClassifier as is)
+    """
+    if isinstance(retry_on, (CatchStrategy,
+                             classifier.ExceptionClassifier)):
+        return retry_on
+    if isinstance(retry_on, (types.FunctionType,
+                             types.MethodType,)):
+        return CatchFunctionStrategy(retry_on)
+    return CatchExceptionStrategy(retry_on)
+
+
+class RetryPolicy(object):
+    """Immutable retry settings compiled once
+
+    Policy is built when function is decorated and shared by all calls,
+    so nothing is computed or allocated on the success path except the
+    call of decorated function itself.
+    """
+
+    __slots__ = ("attempts_number", "delay", "step", "max_delay",
+                 "catch_strategy", "logger", "backoff", "circuit_breaker",
+                 "retry_budget", "retry_after", "deadline", "deadline_kwarg",
+                 "listeners", "log_interval", "adaptive", "cache",
+                 "rate_limiter", "fast_path", "_log_limiter", "_loggers")
+
+    def __init__(self, attempts_number, delay=0, step=0, max_delay=-1,
+                 retry_on=Exception, logger=None, backoff=None,
+                 circuit_breaker=None, retry_budget=None, retry_after=None,
+                 deadline=None, deadline_kwarg=None, listeners=None,
+                 log_interval=None, adaptive=None, cache=None,
+                 rate_limiter=None):
+        """Compiles retry parameters
+
+        @param attempts_number: number of function calls (first call +
+                                retries). If attempts_number < 0 then
+                                retry infinitely
+        @param delay: delay before first retry
+        @param step: increment value of timeout on each retry
+        @param max_delay: maximum delay value (upper bound for delay)
+        @param retry_on: exception that should be handled, function that
+                         checks if retry should be executed or
+                         CatchStrategy (default: Exception)
+        @param logger: logger to write warnings
+        @param backoff: BackoffStrategy computing delays, delay, step and
+                        max_delay are ignored if it is passed
+                        (default: LinearBackoff(delay, step, max_delay))
+        @param circuit_breaker: circuit.CircuitBreaker failing calls
+                                immediately while dependency is down
+        @param retry_budget: budget.RetryBudget limiting share of retries,
+                             function gives up when it is spent
+        @param retry_after: function returning delay requested by server
+                            for error (or None), it replaces computed delay
+                            and is limited by max_delay
+        @param deadline: maximum number of seconds all attempts and delays
+                         may take
+        @param deadline_kwarg: name of keyword argument to pass remaining
+                               seconds to decorated function with
+        @param listeners: listeners.RetryListener objects notified about
+                          attempts, retries, successes and failures
+        @param log_interval: if it is set, one warning per function and
+                             exception class is written every log_interval
+                             seconds, others are counted and suppressed
+        @param adaptive: adaptive.AdaptivePolicy computing delays and
+                         number of attempts from observed failure rate and
+                         latency, attempts_number becomes an upper bound
+        @param cache: caching.RetryCache returning cached results and
+                      stale ones if function fails (functions only)
+        @param rate_limiter: ratelimit.RateLimiter every attempt takes a
+                             token from, first attempts have priority over
+                             retries and time to wait for a token is a
+                             part of retry delay
+        """
+        if backoff is None:
+            backoff = backoff_strategies.LinearBackoff(delay, step,
+                                                       max_delay)
+        set_attr = super(RetryPolicy, self).__setattr__
+        set_attr("attempts_number", attempts_number)
+        set_attr("delay", delay)
+        set_attr("step", step)
+        set_attr("max_delay", max_delay)
+        set_attr("catch_strategy", get_catch_strategy(retry_on))
+        set_attr("logger", logger)
+        set_attr("backoff", backoff)
+        set_attr("circuit_breaker", circuit_breaker)
+        set_attr("retry_budget", retry_budget)
+        set_attr("retry_after", retry_after)
+        set_attr("deadline", deadline)
+        set_attr("deadline_kwarg", deadline_kwarg)
+        set_attr("listeners", tuple(listeners or ()))
+        set_attr("log_interval", log_interval)
+        set_attr("adaptive", adaptive)
+        set_attr("cache", cache)
+        set_attr("rate_limiter", rate_limiter)
+        # Calls need no bookkeeping until the first failure
+        set_attr("fast_path", (
+            attempts_number != 0 and circuit_breaker is None and
+            retry_budget is None and deadline is None and not listeners and
+            adaptive is None and cache is None and rate_limiter is None))
+        set_attr("_log_limiter", None if log_interval is None
+                 else logs.RetryLogLimiter(log_interval))
+        # Loggers returned by get_logger of objects
+        set_attr("_loggers", weakref.WeakKeyDictionary())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __repr__(self):
+        return ("%s(attempts_number=%r, delay=%r, step=%r, max_delay=%r)" %
+                (self.__class__.__name__, self.attempts_number, self.delay,
+                 self.step, self.max_delay))
+
+    def need_to_retry(self, exc):
+        return self.catch_strategy.need_to_retry(exc)
+
+    def get_logger(self, args):
+        """Returns object's logger if any, otherwise predefined logger
+
+        Object's logger is looked up once per object.
+        """
+        if not args:
+            return self.logger
+        obj = args[0]
+        try:
+            return self._loggers[obj]
+        except (KeyError, TypeError):
+            pass
+        try:
+            logger = obj.get_logger()
+        except AttributeError:
+            logger = self.logger
+        try:
+            self._loggers[obj] = logger
+        except TypeError:
+            # Object can't be weakly referenced or hashed
+            pass
+        return logger
+
+    def log_retry(self, logger, func, exc, attempt, retry_delay):
+        """Writes warning about retry
+
+        Message is formatted by logging only if it is emitted.
+        """
+        is_enabled_for = getattr(logger, "isEnabledFor", None)
+        if is_enabled_for is not None and not is_enabled_for(
+                logging.WARNING):
+            return
+        message = ("Retry: Call to %s failed due to %s: %s, retry "
+                   "attempt #%s/%s after %ss")
+        args = [func.__name__, exc.__class__.__name__, exc, attempt,
+                "inf" if self.attempts_number < 0
+                else self.attempts_number - 1,
+                retry_delay]
+        if self._log_limiter is not None:
+            suppressed = self._log_limiter.acquire((func, exc.__class__))
+            if suppressed is None:
+                return
+            if suppressed:
+                message += ", suppressed %s similar retries in last %ss"
+                args += [suppressed, self.log_interval]
+        logger.warning(message, *args)
+
+    def call(self, func, *args, **kwargs):
+        """Calls func retrying it according to the policy"""
+        if self.attempts_number == 0:
+            return None
+        if self.deadline is None:
+            return self._call(func, args, kwargs, None)
+        started, token = self.start_deadline(kwargs)
+        try:
+            return self._call(func, args, kwargs, started)
+        finally:
+            self.finish_deadline(token)
+
+    def _call(self, func, args, kwargs, started):
+        state = None
+        if self.listeners:
+            state = RetryState(self, func, args, kwargs, started)
+        elif started is None and self.adaptive is not None:
+            started = monotonic()
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            breaker.before_call()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if state is not None:
+            self.notify("on_attempt", state, 1)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            error, tb = e, sys.exc_info()[2]
+        except BaseException:
+            self.cancel_attempt()
+            raise
+        else:
+            if state is None:
+                self.record_success(func, started)
+            else:
+                state.on_success()
+            return result
+        # Retried outside of except block, so that errors of retries
+        # aren't chained to the first one
+        return self.retry_failed(func, args, kwargs, error, started, state,
+                                 tb)
+
+    def notify(self, event_name, state, attempt, delay=None, error=None):
+        """Notifies listeners about event of the call with RetryState"""
+        event = retry_listeners.RetryEvent(
+            retry_listeners.get_func_name(state.func), attempt,
+            monotonic() - state.started, delay, error, state)
+        for listener in self.listeners:
+            getattr(listener, event_name)(event)
+
+    def start_deadline(self, kwargs):
+        """Starts counting time of a call with deadline
+
+        @return: monotonic time of call start and context token
+        """
+        started = monotonic()
+        token = None
+        if _deadline is not None:
+            token = _deadline.set(started + self.deadline)
+        if self.deadline_kwarg is not None:
+            kwargs[self.deadline_kwarg] = self.deadline
+        return started, token
+
+    def finish_deadline(self, token):
+        if token is not None:
+            _deadline.reset(token)
+
+    def record_success(self, func, attempt_started=None):
+        """Records successful attempt of func
+
+        @param attempt_started: monotonic time when the attempt started
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+        if self.retry_budget is not None:
+            self.retry_budget.deposit()
+        if self.adaptive is not None:
+            self.adaptive.record_success(
+                func, None if attempt_started is None
+                else monotonic() - attempt_started)
+
+    def cancel_attempt(self):
+        """Records that attempt has ended without outcome
+
+        It is cancelled or interrupted by BaseException, so circuit breaker
+        trial slot taken by it is released.
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.release_trial()
+
+    def start_call(self, func, args, kwargs):
+        """Prepares the first attempt of func made without call()
+
+        @return: monotonic time when the call started (None if policy
+                 doesn't need it) and RetryState of the call if listeners
+                 need it, otherwise it is created after the first failure
+        """
+        started = None
+        if (self.deadline is not None or self.listeners or
+                self.adaptive is not None):
+            started = monotonic()
+        if self.deadline is not None and self.deadline_kwarg is not None:
+            kwargs[self.deadline_kwarg] = self.deadline
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        state = None
+        if self.listeners:
+            state = RetryState(self, func, args, kwargs, started)
+            self.notify("on_attempt", state, 1)
+        return started, state
+
+    def reserve_first_attempt(self):
+        """Returns seconds to wait for rate limiter before the first attempt
+
+        Callers of start_call wait for them themselves, so that coroutines
+        don't block event loop.
+        """
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.reserve(ratelimit.FIRST_ATTEMPT)
+
+    def finish_call(self, func, started):
+        """Records success of the first attempt started with start_call
+
+        Calls with RetryState finish with RetryState.on_success instead.
+        """
+        self.record_success(func, started)
+
+    def retry_failed(self, func, args, kwargs, error, started=None,
+                     state=None, tb=None):
+        """Retries func after its first call has failed with error
+
+        Raises error if it is not retriable or attempts are exhausted.
+
+        @param started: monotonic time when the first call started, it is
+                        required if policy has deadline
+        @param state: RetryState created when the call started
+        @param tb: traceback of error (sys.exc_info()[2]) to raise it with
+        """
+        if state is None:
+            state = RetryState(self, func, args, kwargs, started)
+        while True:
+            time.sleep(state.next_delay(error, tb))
+            state.before_attempt(error, tb)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                error, tb = e, sys.exc_info()[2]
+            except BaseException:
+                self.cancel_attempt()
+                raise
+            else:
+                state.on_success()
+                return result
+
+    def wrap(self, func):
+        """Returns func wrapped with retries
+
+        Coroutine functions are wrapped with non-blocking retries.
+        """
+        if is_coroutine_function(func):
+            return self.wrap_async(func)
+
+        if self.attempts_number == 0:
+            return functools.wraps(func)(lambda *args, **kwargs: None)
+
+        if self.cache is not None:
+            return self.cache.wrap(self, func)
+
+        if self.fast_path:
+            retry_failed = self.retry_failed
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    error, tb = e, sys.exc_info()[2]
+                return retry_failed(func, args, kwargs, error, tb=tb)
+        else:
+            call = self.call
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return call(func, *args, **kwargs)
+
+        wrapper.retry_policy = self
+        return wrapper
+
+    def wrap_async(self, func):
+        """Returns coroutine function func wrapped with retries
+
+        Backoff delays are awaited with asyncio.sleep, so event loop
+        isn't blocked.
+        """
+        if self.cache is not None:
+            raise TypeError("cache doesn't support coroutine functions")
+        from retrylib import aio
+        return aio.wrap(self, func)
+
+    def wrap_stream(self, func, resume=None):
+        """Returns generator function func wrapped with retries
+
+        Failures raised while iterating are retried too: the stream is
+        reopened from the last yielded item, see streams.StreamRetry.
+        Async generator functions are retried without blocking event loop.
+
+        @param resume: function taking the last yielded item, args and
+                       kwargs of the first call and returning (args, kwargs)
+                       to reopen stream with
+        """
+        if is_async_generator_function(func):
+            from retrylib import aio_streams
+            return aio_streams.wrap_stream(self, func, resume)
+
+        from retrylib import streams
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.attempts_number == 0:
+                return iter(())
+            return streams.iterate(self, func, args, kwargs, resume)
+
+        wrapper.retry_policy = self
+        return wrapper
+
+    def wrap_batch(self, func, items_arg=0, chunk_size=None):
+        """Returns batch function func retrying its failed items only
+
+        Batch function returns per-item results or raises
+        batches.BatchError with them, exceptions are results of failed
+        items. Merged results are returned in order of items, BatchError
+        is raised if some items are given up. Coroutine functions are
+        retried without blocking event loop.
+
+        @param items_arg: position of items argument (1 for methods)
+        @param chunk_size: maximum number of items passed to one call
+        """
+        if is_coroutine_function(func):
+            from retrylib import aio
+            return aio.wrap_batch(self, func, items_arg, chunk_size)
+
+        from retrylib import batches
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.attempts_number == 0:
+                return None
+            return batches.call(self, func, args, kwargs, items_arg,
+                                chunk_size)
+
+        wrapper.retry_policy = self
+        return wrapper
+
+    __call__ = wrap
+
+
+class RetryState(object):
+    """State of a single call to retried function
+
+    It is created after the first failure only, so successful calls
+    don't pay for it. Calls notifying listeners create it when they start,
+    it is passed to listeners as RetryEvent.call.
+    """
+
+    __slots__ = ("policy", "func", "kwargs", "attempts", "retry_delay",
+                 "logger", "started", "attempt_started", "deadline_at",
+                 "__weakref__")
+
+    def __init__(self, policy, func, args, kwargs, started=None):
+        self.policy = policy
+        self.func = func
+        self.kwargs = kwargs
+        self.attempts = 1
+        self.retry_delay = None
+        self.logger = policy.get_logger(args)
+        if started is None and (policy.deadline is not None or
+                                policy.listeners or
+                                policy.adaptive is not None):
+            started = monotonic()
+        self.started = started
+        self.attempt_started = started
+        self.deadline_at = (None if policy.deadline is None
+                            else started + policy.deadline)
+
+    def next_delay(self, error, tb=None):
+        """Returns delay before the next attempt
+
+        Raises error if it shouldn't be retried.
+
+        @param tb: traceback of error (sys.exc_info()[2]) to raise it with
+        """
+        policy = self.policy
+        retry_delay = self._get_delay(error)
+        if retry_delay is None:
+            if policy.listeners:
+                policy.notify("on_giveup", self, self.attempts, error=error)
+            _reraise(error, tb)
+
+        if self.logger:
+            policy.log_retry(self.logger, self.func, error, self.attempts,
+                             retry_delay)
+        if policy.listeners:
+            policy.notify("on_retry", self, self.attempts, retry_delay,
+                          error)
+        self.attempts += 1
+        return retry_delay
+
+    def _get_delay(self, error):
+        """Returns delay before the next attempt or None to give up"""
+        policy = self.policy
+        retriable = policy.need_to_retry(error)
+        breaker = policy.circuit_breaker
+        if breaker is not None:
+            breaker.record_error(error, retriable)
+            if breaker.is_open():
+                return None
+        if not retriable:
+            return None
+
+        adaptive = policy.adaptive
+        if adaptive is None:
+            if self.attempts >= policy.attempts_number >= 0:
+                return None
+            retry_delay = policy.backoff.get_delay(self.attempts,
+                                                   self.retry_delay)
+        else:
+            adaptive.record_failure(self.func)
+            attempts_number = adaptive.get_attempts_number(
+                self.func, policy.attempts_number)
+            if self.attempts >= attempts_number:
+                adaptive.record_giveup(self.func)
+                return None
+            retry_delay = adaptive.get_delay(self.func, self.attempts)
+        # Backoff schedule goes on from computed delay even if server
+        # requested another one
+        self.retry_delay = retry_delay
+        if policy.retry_after is not None:
+            server_delay = policy.retry_after(error)
+            if server_delay is not None:
+                retry_delay = server_delay
+                if 0 <= policy.max_delay < retry_delay:
+                    retry_delay = policy.max_delay
+
+        slack = None
+        if policy.deadline is not None:
+            # Next attempt is expected to take as long as the previous one,
+            # delay is shortened to leave time for it
+            now = monotonic()
+            slack = self.deadline_at - now - (now - self.attempt_started)
+            if slack <= 0:
+                return None
+            if retry_delay > slack:
+                retry_delay = slack
+
+        budget = policy.retry_budget
+        if budget is not None and not budget.try_withdraw():
+            return None
+        if policy.rate_limiter is not None:
+            # Backoff delay is spent waiting for a token
+            retry_delay = policy.rate_limiter.reserve(
+                ratelimit.RETRY, retry_delay, max_wait=slack)
+        return retry_delay
+
+    def before_attempt(self, error, tb=None):
+        """Raises error of previous attempt if next one isn't allowed
+
+        @param tb: traceback of error (sys.exc_info()[2]) to raise it with
+        """
+        policy = self.policy
+        breaker = policy.circuit_breaker
+        if breaker is not None and not breaker.allow_request():
+            if policy.listeners:
+                policy.notify("on_giveup", self, self.attempts - 1,
+                              error=error)
+            _reraise(error, tb)
+        if policy.deadline is not None or policy.adaptive is not None:
+            self.attempt_started = monotonic()
+        if policy.deadline is not None:
+            if policy.deadline_kwarg is not None:
+                self.kwargs[policy.deadline_kwarg] = max(
+                    self.deadline_at - self.attempt_started, 0)
+        if policy.listeners:
+            policy.notify("on_attempt", self, self.attempts)
+
+    def on_success(self):
+        policy = self.policy
+        policy.record_success(self.func, self.attempt_started)
+        if policy.listeners:
+            policy.notify("on_success", self, self.attempts)
+
+
+def is_coroutine_function(func):
+    iscoroutinefunction = getattr(inspect, "iscoroutinefunction", None)
+    return iscoroutinefunction is not None and iscoroutinefunction(func)
+
+
+def is_async_generator_function(func):
+    isasyncgenfunction = getattr(inspect, "isasyncgenfunction", None)
+    return isasyncgenfunction is not None and isasyncgenfunction(func)
+
+
 def retry(attempts_number, delay=0, step=0, max_delay=-1,
-          retry_on=Exception, logger=None):
+          retry_on=Exception, logger=None, backoff=None,
+          circuit_breaker=None, retry_budget=None, retry_after=None,
+          deadline=None, deadline_kwarg=None, listeners=None,
+          log_interval=None, adaptive=None, cache=None, rate_limiter=None):
     """Reties function several times
 
     @param attempts_number: number of function calls (first call + retries)
@@ -68,59 +700,54 @@ def retry(attempts_number, delay=0, step=0, max_delay=-1,
     @param retry_on: exception that should be handled or function that checks
                      if retry should be executed (default: Exception)
     @param logger: logger to write warnings
+    @param backoff: BackoffStrategy computing delays instead of delay, step
+                    and max_delay
+    @param circuit_breaker: circuit.CircuitBreaker failing calls immediately
+                            while dependency is down
+    @param retry_budget: budget.RetryBudget limiting share of retries,
+                         function gives up when it is spent
+    @param retry_after: function returning delay requested by server for
+                        error (or None), it is used instead of computed delay
+    @param deadline: maximum number of seconds all attempts and delays may
+                     take, remaining time is returned by remaining_time()
+    @param deadline_kwarg: name of keyword argument to pass remaining
+                           seconds to decorated function with
+    @param listeners: listeners.RetryListener objects notified about
+                      attempts, retries, successes and failures
+    @param log_interval: write one warning per exception class every
+                         log_interval seconds, suppress and count others
+    @param adaptive: adaptive.AdaptivePolicy computing delays and number of
+                     attempts (limited by attempts_number) from observed
+                     failure rate and latency
+    @param cache: caching.RetryCache returning cached results and stale
+                  ones if function fails
+    @param rate_limiter: ratelimit.RateLimiter every attempt takes a token
+                         from, retries yield to first attempts
 
     @return: the result of decorated function
     """
+    return RetryPolicy(attempts_number, delay, step, max_delay,
+                       retry_on, logger, backoff, circuit_breaker,
+                       retry_budget, retry_after, deadline,
+                       deadline_kwarg, listeners, log_interval,
+                       adaptive, cache, rate_limiter).wrap
 
-    def decorator(func):
 
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            current_logger = logger
+def aretry(attempts_number, delay=0, step=0, max_delay=-1,
+           retry_on=Exception, logger=None, backoff=None,
+           circuit_breaker=None, retry_budget=None, retry_after=None,
+           deadline=None, deadline_kwarg=None, listeners=None,
+           log_interval=None, adaptive=None, rate_limiter=None):
+    """Reties coroutine function several times
 
-            attempts = 1
-            retry_delay = delay
+    Same as retry, but decorated function is always awaited and
+    asyncio.sleep is used between attempts. retry detects coroutine
+    functions itself, aretry is useful for callables returning awaitables.
 
-            try:
-                if isinstance(args[0], object):
-                    current_logger = args[0].get_logger()
-            except (AttributeError, IndexError):
-                pass
-
-            if isinstance(retry_on, (types.FunctionType,
-                                     types.MethodType,)):
-                catch_strategy = CatchFunctionStrategy(retry_on)
-            else:
-                catch_strategy = CatchExceptionStrategy(retry_on)
-
-            while attempts <= attempts_number or attempts_number < 0:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if catch_strategy.need_to_retry(e):
-                        if attempts >= attempts_number >= 0:
-                                raise
-                        elif current_logger:
-                            retry_count = "inf" if attempts_number < 0 \
-                                else attempts_number - 1
-
-                            current_logger.warning(
-                                "Retry: Call to %(fn)s failed due to "
-                                "%(exc_class)s: %(exc)s, retry "
-                                "attempt #%(retry_no)s/"
-                                "%(retry_count)s after %(delay)ss",
-                                dict(fn=func.__name__,
-                                     exc=str(e),
-                                     retry_no=attempts,
-                                     exc_class=e.__class__.__name__,
-                                     retry_count=retry_count,
-                                     delay=retry_delay))
-                        time.sleep(retry_delay)
-                        attempts += 1
-                        retry_delay += step
-                        if 0 <= max_delay < retry_delay:
-                            retry_delay = max_delay
-                    else:
-                        raise
-        return wrapper
-    return decorator
+    @return: the result of decorated coroutine function
+    """
+    return RetryPolicy(attempts_number, delay, step, max_delay,
+                       retry_on, logger, backoff, circuit_breaker,
+                       retry_budget, retry_after, deadline,
+                       deadline_kwarg, listeners, log_interval,
+                       adaptive, rate_limiter=rate_limiter).wrap_async
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Executor rescheduling failed tasks instead of sleeping in workers
+
+Failed tasks wait for their retry delays in a timer heap served by one
+thread and are submitted to the wrapped executor again, so workers of a
+small pool stay busy while many tasks are in backoff.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+try:
+    from concurrent import futures
+except ImportError:  # Python 2 without futures package
+    futures = None
+
+from retrylib import decorators
+
+
+class _Task(object):
+
+    __slots__ = ("func", "args", "kwargs", "future", "started", "state")
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = futures.Future()
+        self.started = None
+        self.state = None
+
+
+class RetryingExecutor(object):
+    """Wraps concurrent.futures executor retrying failed tasks
+
+    Retries follow the policy: retry_on, delays, circuit breaker, budget,
+    listeners and deadline are honored. Tasks are submitted to executor
+    as is, so ProcessPoolExecutor works with picklable functions.
+    Returned futures are finished when a task succeeds or is given up.
+    """
+
+    def __init__(self, executor, policy):
+        """Creates executor retrying calls submitted to it
+
+        @param executor: concurrent.futures.Executor running attempts
+        @param policy: decorators.RetryPolicy
+        """
+        if futures is None:
+            raise ImportError("futures package is required on Python 2")
+        self.executor = executor
+        self.policy = policy
+        self._timers = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._outstanding = 0
+        self._shutdown = False
+        self._cancel_retries = False
+        self._thread = None
+
+    def submit(self, func, *args, **kwargs):
+        """Schedules func(*args, **kwargs) and returns its Future"""
+        task = _Task(func, args, kwargs)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after "
+                                   "shutdown")
+            self._outstanding += 1
+        if self.policy.attempts_number == 0:
+            self._finish(task, result=None)
+            return task.future
+        try:
+            if self.policy.listeners:
+                # Attempts don't run in the caller's context, listeners
+                # tracking running calls by context (TracingListener) must
+                # not see the call there
+                from retrylib import tracing
+                task.started, task.state = tracing.run_detached(
+                    self.policy.start_call, func, args, kwargs)
+            else:
+                task.started, task.state = self.policy.start_call(
+                    func, args, kwargs)
+        except Exception as e:
+            self._finish(task, error=e)
+            return task.future
+        wait = self.policy.reserve_first_attempt()
+        if wait:
+            # Caller is slowed down like with rate limited decorators
+            time.sleep(wait)
+        self._run(task)
+        return task.future
+
+    def map(self, func, *iterables, **kwargs):
+        """Returns iterator over results like Executor.map
+
+        @param timeout: seconds to wait for each result
+        """
+        timeout = kwargs.pop("timeout", None)
+        tasks = [self.submit(func, *args) for args in zip(*iterables)]
+
+        def results():
+            try:
+                for future in tasks:
+                    yield future.result(timeout)
+            finally:
+                for future in tasks:
+                    future.cancel()
+
+        return results()
+
+    def shutdown(self, wait=True):
+        """Stops accepting tasks and shuts wrapped executor down
+
+        @param wait: wait until all tasks including delayed retries are
+                     finished. Otherwise delayed retries are cancelled.
+        """
+        with self._condition:
+            self._shutdown = True
+            if wait:
+                while self._outstanding:
+                    self._condition.wait()
+            else:
+                self._cancel_retries = True
+            cancelled = [timer[2] for timer in self._timers]
+            del self._timers[:]
+            thread = self._thread
+            self._condition.notify_all()
+        for task in cancelled:
+            self._cancel(task)
+        if thread is not None and wait:
+            thread.join()
+        self.executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+        return False
+
+    def _run(self, task):
+        try:
+            attempt = self.executor.submit(task.func, *task.args,
+                                           **task.kwargs)
+        except Exception as e:
+            self._finish(task, error=e)
+            return
+        attempt.add_done_callback(
+            lambda attempt: self._on_attempt_done(task, attempt))
+
+    def _on_attempt_done(self, task, attempt):
+        if attempt.cancelled():
+            self.policy.cancel_attempt()
+            self._cancel(task)
+            return
+        error = attempt.exception()
+        if error is None:
+            if task.state is None:
+                self.policy.finish_call(task.func, task.started)
+            else:
+                task.state.on_success()
+            self._finish(task, result=attempt.result())
+            return
+        if task.future.cancelled():
+            self._finish(task, cancelled=True)
+            return
+        if task.state is None:
+            task.state = decorators.RetryState(
+                self.policy, task.func, task.args, task.kwargs,
+                task.started)
+        try:
+            delay = task.state.next_delay(error)
+        except Exception as e:
+            self._finish(task, error=e)
+            return
+        self._schedule(task, error, delay)
+
+    def _schedule(self, task, error, delay):
+        with self._condition:
+            cancelled = self._cancel_retries
+            if not cancelled:
+                heapq.heappush(self._timers,
+                               (decorators.monotonic() + delay,
+                                next(self._counter), task, error))
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._serve_timers,
+                        name="RetryingExecutor timers")
+                    self._thread.daemon = True
+                    self._thread.start()
+                self._condition.notify_all()
+        if cancelled:
+            self._cancel(task)
+
+    def _serve_timers(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._timers:
+                        if self._shutdown and not self._outstanding:
+                            self._thread = None
+                            return
+                        self._condition.wait()
+                        continue
+                    due, _, task, error = self._timers[0]
+                    timeout = due - decorators.monotonic()
+                    if timeout <= 0:
+                        heapq.heappop(self._timers)
+                        break
+                    self._condition.wait(timeout)
+            self._retry(task, error)
+
+    def _retry(self, task, error):
+        if task.future.cancelled():
+            self._finish(task, cancelled=True)
+            return
+        try:
+            task.state.before_attempt(error)
+        except Exception as e:
+            self._finish(task, error=e)
+            return
+        self._run(task)
+
+    def _cancel(self, task):
+        task.future.cancel()
+        self._finish(task, cancelled=True)
+
+    def _finish(self, task, result=None, error=None, cancelled=False):
+        if not cancelled and task.future.set_running_or_notify_cancel():
+            if error is None:
+                task.future.set_result(result)
+            else:
+                task.future.set_exception(error)
+        with self._condition:
+            self._outstanding -= 1
+            self._condition.notify_all()
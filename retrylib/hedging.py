@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hedged requests for latency sensitive network calls
+
+If the first attempt isn't finished within hedge delay, another attempt is
+started in parallel and the first successful result is returned. Attempts
+failed with network failures are ignored while others are in flight.
+Hedge delay is either fixed or is a percentile of observed latencies.
+"""
+
+import functools
+import threading
+import time
+
+try:
+    from concurrent import futures
+except ImportError:  # Python 2 without futures package
+    futures = None
+
+from retrylib import decorators
+from retrylib import network
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+
+class LatencyTracker(object):
+    """Keeps the last window latencies and their percentile
+
+    Percentile is recomputed every window / 10 samples, so recording is
+    O(1) on average.
+    """
+
+    def __init__(self, percentile=0.95, window=1000, min_samples=20):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = []
+        self._position = 0
+        self._since_update = 0
+        self._refresh_every = max(window // 10, 1)
+        self._value = None
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            if len(self._samples) < self.window:
+                self._samples.append(latency)
+            else:
+                self._samples[self._position] = latency
+                self._position = (self._position + 1) % self.window
+            self._since_update += 1
+            if (self._value is None and
+                    len(self._samples) >= self.min_samples or
+                    self._since_update >= self._refresh_every):
+                self._update()
+
+    def _update(self):
+        self._since_update = 0
+        if len(self._samples) < self.min_samples:
+            return
+        ordered = sorted(self._samples)
+        index = min(int(len(ordered) * self.percentile), len(ordered) - 1)
+        self._value = ordered[index]
+
+    @property
+    def value(self):
+        """Returns latency percentile or None if samples are too few"""
+        return self._value
+
+
+class Hedger(object):
+    """Settings and shared state of hedged calls
+
+    Hedger may be shared by several functions, then they share latency
+    statistics and limit of concurrent hedges.
+    """
+
+    def __init__(self, delay=None, max_hedges=1, max_concurrent_hedges=10,
+                 retry_on=None, executor=None, max_workers=None,
+                 percentile=0.95, initial_delay=0.1, window=1000):
+        """Creates hedger of slow attempts
+
+        @param delay: seconds to wait for attempt before starting a hedge,
+                      observed latency percentile is used if it is None
+        @param max_hedges: maximum number of additional attempts per call
+        @param max_concurrent_hedges: maximum number of hedges in flight
+                                      across all calls
+        @param retry_on: exception, function or CatchStrategy telling
+                         which failures may be hedged
+                         (default: network.is_network_failure)
+        @param executor: concurrent.futures.Executor running attempts of
+                         regular functions
+        @param max_workers: size of thread pool created if executor isn't
+                            passed
+        @param percentile: latency percentile used as delay
+        @param initial_delay: delay used until enough latencies are seen
+        @param window: number of latencies percentile is computed from
+        """
+        if futures is None:
+            raise ImportError("futures package is required on Python 2")
+        self.delay = delay
+        self.max_hedges = max_hedges
+        self.initial_delay = initial_delay
+        self.catch_strategy = decorators.get_catch_strategy(
+            network.is_network_failure if retry_on is None else retry_on)
+        self.latency = LatencyTracker(percentile, window)
+        self._hedges = threading.Semaphore(max_concurrent_hedges)
+        self._executor = executor
+        self._max_workers = max_workers
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(
+                        self._max_workers)
+        return self._executor
+
+    def get_delay(self):
+        if self.delay is not None:
+            return self.delay
+        observed = self.latency.value
+        return self.initial_delay if observed is None else observed
+
+    def need_to_retry(self, exc):
+        return self.catch_strategy.need_to_retry(exc)
+
+    def acquire_hedge(self, hedges):
+        """Returns True if one more hedge may be started
+
+        @param hedges: number of hedges started by the call
+        """
+        return hedges < self.max_hedges and self._hedges.acquire(False)
+
+    def release_hedge(self, _future=None):
+        self._hedges.release()
+
+    def timed(self, func, args, kwargs):
+        """Calls func recording its latency if it succeeds"""
+        started = monotonic()
+        result = func(*args, **kwargs)
+        self.latency.record(monotonic() - started)
+        return result
+
+    def submit(self, func, args, kwargs, hedge):
+        future = self.executor.submit(self.timed, func, args, kwargs)
+        if hedge:
+            future.add_done_callback(self.release_hedge)
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """Calls func hedging slow attempts"""
+        pending = set([self.submit(func, args, kwargs, hedge=False)])
+        hedges = 0
+        failed = None
+        try:
+            while True:
+                timeout = (self.get_delay() if hedges < self.max_hedges
+                           else None)
+                done, pending = futures.wait(
+                    pending, timeout, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    exc = future.exception()
+                    if exc is None or not self.need_to_retry(exc):
+                        # Error is raised with traceback of the attempt
+                        return future.result()
+                    failed = future
+                if pending and done:
+                    # Failed attempt is replaced only if nothing is in
+                    # flight, otherwise keep waiting for the others
+                    continue
+                if not self.acquire_hedge(hedges):
+                    if pending:
+                        hedges = self.max_hedges
+                        continue
+                    return failed.result()
+                hedges += 1
+                pending.add(self.submit(func, args, kwargs, hedge=True))
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def wrap(self, func):
+        """Returns func wrapped with hedging
+
+        Coroutine functions are hedged with asyncio tasks.
+        """
+        if decorators.is_coroutine_function(func):
+            from retrylib import aio
+            return aio.wrap_hedged(self, func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        wrapper.hedger = self
+        return wrapper
+
+    __call__ = wrap
+
+
+def hedge(delay=None, max_hedges=1, max_concurrent_hedges=10, retry_on=None,
+          executor=None, percentile=0.95, initial_delay=0.1):
+    """Hedges slow calls of function with parallel attempts
+
+    @param delay: seconds to wait for attempt before starting a hedge,
+                  observed latency percentile is used if it is None
+    @param max_hedges: maximum number of additional attempts per call
+    @param max_concurrent_hedges: maximum number of hedges in flight
+    @param retry_on: exception that should be handled or function that checks
+                     if failed attempt may be hedged
+                     (default: network.is_network_failure)
+    @param executor: concurrent.futures.Executor running attempts
+    @param percentile: latency percentile used as delay
+    @param initial_delay: delay used until enough latencies are seen
+
+    @return: the first successful result of decorated function
+    """
+    return Hedger(delay, max_hedges, max_concurrent_hedges, retry_on,
+                  executor, percentile=percentile,
+                  initial_delay=initial_delay).wrap
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Listeners of retried calls
+
+Listeners are passed to retry decorators and are notified about every
+attempt, retry, success and final failure of decorated function.
+"""
+
+import bisect
+import threading
+
+
+class RetryEvent(object):
+
+    __slots__ = ("func_name", "attempt", "delay", "elapsed", "error", "call")
+
+    def __init__(self, func_name, attempt, elapsed, delay=None, error=None,
+                 call=None):
+        """Describes event of a retried call
+
+        @param func_name: qualified name of decorated function
+        @param attempt: number of attempt (starts from 1)
+        @param elapsed: seconds passed since the call started
+        @param delay: delay before the next attempt (on_retry only)
+        @param error: exception raised by attempt (on_retry and on_giveup)
+        @param call: decorators.RetryState of the call, the same object is
+                     passed with all events of a call wherever its attempts
+                     run
+        """
+        self.func_name = func_name
+        self.attempt = attempt
+        self.elapsed = elapsed
+        self.delay = delay
+        self.error = error
+        self.call = call
+
+    def __repr__(self):
+        return ("RetryEvent(func_name=%r, attempt=%r, elapsed=%r, delay=%r, "
+                "error=%r)" % (self.func_name, self.attempt, self.elapsed,
+                               self.delay, self.error))
+
+
+def get_func_name(func):
+    return "%s.%s" % (getattr(func, "__module__", None),
+                      getattr(func, "__qualname__", func.__name__))
+
+
+class RetryListener(object):
+    """Base listener, all notifications are ignored"""
+
+    def on_attempt(self, event):
+        """Function is about to be called"""
+
+    def on_retry(self, event):
+        """Attempt failed, function will be called again after delay"""
+
+    def on_giveup(self, event):
+        """Attempt failed and error is raised to caller"""
+
+    def on_success(self, event):
+        """Attempt succeeded"""
+
+
+# Upper bounds of call duration histogram buckets, seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+
+
+class FunctionMetrics(object):
+
+    __slots__ = ("attempts", "retries", "successes", "giveups",
+                 "bucket_counts", "duration_sum")
+
+    def __init__(self, buckets_number):
+        self.attempts = 0
+        self.retries = 0
+        self.successes = 0
+        self.giveups = 0
+        # The last bucket is +Inf
+        self.bucket_counts = [0] * (buckets_number + 1)
+        self.duration_sum = 0.0
+
+    def copy(self):
+        metrics = FunctionMetrics(0)
+        metrics.attempts = self.attempts
+        metrics.retries = self.retries
+        metrics.successes = self.successes
+        metrics.giveups = self.giveups
+        metrics.bucket_counts = list(self.bucket_counts)
+        metrics.duration_sum = self.duration_sum
+        return metrics
+
+
+def _escape(value):
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+class MetricsCollector(RetryListener):
+    """In-memory per-function counters and call duration histograms
+
+    Collected metrics are exported in Prometheus text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="retrylib"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, func_name):
+        metrics = self._metrics.get(func_name)
+        if metrics is None:
+            metrics = self._metrics.setdefault(
+                func_name, FunctionMetrics(len(self.buckets)))
+        return metrics
+
+    def _observe(self, metrics, elapsed):
+        metrics.bucket_counts[bisect.bisect_left(self.buckets,
+                                                 elapsed)] += 1
+        metrics.duration_sum += elapsed
+
+    def on_attempt(self, event):
+        metrics = self._get(event.func_name)
+        with self._lock:
+            metrics.attempts += 1
+
+    def on_retry(self, event):
+        metrics = self._get(event.func_name)
+        with self._lock:
+            metrics.retries += 1
+
+    def on_giveup(self, event):
+        metrics = self._get(event.func_name)
+        with self._lock:
+            metrics.giveups += 1
+            self._observe(metrics, event.elapsed)
+
+    def on_success(self, event):
+        metrics = self._get(event.func_name)
+        with self._lock:
+            metrics.successes += 1
+            self._observe(metrics, event.elapsed)
+
+    def get_metrics(self, func_name):
+        """Returns copy of FunctionMetrics of function or None"""
+        with self._lock:
+            metrics = self._metrics.get(func_name)
+            return metrics.copy() if metrics is not None else None
+
+    def to_prometheus(self):
+        """Returns collected metrics in Prometheus text format"""
+        with self._lock:
+            snapshot = sorted((name, metrics.copy())
+                              for name, metrics in self._metrics.items())
+
+        lines = []
+        counters = (("attempts", "Number of attempts of retried functions"),
+                    ("retries", "Number of retries of failed attempts"),
+                    ("successes", "Number of successful calls"),
+                    ("giveups", "Number of calls failed after retries"))
+        for slot, help_text in counters:
+            metric = "%s_%s_total" % (self.prefix, slot)
+            lines.append("# HELP %s %s" % (metric, help_text))
+            lines.append("# TYPE %s counter" % metric)
+            for name, metrics in snapshot:
+                lines.append('%s{function="%s"} %s' %
+                             (metric, _escape(name), getattr(metrics, slot)))
+
+        metric = "%s_call_duration_seconds" % self.prefix
+        lines.append("# HELP %s Duration of calls including retries" %
+                     metric)
+        lines.append("# TYPE %s histogram" % metric)
+        for name, metrics in snapshot:
+            label = _escape(name)
+            total = 0
+            bounds = [repr(float(bound)) for bound in self.buckets]
+            for bound, count in zip(bounds + ["+Inf"],
+                                    metrics.bucket_counts):
+                total += count
+                lines.append('%s_bucket{function="%s",le="%s"} %s' %
+                             (metric, label, bound, total))
+            lines.append('%s_sum{function="%s"} %r' %
+                         (metric, label, metrics.duration_sum))
+            lines.append('%s_count{function="%s"} %s' %
+                         (metric, label, total))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Rate limiting of retry warnings"""
+
+import threading
+import time
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+
+class RetryLogLimiter(object):
+    """Lets one message per key through every interval seconds
+
+    Messages dropped in between are counted and the count is reported with
+    the next message let through.
+    """
+
+    def __init__(self, interval=10, clock=None):
+        self.interval = interval
+        self._clock = clock or monotonic
+        self._lock = threading.Lock()
+        # key -> [time of the last message let through, suppressed count]
+        self._entries = {}
+
+    def acquire(self, key):
+        """Returns None if message should be dropped
+
+        Otherwise returns number of messages suppressed since the previous
+        one.
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [now, 0]
+                return 0
+            if now - entry[0] < self.interval:
+                entry[1] += 1
+                return None
+            suppressed = entry[1]
+            entry[0] = now
+            entry[1] = 0
+            return suppressed
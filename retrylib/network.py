@@ -14,12 +14,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from email import utils as email_utils
 import functools
 import requests
 from requests import exceptions
 import socket
 from six.moves import http_client, urllib
+import sys
+import time
 
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from retrylib import classifier
 from retrylib import decorators
 from retrylib import defaults
 
@@ -32,7 +46,22 @@ RETRY_HTTPLIB_EXCEPTIONS = (http_client.BadStatusLine,
 RETRY_URLLIB_EXCEPTIONS = (urllib.error.HTTPError, )
 RETRY_REQUESTS_EXCEPTIONS = (exceptions.ConnectionError,
                              exceptions.Timeout)
+if asyncio is not None:
+    RETRY_ASYNCIO_EXCEPTIONS = (asyncio.TimeoutError,
+                                asyncio.IncompleteReadError)
+else:
+    RETRY_ASYNCIO_EXCEPTIONS = ()
+if aiohttp is not None:
+    RETRY_AIOHTTP_EXCEPTIONS = (aiohttp.ClientConnectionError,
+                                aiohttp.ServerTimeoutError,
+                                aiohttp.ClientPayloadError)
+    AIOHTTP_RESPONSE_ERROR = aiohttp.ClientResponseError
+else:
+    RETRY_AIOHTTP_EXCEPTIONS = ()
+    AIOHTTP_RESPONSE_ERROR = ()
+TOO_MANY_REQUESTS = getattr(http_client, "TOO_MANY_REQUESTS", 429)
 RETRY_HTTP_CODES = (http_client.REQUEST_TIMEOUT,
+                    TOO_MANY_REQUESTS,
                     http_client.INTERNAL_SERVER_ERROR,
                     http_client.BAD_GATEWAY,
                     http_client.SERVICE_UNAVAILABLE,
@@ -47,23 +76,91 @@ def is_retriable_requests_httperror(error):
             error.response.status_code in RETRY_HTTP_CODES)
 
 
+def is_retriable_aiohttp_error(error):
+
+    """Returns true if error is retriable aiohttp.ClientResponseError."""
+
+    return (isinstance(error, AIOHTTP_RESPONSE_ERROR) and
+            error.status in RETRY_HTTP_CODES)
+
+
+# HTTP errors are retried only if their status codes are in
+# RETRY_HTTP_CODES, even though they are socket.error subclasses.
+NETWORK_FAILURE_CLASSIFIER = classifier.ExceptionClassifier(
+    exceptions=(RETRY_HTTPLIB_EXCEPTIONS +
+                RETRY_SOCKET_EXCEPTIONS +
+                RETRY_REQUESTS_EXCEPTIONS +
+                RETRY_ASYNCIO_EXCEPTIONS +
+                RETRY_AIOHTTP_EXCEPTIONS),
+    status_rules=[
+        classifier.StatusRule(RETRY_URLLIB_EXCEPTIONS,
+                              lambda error: error.code),
+        classifier.StatusRule(requests.exceptions.HTTPError,
+                              lambda error: error.response.status_code),
+        classifier.StatusRule(AIOHTTP_RESPONSE_ERROR,
+                              lambda error: error.status)],
+    status_codes=RETRY_HTTP_CODES)
+
+
 def is_network_failure(error):
 
     """Returns True when error is a network failure."""
 
-    return ((isinstance(error, RETRY_URLLIB_EXCEPTIONS)
-            and error.code in RETRY_HTTP_CODES) or
-            isinstance(error, RETRY_HTTPLIB_EXCEPTIONS) or
-            isinstance(error, RETRY_SOCKET_EXCEPTIONS) or
-            isinstance(error, RETRY_REQUESTS_EXCEPTIONS) or
-            is_retriable_requests_httperror(error))
+    return NETWORK_FAILURE_CLASSIFIER.need_to_retry(error)
+
+
+def parse_retry_after(value):
+
+    """Returns delay in seconds from Retry-After header value.
+
+    Value is either number of seconds or HTTP-date. None is returned if
+    value can't be parsed.
+    """
+
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    parsed = email_utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(email_utils.mktime_tz(parsed) - time.time(), 0)
+
+
+def get_retry_after(error):
+
+    """Returns delay requested by server with Retry-After header of error.
+
+    Supports requests.exceptions.HTTPError, urllib HTTPError and
+    aiohttp.ClientResponseError. Returns None if header isn't present.
+    """
+
+    if isinstance(error, requests.exceptions.HTTPError):
+        headers = getattr(error.response, "headers", None)
+    elif isinstance(error, (urllib.error.HTTPError, AIOHTTP_RESPONSE_ERROR)):
+        # Python 2 HTTPError has headers only if it is built with fp
+        headers = (getattr(error, "headers", None) or
+                   getattr(error, "hdrs", None))
+    else:
+        return None
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
 
 
 def retry(attempts_number=None, delay=None, step=0, max_delay=-1,
-          retry_on=None, logger=None):
+          retry_on=None, logger=None, backoff=None, circuit_breaker=None,
+          retry_budget=None, retry_after=get_retry_after, deadline=None,
+          deadline_kwarg=None, listeners=None, log_interval=None,
+          adaptive=None, cache=None, rate_limiter=None):
 
     """Reties function several times on network failures
 
+    Coroutine functions are retried without blocking event loop.
+
     @param attempts_number: number of function calls (first call + retries)
     @param delay: delay before first retry
     @param step: increment value of timeout on each retry
@@ -71,34 +168,122 @@ def retry(attempts_number=None, delay=None, step=0, max_delay=-1,
     @param retry_on: exception that should be handled or function that checks
                      if retry should be executed (default: Exception)
     @param logger: logger to write warnings
+    @param backoff: BackoffStrategy computing delays instead of delay, step
+                    and max_delay
+    @param circuit_breaker: circuit.CircuitBreaker failing calls immediately
+                            while dependency is down
+    @param retry_budget: budget.RetryBudget limiting share of retries,
+                         function gives up when it is spent
+    @param retry_after: function returning delay requested by server for
+                        error, Retry-After header is honored by default.
+                        Pass None to always use computed delays
+    @param deadline: maximum number of seconds all attempts and delays may
+                     take, remaining time is returned by
+                     decorators.remaining_time()
+    @param deadline_kwarg: name of keyword argument to pass remaining
+                           seconds to decorated function with
+    @param listeners: listeners.RetryListener objects notified about
+                      attempts, retries, successes and failures
+    @param log_interval: write one warning per exception class every
+                         log_interval seconds, suppress and count others
+    @param adaptive: adaptive.AdaptivePolicy computing delays and number of
+                     attempts (limited by attempts_number) from observed
+                     failure rate and latency
+    @param cache: caching.RetryCache returning cached results and stale
+                  ones if function fails
+    @param rate_limiter: ratelimit.RateLimiter every attempt takes a token
+                         from, retries yield to first attempts and wait for
+                         a token as a part of their delay
 
     @return: the result of decorated function
     """
 
+    return _retry(False, attempts_number, delay, retry_on,
+                  dict(step=step, max_delay=max_delay, logger=logger,
+                       backoff=backoff, circuit_breaker=circuit_breaker,
+                       retry_budget=retry_budget, retry_after=retry_after,
+                       deadline=deadline, deadline_kwarg=deadline_kwarg,
+                       listeners=listeners, log_interval=log_interval,
+                       adaptive=adaptive, cache=cache,
+                       rate_limiter=rate_limiter))
+
+
+def aretry(attempts_number=None, delay=None, step=0, max_delay=-1,
+           retry_on=None, logger=None, backoff=None, circuit_breaker=None,
+           retry_budget=None, retry_after=get_retry_after, deadline=None,
+           deadline_kwarg=None, listeners=None, log_interval=None,
+           adaptive=None, rate_limiter=None):
+
+    """Reties coroutine function several times on network failures
+
+    Same as retry, but decorated function is always awaited.
+
+    @return: the result of decorated coroutine function
+    """
+
+    return _retry(True, attempts_number, delay, retry_on,
+                  dict(step=step, max_delay=max_delay, logger=logger,
+                       backoff=backoff, circuit_breaker=circuit_breaker,
+                       retry_budget=retry_budget, retry_after=retry_after,
+                       deadline=deadline, deadline_kwarg=deadline_kwarg,
+                       listeners=listeners, log_interval=log_interval,
+                       adaptive=adaptive, rate_limiter=rate_limiter))
+
+
+def _retry(force_async, attempts_number, delay, retry_on, options):
+
+    if retry_on is None:
+        retry_on = is_network_failure
+
+    def compile_policy():
+        return decorators.RetryPolicy(
+            defaults.HTTP_RETRY_ATTEMPTS if attempts_number is None
+            else attempts_number,
+            defaults.HTTP_RETRY_DELAY if delay is None else delay,
+            retry_on=retry_on, **options)
+
+    def wrap(policy, func):
+        if force_async:
+            return policy.wrap_async(func)
+        return policy.wrap(func)
+
+    if attempts_number is not None and delay is not None:
+        return functools.partial(wrap, compile_policy())
+
     def decorator(func):
 
+        # Policy depends on module defaults which may be changed after
+        # decoration, so it is recompiled only when they differ.
+        compiled = [compile_policy()]
+        compiled.append(wrap(compiled[0], func))
+
+        def current():
+            """Returns the current policy and func wrapped with it"""
+            policy = compiled[0]
+            if ((attempts_number is None and
+                 policy.attempts_number != defaults.HTTP_RETRY_ATTEMPTS) or
+                    (delay is None and
+                     policy.delay != defaults.HTTP_RETRY_DELAY)):
+                policy = compile_policy()
+                compiled[:] = [policy, wrap(policy, func)]
+            return compiled
+
+        if force_async or decorators.is_coroutine_function(func):
+            from retrylib import aio
+            return aio.wrap_dynamic(func, lambda: current()[1])
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-
-            if attempts_number is not None:
-                retry_attempts = attempts_number
-            else:
-                retry_attempts = defaults.HTTP_RETRY_ATTEMPTS
-
-            if delay is not None:
-                retry_delay = delay
-            else:
-                retry_delay = defaults.HTTP_RETRY_DELAY
-
-            if retry_on is None:
-                retry_func = is_network_failure
-            else:
-                retry_func = retry_on
-
-            failover_func = decorators.retry(retry_attempts, retry_delay,
-                                             step, max_delay,
-                                             retry_func, logger)(func)
-            return failover_func(*args, **kwargs)
+            policy, wrapped = current()
+            if not policy.fast_path:
+                return wrapped(*args, **kwargs)
+            # Fast path of the policy is inlined to avoid packing
+            # arguments twice
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                error, tb = e, sys.exc_info()[2]
+            return policy.retry_failed(func, args, kwargs, error, tb=tb)
 
         return wrapper
 
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client-side rate limiter shared between first attempts and retries
+
+Limiter is a token bucket of burst tokens refilled at rate tokens per
+second. Callers reserve a token and get the number of seconds to wait for
+it, so nobody waits under the lock and the same limiter serves threads
+and coroutines. Reserved token is taken from the bucket at the time the
+call is made, calls waiting for tokens are served in order of reservation
+like with GCRA.
+
+Retries can't take the last retry_reserve tokens, they are left for first
+attempts. Delay of a retry is its backoff delay or time to wait for a
+token, whichever is longer. Retry doesn't take a token before its delay
+has passed, so first attempts made meanwhile aren't slowed down by it.
+"""
+
+import bisect
+import threading
+import time
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+FIRST_ATTEMPT = 0
+RETRY = 1
+
+
+class RateLimiter(object):
+
+    def __init__(self, rate, burst=1, retry_reserve=0, clock=None):
+        """Creates token bucket refilled with rate tokens per second
+
+        @param rate: number of calls allowed per second
+        @param burst: number of calls that may be made at once after
+                      limiter has been idle
+        @param retry_reserve: number of tokens retries can't take, first
+                              attempts are made without waiting while
+                              retries are waiting for them
+        @param clock: function returning monotonic time in seconds
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if not 0 <= retry_reserve < burst:
+            raise ValueError("retry_reserve must be less than burst")
+        self.rate = float(rate)
+        self.burst = burst
+        self.retry_reserve = retry_reserve
+        self._clock = clock or monotonic
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = self._clock()
+        # Sorted times when reserved tokens are taken
+        self._reserved = []
+
+    def _refill(self, until):
+        if until > self._updated:
+            self._tokens = min(self._tokens +
+                               (until - self._updated) * self.rate,
+                               self.burst)
+            self._updated = until
+
+    def _advance(self, now):
+        """Takes tokens reserved for calls made by now and refills bucket"""
+        due = bisect.bisect_right(self._reserved, now)
+        for taken in self._reserved[:due]:
+            self._refill(taken)
+            self._tokens -= 1
+        del self._reserved[:due]
+        self._refill(now)
+
+    def _get_time(self, now, start, needed):
+        """Returns the earliest time from start with needed tokens
+
+        Tokens reserved before that time are taken into account.
+        """
+        tokens, updated = self._tokens, now
+        for taken in self._reserved:
+            # Bucket is never full when tokens are lacking, so time to
+            # refill them is linear
+            ready = max(start, updated + (needed - tokens) / self.rate)
+            if ready < taken:
+                return ready
+            tokens = min(tokens + (taken - updated) * self.rate,
+                         self.burst) - 1
+            updated = taken
+        return max(start, updated + (needed - tokens) / self.rate)
+
+    @property
+    def tokens(self):
+        """Number of tokens in the bucket now
+
+        It is negative if tokens have been taken by calls ahead of refill.
+        Tokens reserved for calls made later aren't subtracted.
+        """
+        with self._lock:
+            self._advance(self._clock())
+            return self._tokens
+
+    def reserve(self, priority=FIRST_ATTEMPT, delay=0, max_wait=None):
+        """Reserves a token for a call made after delay seconds
+
+        @param priority: FIRST_ATTEMPT or RETRY
+        @param delay: seconds caller is going to wait anyway, e.g. backoff
+                      delay of a retry
+        @param max_wait: maximum number of seconds caller may wait
+        @return: seconds to wait before the call (at least delay) or None
+                 if it is longer than max_wait, nothing is reserved then
+        """
+        needed = 1 + (self.retry_reserve if priority == RETRY else 0)
+        with self._lock:
+            now = self._clock()
+            self._advance(now)
+            start = now + delay
+            ready = self._get_time(now, start, needed)
+            wait = delay if ready <= start else ready - now
+            if max_wait is not None and wait > max_wait:
+                return None
+            if ready <= now:
+                self._tokens -= 1
+            else:
+                bisect.insort(self._reserved, ready)
+        return wait
+
+    def try_acquire(self, priority=FIRST_ATTEMPT):
+        """Takes a token and returns True if it is available right now"""
+        return self.reserve(priority, max_wait=0) is not None
+
+    def acquire(self, priority=FIRST_ATTEMPT):
+        """Blocks until a token is available and takes it"""
+        wait = self.reserve(priority)
+        if wait:
+            time.sleep(wait)
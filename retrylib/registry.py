@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Named retry policies which may be reloaded at runtime
+
+Decorated functions reference policies by name, so retries may be
+tightened or loosened without redeploying:
+
+    @registry.retry("billing")
+    def charge():
+        ...
+
+    registry.load({"billing": {"attempts_number": 5, "delay": 0.5}})
+
+Every name has a PolicyRef whose policy attribute is replaced on reload.
+Calls read it once without locking, policy objects are immutable.
+"""
+
+import functools
+import importlib
+import json
+import os
+import threading
+
+import six
+
+from retrylib import backoff as backoff_strategies
+from retrylib import decorators
+
+
+ENV_PREFIX = "RETRYLIB_POLICY_"
+
+BACKOFF_STRATEGIES = {
+    "linear": backoff_strategies.LinearBackoff,
+    "exponential": backoff_strategies.ExponentialBackoff,
+    "full_jitter": backoff_strategies.FullJitterBackoff,
+    "equal_jitter": backoff_strategies.EqualJitterBackoff,
+    "decorrelated_jitter": backoff_strategies.DecorrelatedJitterBackoff,
+}
+
+# Options which may be set by configuration, others are passed as objects
+CONFIG_OPTIONS = ("attempts_number", "delay", "step", "max_delay",
+                  "retry_on", "backoff", "deadline", "deadline_kwarg",
+                  "log_interval")
+
+
+def import_object(path):
+    """Returns object by its dotted path, e.g. "socket.error" """
+    module_name, _, attr = path.rpartition(".")
+    if not module_name:
+        raise ValueError("%r isn't a dotted path" % path)
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def make_policy(options):
+    """Returns RetryPolicy built from configuration options
+
+    retry_on is a dotted path or list of them, backoff is a dict with
+    strategy name (see BACKOFF_STRATEGIES) and its parameters.
+    """
+    if isinstance(options, decorators.RetryPolicy):
+        return options
+    unknown = set(options) - set(CONFIG_OPTIONS)
+    if unknown:
+        raise ValueError("Unknown policy options: %s" %
+                         ", ".join(sorted(unknown)))
+    options = dict(options)
+    retry_on = options.get("retry_on")
+    if isinstance(retry_on, (list, tuple)):
+        options["retry_on"] = tuple(import_object(path) for path in retry_on)
+    elif isinstance(retry_on, six.string_types):
+        options["retry_on"] = import_object(retry_on)
+    backoff = options.get("backoff")
+    if isinstance(backoff, dict):
+        backoff = dict(backoff)
+        strategy = backoff.pop("strategy", "linear")
+        try:
+            strategy = BACKOFF_STRATEGIES[strategy]
+        except KeyError:
+            raise ValueError("Unknown backoff strategy %r" % strategy)
+        options["backoff"] = strategy(**backoff)
+    if "attempts_number" not in options:
+        raise ValueError("attempts_number is required")
+    return decorators.RetryPolicy(**options)
+
+
+class PolicyRef(object):
+    """Reference to the current policy of a name"""
+
+    __slots__ = ("name", "policy")
+
+    def __init__(self, name, policy=None):
+        self.name = name
+        self.policy = policy
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.name,
+                               self.policy)
+
+
+class PolicyRegistry(object):
+    """Named retry policies swapped atomically
+
+    Reloads build all policies first, so invalid configuration doesn't
+    change anything.
+    """
+
+    def __init__(self, policies=None, default=None):
+        """Creates registry of named policies
+
+        @param policies: dict of names and RetryPolicy objects or options
+        @param default: policy (or options) of names which aren't
+                        registered, calls to them fail if it is None
+        """
+        self.default = None if default is None else make_policy(default)
+        self._refs = {}
+        self._lock = threading.Lock()
+        if policies:
+            self.load(policies)
+
+    def ref(self, name):
+        """Returns PolicyRef of name, it is created if needed"""
+        ref = self._refs.get(name)
+        if ref is None:
+            with self._lock:
+                ref = self._refs.get(name)
+                if ref is None:
+                    ref = self._refs[name] = PolicyRef(name, self.default)
+        return ref
+
+    def get(self, name):
+        """Returns the current policy of name
+
+        @raise KeyError: if name isn't registered and there is no default
+        """
+        policy = self.ref(name).policy
+        if policy is None:
+            raise KeyError("Retry policy %r isn't registered" % name)
+        return policy
+
+    def names(self):
+        # Copied under the lock, since refs may be added while iterating
+        with self._lock:
+            refs = list(self._refs.items())
+        return sorted(name for name, ref in refs if ref.policy is not None)
+
+    def register(self, name, policy):
+        """Sets policy (RetryPolicy or options) of name"""
+        self.load({name: policy})
+
+    def load(self, config, replace=False):
+        """Sets policies of names from dict of names and options
+
+        @param replace: names missing in config are reset to default
+        """
+        policies = dict((name, make_policy(options))
+                        for name, options in config.items())
+        with self._lock:
+            if replace:
+                for name, ref in self._refs.items():
+                    if name not in policies:
+                        ref.policy = self.default
+            for name, policy in policies.items():
+                ref = self._refs.get(name)
+                if ref is None:
+                    self._refs[name] = PolicyRef(name, policy)
+                else:
+                    ref.policy = policy
+
+    def load_json(self, text, replace=False):
+        """Loads policies from JSON object of names and options"""
+        self.load(json.loads(text), replace)
+
+    def load_file(self, path, replace=False):
+        """Loads policies from JSON file"""
+        with open(path) as source:
+            self.load(json.load(source), replace)
+
+    def load_env(self, prefix=ENV_PREFIX, environ=None, replace=False):
+        """Loads policies from environment variables
+
+        Variable <prefix><NAME> keeps JSON options of policy name (lower
+        case), e.g. RETRYLIB_POLICY_BILLING='{"attempts_number": 5}'.
+        """
+        if environ is None:
+            environ = os.environ
+        config = dict((key[len(prefix):].lower(), json.loads(value))
+                      for key, value in environ.items()
+                      if key.startswith(prefix))
+        self.load(config, replace)
+
+    def retry(self, name):
+        """Returns decorator retrying function with the current policy
+
+        Policy is looked up on every call, so reloads apply to functions
+        decorated before them.
+        """
+        ref = self.ref(name)
+
+        def decorator(func):
+            if decorators.is_coroutine_function(func):
+                return self._wrap_async(ref, func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                policy = ref.policy
+                if policy is None:
+                    raise KeyError("Retry policy %r isn't registered" %
+                                   ref.name)
+                return policy.call(func, *args, **kwargs)
+
+            wrapper.policy_ref = ref
+            return wrapper
+
+        return decorator
+
+    def _wrap_async(self, ref, func):
+        from retrylib import aio
+
+        # Coroutine wrapper of the current policy is built once per reload
+        compiled = [None, None]
+
+        def current():
+            policy = ref.policy
+            if policy is None:
+                raise KeyError("Retry policy %r isn't registered" % ref.name)
+            if compiled[0] is not policy:
+                compiled[:] = [policy, policy.wrap_async(func)]
+            return compiled[1]
+
+        wrapper = aio.wrap_dynamic(func, current)
+        wrapper.policy_ref = ref
+        return wrapper
+
+
+# Registry used by module level functions
+REGISTRY = PolicyRegistry()
+
+get = REGISTRY.get
+register = REGISTRY.register
+load = REGISTRY.load
+load_json = REGISTRY.load_json
+load_file = REGISTRY.load_file
+load_env = REGISTRY.load_env
+retry = REGISTRY.retry
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""requests sessions retrying network failures on warm connection pools
+
+urllib3 discards a connection which has failed, but other idle
+connections of the same pool are often broken too (e.g. server has
+restarted or load balancer has dropped them). After a connection error
+only dropped idle connections of the failed host's pool are evicted, so
+the retry doesn't go out on another dead keep-alive connection while
+healthy connections stay warm and the session isn't rebuilt.
+"""
+
+import requests
+from requests import adapters
+from requests import exceptions
+from urllib3.util import connection as urllib3_connection
+
+from retrylib import network
+
+
+def evict_dropped_connections(session, url):
+    """Closes idle connections of url's pool dropped by the other side
+
+    Closed connections are replaced with empty slots, so they are
+    reconnected lazily when needed.
+
+    @return: number of evicted connections
+    """
+    adapter = session.get_adapter(url)
+    poolmanager = getattr(adapter, "poolmanager", None)
+    if poolmanager is None:
+        return 0
+    pool = poolmanager.connection_from_url(url)
+    queue = getattr(pool, "pool", None)
+    if queue is None:
+        # Pool is closed
+        return 0
+    evicted = 0
+    with queue.mutex:
+        for index, conn in enumerate(queue.queue):
+            if (conn is not None and
+                    urllib3_connection.is_connection_dropped(conn)):
+                conn.close()
+                queue.queue[index] = None
+                evicted += 1
+    return evicted
+
+
+class RetryingSession(object):
+    """Sends requests with session retrying them on network failures
+
+    Accepts network.retry parameters. Session is created with pool sizing
+    given if it isn't passed, otherwise adapters with pool sizing are
+    mounted only if any of pool parameters is given.
+    """
+
+    def __init__(self, session=None, attempts_number=None, delay=None,
+                 retry_on=None, raise_for_status=False,
+                 pool_connections=None, pool_maxsize=None, pool_block=None,
+                 **options):
+        """Creates session retrying requests on network failures
+
+        @param session: requests.Session to send requests with
+        @param raise_for_status: raise HTTPError for error statuses, so
+                                 retriable ones are retried
+        @param pool_connections: number of hosts to keep pools for
+        @param pool_maxsize: maximum number of connections kept per host
+        @param pool_block: wait for a free connection instead of opening
+                           one more when pool is exhausted
+        """
+        pool_options = (pool_connections, pool_maxsize, pool_block)
+        if session is None:
+            session = requests.Session()
+        elif pool_options == (None, None, None):
+            pool_options = None
+        if pool_options is not None:
+            adapter = adapters.HTTPAdapter(
+                pool_connections=(adapters.DEFAULT_POOLSIZE
+                                  if pool_connections is None
+                                  else pool_connections),
+                pool_maxsize=(adapters.DEFAULT_POOLSIZE
+                              if pool_maxsize is None else pool_maxsize),
+                pool_block=(adapters.DEFAULT_POOLBLOCK
+                            if pool_block is None else pool_block))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.raise_for_status = raise_for_status
+        self._send = network.retry(attempts_number, delay,
+                                   retry_on=retry_on, **options)(self._send)
+
+    @property
+    def pool_connections(self):
+        return self._adapter_option("_pool_connections")
+
+    @property
+    def pool_maxsize(self):
+        return self._adapter_option("_pool_maxsize")
+
+    @property
+    def pool_block(self):
+        return self._adapter_option("_pool_block")
+
+    def _adapter_option(self, name):
+        return getattr(self.session.get_adapter("https://"), name, None)
+
+    def _send(self, method, url, **kwargs):
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except exceptions.ConnectionError:
+            evict_dropped_connections(self.session, url)
+            raise
+        if self.raise_for_status:
+            response.raise_for_status()
+        return response
+
+    def request(self, method, url, **kwargs):
+        """Sends request retrying it on network failures"""
+        return self._send(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("GET", url, **kwargs)
+
+    def options(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("OPTIONS", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request("PATCH", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,581 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Retry state shared between processes and hosts
+
+Breakers and budgets of one process don't help when hundreds of workers
+retry the same dependency. SharedCircuitBreaker and SharedRetryBudget
+keep their state in a StateBackend:
+
+* MemoryBackend - in-process, for tests and single process services
+* MmapBackend - memory mapped file shared by processes of one host
+* RedisBackend - Redis server (or anything speaking its protocol)
+
+Shared state is synchronized at most once per sync_interval seconds,
+between synchronizations calls use local state, so their cost stays
+close to in-process breakers and budgets. Backend failures are logged
+and ignored: local state keeps working.
+
+Time in backends is wall clock time in milliseconds, so it is comparable
+between hosts.
+"""
+
+import abc
+import hashlib
+import logging
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+
+import six
+
+from retrylib import circuit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _millis(seconds):
+    return int(seconds * 1000)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class StateBackend(object):
+    """Storage of integer counters with expiration"""
+
+    @abc.abstractmethod
+    def incr(self, key, amount=1, ttl=None):
+        """Adds amount to counter and returns its new value
+
+        @param ttl: seconds counter is kept since it is created
+        """
+
+    @abc.abstractmethod
+    def get_many(self, keys):
+        """Returns list of values of keys (0 for missing keys)"""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        """Sets value of key, it is kept for ttl seconds if ttl is given"""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Removes key"""
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+
+class MemoryBackend(StateBackend):
+
+    def __init__(self, clock=None):
+        """Creates backend keeping state in memory of the process
+
+        @param clock: function returning wall clock time in seconds
+        """
+        self._clock = clock or time.time
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = self._clock()
+            entry = self._get(key, now)
+            if entry is None:
+                entry = [0, None if ttl is None else now + ttl]
+                self._values[key] = entry
+            entry[0] += amount
+            return entry[0]
+
+    def get_many(self, keys):
+        with self._lock:
+            now = self._clock()
+            return [0 if entry is None else entry[0]
+                    for entry in (self._get(key, now) for key in keys)]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = [
+                value, None if ttl is None else self._clock() + ttl]
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class MmapBackend(StateBackend):
+    """Hash table in memory mapped file shared by processes of one host
+
+    Slots are found by linear probing of a 64-bit key digest, expired
+    slots are reused. Processes serialize updates with fcntl lock of the
+    file (threads of a process - with a lock), only threads are
+    serialized where fcntl is unavailable.
+    """
+
+    SLOT = struct.Struct("<Qqd")
+
+    def __init__(self, path, slots=4096, clock=None):
+        """Creates backend keeping state in memory mapped file
+
+        @param path: file keeping the table, it is created if needed.
+                     All processes must use the same number of slots
+        @param slots: maximum number of live keys
+        @param clock: function returning wall clock time in seconds
+        """
+        self.path = path
+        self.slots = slots
+        self._clock = clock or time.time
+        self._lock = threading.Lock()
+        self._digests = {}
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _digest(self, key):
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = struct.unpack(
+                "<Q", hashlib.md5(key.encode("utf-8")).digest()[:8])[0]
+            # Zero marks empty slot
+            digest = self._digests.setdefault(key, digest or 1)
+        return digest
+
+    def _locked(self, operation, *args):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                return operation(self._clock(), *args)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, digest, now, create):
+        """Returns (offset, value, live) of key's slot
+
+        Offset is None if key isn't found and create is False, live is
+        False if key is missing or expired.
+        """
+        start = digest % self.slots
+        free = None
+        for probe in range(self.slots):
+            offset = ((start + probe) % self.slots) * self.SLOT.size
+            slot_digest, value, expires = self.SLOT.unpack_from(self._map,
+                                                                offset)
+            if slot_digest == 0:
+                if free is None:
+                    free = offset
+                break
+            expired = expires and expires <= now
+            if slot_digest == digest:
+                if expired:
+                    return offset, 0, False
+                return offset, value, True
+            if expired and free is None:
+                free = offset
+        if not create:
+            return None, 0, False
+        if free is None:
+            raise RuntimeError("Shared state %s is full" % self.path)
+        return free, 0, False
+
+    def _incr(self, now, key, amount, ttl):
+        digest = self._digest(key)
+        offset, value, live = self._find(digest, now, create=True)
+        if live:
+            expires = self.SLOT.unpack_from(self._map, offset)[2]
+        else:
+            expires = 0 if ttl is None else now + ttl
+        value += amount
+        self.SLOT.pack_into(self._map, offset, digest, value, expires)
+        return value
+
+    def _get_many(self, now, keys):
+        return [self._find(self._digest(key), now, create=False)[1]
+                for key in keys]
+
+    def _set(self, now, key, value, ttl):
+        offset, _, _ = self._find(self._digest(key), now, create=True)
+        self.SLOT.pack_into(self._map, offset, self._digest(key), value,
+                            0 if ttl is None else now + ttl)
+
+    def _delete(self, now, key):
+        offset, _, _ = self._find(self._digest(key), now, create=False)
+        if offset is not None:
+            # Slot stays occupied to keep probe chains, it expires at once
+            self.SLOT.pack_into(self._map, offset, self._digest(key), 0,
+                                -1)
+
+    def incr(self, key, amount=1, ttl=None):
+        return self._locked(self._incr, key, amount, ttl)
+
+    def get_many(self, keys):
+        return self._locked(self._get_many, keys)
+
+    def set(self, key, value, ttl=None):
+        self._locked(self._set, key, value, ttl)
+
+    def delete(self, key):
+        self._locked(self._delete, key)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend(StateBackend):
+    """Keeps state in Redis, talks RESP protocol itself
+
+    Connection is shared by threads and is reopened after errors.
+    """
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None,
+                 prefix="retrylib:", timeout=1):
+        """Creates backend keeping state in Redis
+
+        @param prefix: prefix of keys in Redis
+        @param timeout: socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._socket = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = self._reader = None
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port),
+                                                self.timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.password is not None:
+            self._execute([("AUTH", self.password)])
+        if self.db:
+            self._execute([("SELECT", self.db)])
+
+    @staticmethod
+    def _encode(command):
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise RedisError("Connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return self._reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError("Unknown reply %r" % line)
+
+    def _execute(self, commands):
+        self._socket.sendall(b"".join(self._encode(command)
+                                      for command in commands))
+        return [self._read_reply() for _ in commands]
+
+    def execute(self, *commands):
+        """Sends commands in one pipeline and returns their replies"""
+        with self._lock:
+            if self._socket is None:
+                self._connect()
+            try:
+                return self._execute(commands)
+            except (socket.error, RedisError):
+                self._disconnect()
+                raise
+
+    def incr(self, key, amount=1, ttl=None):
+        key = self.prefix + key
+        if ttl is None:
+            return self.execute(("INCRBY", key, amount))[0]
+        # Counter is created with expiration in the same transaction, so
+        # it isn't left without one if connection breaks
+        replies = self.execute(
+            ("MULTI", ), ("SET", key, 0, "PX", _millis(ttl), "NX"),
+            ("INCRBY", key, amount), ("EXEC", ))
+        return replies[-1][1]
+
+    def get_many(self, keys):
+        values = self.execute(
+            ("MGET", ) + tuple(self.prefix + key for key in keys))[0]
+        return [0 if value is None else int(value) for value in values]
+
+    def set(self, key, value, ttl=None):
+        command = ("SET", self.prefix + key, value)
+        if ttl is not None:
+            command += ("PX", _millis(ttl))
+        self.execute(command)
+
+    def delete(self, key):
+        self.execute(("DEL", self.prefix + key))
+
+
+class SharedCircuitBreaker(circuit.CircuitBreaker):
+    """Circuit breaker opened for all processes sharing backend
+
+    Breaker opening publishes the time it recovers at, other breakers of
+    the same name read it at most every sync_interval seconds and open
+    too. Closing removes it.
+    """
+
+    def __init__(self, backend, name, failure_threshold=5,
+                 recovery_timeout=30, half_open_calls=1, retry_on=None,
+                 sync_interval=1, clock=None, wall_clock=None):
+        """Creates circuit breaker sharing its state through backend
+
+        @param backend: StateBackend
+        @param name: name of the circuit shared by processes
+        @param sync_interval: seconds between reads of shared state
+        @param wall_clock: function returning wall clock time in seconds
+        """
+        super(SharedCircuitBreaker, self).__init__(
+            failure_threshold, recovery_timeout, half_open_calls, retry_on,
+            name, clock)
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self._wall_clock = wall_clock or time.time
+        self._key = "circuit:%s:open-until" % name
+        self._next_sync = 0
+
+    def allow_request(self):
+        if self._state == circuit.CLOSED:
+            now = self._clock()
+            if now < self._next_sync:
+                return True
+            self._next_sync = now + self.sync_interval
+            self._sync()
+        return super(SharedCircuitBreaker, self).allow_request()
+
+    def _sync(self):
+        try:
+            open_until = self.backend.get(self._key)
+        except Exception:
+            LOG.warning("Failed to read state of circuit %s", self.name,
+                        exc_info=True)
+            return
+        remaining = open_until / 1000.0 - self._wall_clock()
+        if remaining <= 0:
+            return
+        with self._lock:
+            if self._state == circuit.CLOSED:
+                self._state = circuit.OPEN
+                self._opened_at = (self._clock() - self.recovery_timeout +
+                                   min(remaining, self.recovery_timeout))
+
+    def record_failure(self):
+        was_open = self._state == circuit.OPEN
+        super(SharedCircuitBreaker, self).record_failure()
+        if self._state == circuit.OPEN and not was_open:
+            self._publish(self._wall_clock() + self.recovery_timeout)
+
+    def record_success(self):
+        was_closed = self._state == circuit.CLOSED
+        super(SharedCircuitBreaker, self).record_success()
+        if not was_closed:
+            self._publish(None)
+
+    def reset(self):
+        super(SharedCircuitBreaker, self).reset()
+        self._publish(None)
+
+    def _publish(self, open_until):
+        try:
+            if open_until is None:
+                self.backend.delete(self._key)
+            else:
+                self.backend.set(self._key, _millis(open_until),
+                                 ttl=self.recovery_timeout)
+        except Exception:
+            LOG.warning("Failed to publish state of circuit %s", self.name,
+                        exc_info=True)
+
+
+class SharedRetryBudget(object):
+    """Retry budget counting calls of all processes sharing backend
+
+    Successes and retries are counted locally per second and added to
+    per-second counters of backend every sync_interval seconds, when
+    totals of the window are read back. min_retries_per_second is shared
+    by all processes too. Totals read back are used for one window at
+    most, local counters not added to backend expire after window like in
+    budget.RetryBudget, so the budget keeps working locally while backend
+    is unavailable.
+    """
+
+    def __init__(self, backend, name, ratio=0.1, min_retries_per_second=10,
+                 window=10, sync_interval=1, clock=None):
+        """Creates retry budget counting calls through backend
+
+        @param backend: StateBackend
+        @param name: name of the budget shared by processes
+        @param ratio: allowed number of retries per successful call
+        @param min_retries_per_second: retries allowed regardless of
+                                       successful calls
+        @param window: number of seconds successes and retries are kept
+        @param sync_interval: seconds between synchronizations
+        @param clock: function returning wall clock time in seconds
+        """
+        self.backend = backend
+        self.name = name
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = int(window)
+        self.sync_interval = sync_interval
+        self._clock = clock or time.time
+        # Counters not added to backend yet
+        self._epochs = [-1] * self.window
+        self._successes = [0] * self.window
+        self._retries = [0] * self.window
+        self._shared = (0, 0)
+        self._shared_epoch = None
+        self._next_sync = 0
+        self._sync_lock = threading.Lock()
+
+    def _key(self, kind, epoch):
+        return "budget:%s:%s:%s" % (self.name, kind, epoch)
+
+    def _index(self, epoch):
+        index = epoch % self.window
+        if self._epochs[index] != epoch:
+            self._epochs[index] = epoch
+            self._successes[index] = 0
+            self._retries[index] = 0
+        return index
+
+    def _maybe_sync(self):
+        now = self._clock()
+        if now < self._next_sync or not self._sync_lock.acquire(False):
+            return
+        try:
+            self._next_sync = now + self.sync_interval
+            self._sync(int(now))
+        except Exception:
+            LOG.warning("Failed to synchronize retry budget %s", self.name,
+                        exc_info=True)
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, epoch):
+        oldest = epoch - self.window
+        for index, counted in enumerate(self._epochs):
+            if counted <= oldest:
+                continue
+            # Local counters may be updated concurrently, only amounts
+            # read are subtracted
+            successes, retries = self._successes[index], self._retries[index]
+            # Counter of a second is kept while it is in the window
+            ttl = counted - oldest + 1
+            if successes:
+                self.backend.incr(self._key("successes", counted),
+                                  successes, ttl)
+                self._successes[index] -= successes
+            if retries:
+                self.backend.incr(self._key("retries", counted), retries,
+                                  ttl)
+                self._retries[index] -= retries
+        epochs = range(epoch - self.window + 1, epoch + 1)
+        values = self.backend.get_many(
+            [self._key("successes", e) for e in epochs] +
+            [self._key("retries", e) for e in epochs])
+        self._shared = (sum(values[:self.window]),
+                        sum(values[self.window:]))
+        self._shared_epoch = epoch
+
+    def _totals(self):
+        self._maybe_sync()
+        epoch = int(self._clock())
+        successes = retries = 0
+        if (self._shared_epoch is not None and
+                epoch - self._shared_epoch < self.window):
+            successes, retries = self._shared
+        oldest = epoch - self.window
+        for index, counted in enumerate(self._epochs):
+            if counted > oldest:
+                successes += self._successes[index]
+                retries += self._retries[index]
+        return successes, retries
+
+    def deposit(self):
+        """Records successful call"""
+        now = self._clock()
+        self._successes[self._index(int(now))] += 1
+        if now >= self._next_sync:
+            self._maybe_sync()
+
+    def can_retry(self):
+        successes, retries = self._totals()
+        allowed = (self.min_retries_per_second * self.window +
+                   self.ratio * successes)
+        return retries < allowed
+
+    def try_withdraw(self):
+        """Returns True and records retry if budget allows it"""
+        if not self.can_retry():
+            return False
+        self._retries[self._index(int(self._clock()))] += 1
+        return True
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulation of retry policies under synthetic failures
+
+Simulation runs the real logic of a policy (backoff, retry_on, circuit
+breaker, retry budget, deadline, rate limiter) against a failure model on
+VirtualClock, so days of traffic are simulated in seconds and results are
+reproducible with a seed:
+
+    policy = RetryPolicy(3, delay=1, step=1)
+    report = simulate(policy, BernoulliFailures(0.2), calls=1000000)
+    report.amplification  # attempts per call
+    report.percentile(99)  # latency of calls in seconds
+
+Calls arrive every interval seconds and run concurrently in virtual time:
+attempts of all calls are processed in order of time, so state shared by
+calls (circuit breaker, budget, rate limiter) sees them as in production.
+Breakers, budgets and limiters must use the simulation clock: pass clock
+to them or create them inside clock.patch(). Deadlines, adaptive retries
+and listeners read time of retrylib.decorators, simulate patches it for
+such policies unless patch_clock=False. Jittered backoff strategies should
+get an rng seeded as well to make results reproducible.
+"""
+
+import abc
+import array
+import collections
+import contextlib
+import heapq
+import itertools
+import math
+import random
+
+import six
+
+from retrylib import clocks
+from retrylib import decorators
+
+
+class SimulatedFailure(Exception):
+    """Exception raised by failed simulated attempts"""
+
+
+@six.add_metaclass(abc.ABCMeta)
+class FailureModel(object):
+    """Decides outcomes and latencies of simulated attempts"""
+
+    @abc.abstractmethod
+    def attempt(self, now, rng):
+        """Returns (failed, latency) of attempt started at virtual time now
+
+        @param rng: random.Random seeded by simulation
+        """
+
+    def get_error(self, now):
+        """Returns exception raised by failed attempt"""
+        return SimulatedFailure()
+
+
+class RandomFailures(FailureModel):
+    """Model of attempts failing at random with given latencies
+
+    Latencies are numbers of seconds or functions taking random.Random
+    and returning them, see exponential_latency and lognormal_latency.
+    """
+
+    def __init__(self, latency=0, failure_latency=None):
+        """Sets latencies of successful and failed attempts
+
+        @param latency: latency of attempts
+        @param failure_latency: latency of failed attempts, e.g. timeout
+                                (default: latency)
+        """
+        self.latency = latency
+        self.failure_latency = (latency if failure_latency is None
+                                else failure_latency)
+
+    @abc.abstractmethod
+    def is_failure(self, now, rng):
+        """Returns True if attempt started at virtual time now fails"""
+
+    def attempt(self, now, rng):
+        failed = self.is_failure(now, rng)
+        latency = self.failure_latency if failed else self.latency
+        if callable(latency):
+            latency = latency(rng)
+        return failed, latency
+
+
+class BernoulliFailures(RandomFailures):
+    """Every attempt fails independently with probability rate"""
+
+    def __init__(self, rate, latency=0, failure_latency=None):
+        super(BernoulliFailures, self).__init__(latency, failure_latency)
+        self.rate = rate
+
+    def is_failure(self, now, rng):
+        return rng.random() < self.rate
+
+
+class OutageWindows(BernoulliFailures):
+    """All attempts fail during outages, others fail with probability rate
+
+    @param windows: (start, end) pairs of virtual time of outages
+    """
+
+    def __init__(self, windows, rate=0, latency=0, failure_latency=None):
+        super(OutageWindows, self).__init__(rate, latency, failure_latency)
+        self.windows = sorted(windows)
+
+    def is_failure(self, now, rng):
+        for start, end in self.windows:
+            if start > now:
+                break
+            if now < end:
+                return True
+        return super(OutageWindows, self).is_failure(now, rng)
+
+
+class Replay(FailureModel):
+    """Replays recorded (failed, latency) outcomes of attempts in order
+
+    Outcomes are repeated when all of them have been replayed.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        if not self.outcomes:
+            raise ValueError("outcomes are empty")
+        self._outcomes = itertools.cycle(self.outcomes)
+
+    def attempt(self, now, rng):
+        return next(self._outcomes)
+
+
+def exponential_latency(mean):
+    """Returns latency function of exponential distribution"""
+    return lambda rng: rng.expovariate(1.0 / mean)
+
+
+def lognormal_latency(median, sigma):
+    """Returns latency function of log-normal distribution
+
+    @param sigma: standard deviation of latency logarithm
+    """
+    mu = math.log(median)
+    exp = math.exp
+    # gauss is faster than normalvariate used by lognormvariate
+    return lambda rng: exp(mu + sigma * rng.gauss(0, 1))
+
+
+class SimulationReport(object):
+    """Results of simulated calls
+
+    @ivar calls: number of calls
+    @ivar attempts: number of attempts made by all calls
+    @ivar successes: number of calls that have returned result
+    @ivar attempts_per_call: {number of attempts: number of calls}
+    @ivar latencies: sorted array of durations of calls in seconds
+    """
+
+    def __init__(self, calls, attempts, successes, attempts_per_call,
+                 latencies):
+        self.calls = calls
+        self.attempts = attempts
+        self.successes = successes
+        self.attempts_per_call = dict(attempts_per_call)
+        self.latencies = array.array("d", sorted(latencies))
+
+    def __repr__(self):
+        return ("%s(calls=%r, attempts=%r, successes=%r)" %
+                (self.__class__.__name__, self.calls, self.attempts,
+                 self.successes))
+
+    @property
+    def failures(self):
+        """Number of calls given up"""
+        return self.calls - self.successes
+
+    @property
+    def amplification(self):
+        """Number of attempts per call, load multiplier of retries"""
+        return float(self.attempts) / self.calls if self.calls else 0.0
+
+    def percentile(self, percent):
+        """Returns latency of calls at percent (nearest rank)"""
+        if not self.latencies:
+            return None
+        rank = int(math.ceil(percent / 100.0 * len(self.latencies)))
+        return self.latencies[min(max(rank, 1), len(self.latencies)) - 1]
+
+    def as_dict(self, percents=(50, 90, 99, 99.9)):
+        """Returns summary suitable for JSON"""
+        return {
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "amplification": self.amplification,
+            "attempts_per_call": self.attempts_per_call,
+            "latency": dict(("p%s" % percent, self.percentile(percent))
+                            for percent in percents),
+        }
+
+
+class _Call(object):
+
+    __slots__ = ("arrived", "started", "kwargs", "state", "attempts",
+                 "error")
+
+    def __init__(self, arrived):
+        self.arrived = arrived
+        self.started = None
+        self.kwargs = {}
+        self.state = None
+        self.attempts = 0
+        self.error = None
+
+
+# Kinds of events
+_ARRIVE, _ATTEMPT, _FINISH = range(3)
+
+
+@contextlib.contextmanager
+def _unpatched(clock):
+    yield clock
+
+
+def simulated_call():
+    """Function the simulated calls are made to"""
+
+
+def simulate(policy, model, calls=10000, interval=1, poisson=False,
+             seed=None, clock=None, patch_clock=None):
+    """Simulates calls retried with policy and returns SimulationReport
+
+    @param policy: decorators.RetryPolicy
+    @param model: FailureModel deciding outcomes of attempts
+    @param calls: number of calls
+    @param interval: seconds between arrivals of calls
+    @param poisson: if True intervals are exponentially distributed with
+                    mean interval
+    @param seed: seed of random numbers used by model
+    @param clock: clocks.VirtualClock used by policy state (default: new
+                  clock starting at 0)
+    @param patch_clock: patch time functions with clock while simulating
+                        (see VirtualClock.patch), other threads see virtual
+                        time meanwhile. By default they are patched only
+                        for policies with deadline, adaptive retries or
+                        listeners, which measure time
+    """
+    rng = random.Random(seed)
+    if clock is None:
+        clock = clocks.VirtualClock()
+    if patch_clock is None:
+        patch_clock = bool(policy.deadline is not None or
+                           policy.adaptive is not None or policy.listeners)
+    events = []
+    counter = itertools.count()
+    arrived = successes = 0
+    attempts_per_call = collections.Counter()
+    latencies = array.array("d")
+    func = simulated_call
+    push = heapq.heappush
+
+    def attempt(call):
+        call.attempts += 1
+        failed, latency = model.attempt(clock.now, rng)
+        call.error = model.get_error(clock.now) if failed else None
+        push(events, (clock.now + latency, next(counter), _FINISH, call))
+
+    def finish(call):
+        attempts_per_call[call.attempts] += 1
+        latencies.append(clock.now - call.arrived)
+
+    def run(call):
+        """Simulates all attempts of call at once, returns True on success"""
+        state = None
+        while True:
+            call.attempts += 1
+            failed, latency = model.attempt(clock.now, rng)
+            clock.now += latency
+            if not failed:
+                if state is not None:
+                    state.on_success()
+                finish(call)
+                return True
+            error = model.get_error(clock.now)
+            if state is None:
+                state = decorators.RetryState(policy, func, (), call.kwargs)
+            try:
+                clock.now += state.next_delay(error)
+                state.before_attempt(error)
+            except Exception:
+                finish(call)
+                return False
+
+    # Calls of policies without shared state can't affect each other,
+    # they are simulated one by one without scheduling their attempts
+    independent = policy.fast_path
+
+    if calls > 0:
+        push(events, (clock.now, next(counter), _ARRIVE, None))
+    with (clock.patch() if patch_clock else _unpatched(clock)):
+        while events:
+            clock.now, _, kind, call = heapq.heappop(events)
+
+            if kind == _ARRIVE:
+                arrived += 1
+                if arrived < calls:
+                    push(events, (clock.now + (
+                        rng.expovariate(1.0 / interval)
+                        if poisson and interval else interval),
+                        next(counter), _ARRIVE, None))
+                call = _Call(clock.now)
+                if independent:
+                    successes += run(call)
+                    clock.now = call.arrived
+                    continue
+                if policy.attempts_number == 0:
+                    finish(call)
+                    successes += 1
+                    continue
+                try:
+                    call.started, call.state = policy.start_call(
+                        func, (), call.kwargs)
+                except Exception:
+                    # Circuit breaker is open
+                    finish(call)
+                    continue
+                wait = policy.reserve_first_attempt()
+                if wait:
+                    push(events, (clock.now + wait, next(counter), _ATTEMPT,
+                                  call))
+                else:
+                    attempt(call)
+
+            elif kind == _ATTEMPT:
+                if call.attempts:
+                    try:
+                        call.state.before_attempt(call.error)
+                    except Exception:
+                        finish(call)
+                        continue
+                attempt(call)
+
+            elif call.error is None:
+                if call.state is None:
+                    policy.finish_call(func, call.started)
+                else:
+                    call.state.on_success()
+                finish(call)
+                successes += 1
+
+            else:
+                if call.state is None:
+                    call.state = decorators.RetryState(
+                        policy, func, (), call.kwargs, call.started)
+                try:
+                    delay = call.state.next_delay(call.error)
+                except Exception:
+                    finish(call)
+                    continue
+                push(events, (clock.now + delay, next(counter), _ATTEMPT,
+                              call))
+
+    attempts = sum(number * count
+                   for number, count in attempts_per_call.items())
+    return SimulationReport(arrived, attempts, successes, attempts_per_call,
+                            latencies)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Retries of generator functions resuming interrupted streams"""
+
+import time
+
+from retrylib import decorators
+
+
+def resume_from(kwarg, cursor=None):
+    """Returns resume function passing position of stream as keyword argument
+
+    @param kwarg: name of keyword argument the stream starts from
+    @param cursor: function returning position to resume from by the last
+                   yielded item (default: the item itself)
+    """
+
+    def resume(last_item, args, kwargs):
+        kwargs = dict(kwargs)
+        kwargs[kwarg] = last_item if cursor is None else cursor(last_item)
+        return args, kwargs
+
+    return resume
+
+
+class StreamRetry(object):
+    """State of a single iteration over retried stream
+
+    Items aren't buffered: after a failure the stream is reopened with
+    arguments returned by resume(last_item, args, kwargs) or, if resume
+    is None, with the same arguments skipping items already yielded.
+    Attempts are counted from the last yielded item, so a long stream may
+    fail many times as long as it makes progress between failures.
+    """
+
+    __slots__ = ("policy", "func", "resume", "args", "kwargs", "started",
+                 "state", "count", "skip", "last_item")
+
+    def __init__(self, policy, func, args, kwargs, resume=None):
+        self.policy = policy
+        self.func = func
+        self.resume = resume
+        self.args = args
+        self.kwargs = kwargs
+        self.started = None
+        self.state = None
+        self.count = 0
+        self.skip = 0
+        self.last_item = None
+
+    def start(self):
+        """Returns arguments to open the stream with for the first time"""
+        self.started, self.state = self.policy.start_call(
+            self.func, self.args, self.kwargs)
+        return self.args, self.kwargs
+
+    def accept(self, item):
+        """Returns True if item should be yielded to the consumer"""
+        if self.skip:
+            self.skip -= 1
+            return False
+        state = self.state
+        if state is not None and state.attempts > 1:
+            # Reopened stream has made progress, attempts are counted from
+            # here. Call succeeds only when stream is exhausted, so only
+            # consecutive failures of breaker are reset.
+            state.attempts = 1
+            state.retry_delay = None
+            if self.policy.circuit_breaker is not None:
+                self.policy.circuit_breaker.record_success()
+        self.count += 1
+        self.last_item = item
+        return True
+
+    def next_delay(self, error):
+        """Returns delay before reopening the stream
+
+        Raises error if it shouldn't be retried.
+        """
+        if self.state is None:
+            self.state = decorators.RetryState(
+                self.policy, self.func, self.args, self.kwargs, self.started)
+        return self.state.next_delay(error)
+
+    def reopen(self, error):
+        """Returns arguments to reopen the stream with after delay"""
+        args, kwargs = self.args, self.kwargs
+        if self.count:
+            if self.resume is None:
+                self.skip = self.count
+            else:
+                args, kwargs = self.resume(self.last_item, args, kwargs)
+                self.skip = 0
+        self.state.kwargs = kwargs
+        self.state.before_attempt(error)
+        return args, kwargs
+
+    def finish(self):
+        if self.state is not None:
+            self.state.on_success()
+        else:
+            self.policy.finish_call(self.func, self.started)
+
+
+def iterate(policy, func, args, kwargs, resume=None):
+    """Yields items of func(*args, **kwargs) reopening it on failures"""
+    retry = StreamRetry(policy, func, args, kwargs, resume)
+    args, kwargs = retry.start()
+    wait = policy.reserve_first_attempt()
+    if wait:
+        time.sleep(wait)
+    stream = None
+    try:
+        while True:
+            try:
+                if stream is None:
+                    stream = iter(func(*args, **kwargs))
+                item = next(stream)
+            except StopIteration:
+                break
+            except Exception as e:
+                stream = None
+                time.sleep(retry.next_delay(e))
+                args, kwargs = retry.reopen(e)
+                continue
+            if retry.accept(item):
+                yield item
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    retry.finish()
+
+
+def retry_stream(policy, resume=None):
+    """Returns decorator retrying generator function with policy
+
+    Async generator functions are retried without blocking event loop.
+
+    @param policy: decorators.RetryPolicy
+    @param resume: function taking the last yielded item, args and kwargs
+                   of the first call and returning (args, kwargs) to reopen
+                   stream with, see resume_from
+    """
+
+    def decorator(func):
+        return policy.wrap_stream(func, resume)
+
+    return decorator
@@ -14,8 +14,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
 import unittest
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 
 class TestCase(unittest.TestCase):
     pass
+
+
+requires_tracemalloc = unittest.skipIf(tracemalloc is None,
+                                       "tracemalloc is missing")
+
+
+def allocation_peak(func, number=5):
+    """Returns peak size in bytes of memory allocated by a call of func
+
+    Each of number calls is traced separately and the smallest peak is
+    returned, so an occasional resize of a cache isn't counted. Exceptions
+    raised by func are ignored.
+    """
+
+    def call():
+        try:
+            func()
+        except Exception:
+            pass
+
+    call()
+    peaks = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(number):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                call()
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return min(peaks)
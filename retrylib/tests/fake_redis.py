@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local stand-in for Redis server speaking a subset of its protocol"""
+
+import threading
+import time
+
+from six.moves import socketserver
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Serves INCRBY, PEXPIRE, MGET, SET, DEL, PING, MULTI and EXEC"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(
+            self, ("127.0.0.1", 0), FakeRedisHandler)
+        self.values = {}
+        self.lock = threading.RLock()
+        self.commands = []
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        args=(0.01, ))
+        self._thread.daemon = True
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def get(self, key):
+        entry = self.values.get(key)
+        if entry is None or (entry[1] is not None and
+                             entry[1] <= time.time()):
+            self.values.pop(key, None)
+            return None
+        return entry
+
+    def execute(self, command, args, queued=False):
+        if not queued:
+            self.commands.append(command)
+        with self.lock:
+            if command == b"PING":
+                return b"+PONG\r\n"
+            if command == b"INCRBY":
+                entry = self.get(args[0])
+                if entry is None:
+                    entry = self.values[args[0]] = [b"0", None]
+                entry[0] = str(int(entry[0]) + int(args[1])).encode()
+                return b":" + entry[0] + b"\r\n"
+            if command == b"PEXPIRE":
+                entry = self.get(args[0])
+                if entry is None:
+                    return b":0\r\n"
+                entry[1] = time.time() + int(args[1]) / 1000.0
+                return b":1\r\n"
+            if command == b"MGET":
+                reply = [b"*%d\r\n" % len(args)]
+                for key in args:
+                    entry = self.get(key)
+                    if entry is None:
+                        reply.append(b"$-1\r\n")
+                    else:
+                        reply.append(b"$%d\r\n%s\r\n" % (len(entry[0]),
+                                                         entry[0]))
+                return b"".join(reply)
+            if command == b"SET":
+                options = [arg.upper() for arg in args[2:]]
+                if b"NX" in options and self.get(args[0]) is not None:
+                    return b"$-1\r\n"
+                expires = None
+                if b"PX" in options:
+                    expires = time.time() + int(
+                        args[2 + options.index(b"PX") + 1]) / 1000.0
+                self.values[args[0]] = [args[1], expires]
+                return b"+OK\r\n"
+            if command == b"DEL":
+                return b":%d\r\n" % len([key for key in args
+                                         if self.values.pop(key, None)])
+        return b"-ERR unknown command\r\n"
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        queued = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].upper()
+            if command in (b"MULTI", b"EXEC") or queued is not None:
+                self.server.commands.append(command)
+            if command == b"MULTI":
+                queued = []
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"EXEC":
+                with self.server.lock:
+                    replies = [self.server.execute(name, arguments, True)
+                               for name, arguments in queued]
+                queued = None
+                self.wfile.write(b"*%d\r\n%s" % (len(replies),
+                                                 b"".join(replies)))
+            elif queued is not None:
+                queued.append((command, args[1:]))
+                self.wfile.write(b"+QUEUED\r\n")
+            else:
+                self.wfile.write(self.server.execute(command, args[1:]))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from retrylib import adaptive
+from retrylib import decorators
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 5
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def function():
+    pass
+
+
+class AdaptivePolicyTestCase(base.TestCase):
+
+    def setUp(self):
+        super(AdaptivePolicyTestCase, self).setUp()
+        self.policy = adaptive.AdaptivePolicy(
+            delay=1, max_delay=100, factor=2, min_attempts=1,
+            max_attempts=4, increase=0.5, decrease=0.5, alpha=0.5)
+
+    def test_initial_delays(self):
+        self.assertEqual([self.policy.get_delay(function, attempt)
+                          for attempt in (1, 2, 3)], [1, 2, 4])
+
+    def test_delay_grows_with_failure_rate(self):
+        self.policy.record_failure(function)
+
+        self.assertEqual(self.policy.get_delay(function, 1), 2)
+
+    def test_delay_follows_latency(self):
+        self.policy.record_success(function, latency=3)
+
+        self.assertEqual(self.policy.get_delay(function, 1), 3)
+
+    def test_delay_is_limited(self):
+        self.assertEqual(self.policy.get_delay(function, 100), 100)
+
+    def test_attempts_are_cut_and_restored(self):
+        self.policy.record_giveup(function)
+        self.assertEqual(self.policy.get_attempts_number(function, -1), 2)
+        self.policy.record_giveup(function)
+        self.policy.record_giveup(function)
+        self.assertEqual(self.policy.get_attempts_number(function, -1), 1)
+
+        for _ in range(2):
+            self.policy.record_success(function)
+        self.assertEqual(self.policy.get_attempts_number(function, -1), 2)
+
+    def test_attempts_are_limited_by_decorator(self):
+        self.assertEqual(self.policy.get_attempts_number(function, 2), 2)
+
+    def test_memory_per_function_is_constant(self):
+        for _ in range(1000):
+            self.policy.record_success(function, latency=1)
+            self.policy.record_failure(function)
+
+        self.assertEqual(len(self.policy._stats), 1)
+
+
+class RetryWithAdaptivePolicyTestCase(base.TestCase):
+
+    @mock.patch('time.sleep')
+    def test_outage_reduces_attempts(self, sleep):
+        policy = adaptive.AdaptivePolicy(delay=1, max_attempts=4,
+                                         decrease=0.5)
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(RETRY_ATTEMPTS, adaptive=policy)
+        def function():
+            counter()
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 4)
+
+        counter.reset_mock()
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 2)
+
+        counter.reset_mock()
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 1)
+
+    @mock.patch('time.sleep')
+    def test_success_is_recorded(self, sleep):
+        policy = adaptive.AdaptivePolicy()
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, adaptive=policy)
+        def function():
+            return counter()
+
+        self.assertEqual(function(), "OK")
+
+        stats = list(policy._stats.values())[0]
+        self.assertAlmostEqual(stats.failure_rate, 0.09)
+        self.assertIsNotNone(stats.latency)
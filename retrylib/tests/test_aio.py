@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import itertools
+import socket
+import time
+
+import mock
+
+from retrylib import batches
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib import hedging
+from retrylib import network
+from retrylib import ratelimit
+from retrylib import registry
+from retrylib.tests import base
+from retrylib import tracing
+
+
+RETRY_ATTEMPTS = 3
+RECOVERY_TIMEOUT = 10
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def run(coroutine):
+    """Runs coroutine in a new event loop (asyncio.run is Python 3.7+)"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncRetryTestCase(base.TestCase):
+
+    def test_coroutine_function_is_retried(self):
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS)
+        async def function():
+            return counter()
+
+        self.assertTrue(asyncio.iscoroutinefunction(function))
+        self.assertEqual(run(function()), "OK")
+        self.assertEqual(counter.call_count, 2)
+
+    def test_attempts_are_exhausted(self):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.aretry(RETRY_ATTEMPTS,
+                           retry_on=(SuperPuperException,))
+        async def function():
+            counter()
+
+        self.assertRaises(SuperPuperException, run, function())
+        self.assertEqual(counter.call_count, RETRY_ATTEMPTS)
+
+    def test_errors_of_retries_arent_chained(self):
+        errors = [SuperPuperException("first"), SuperPuperException("last")]
+
+        @decorators.retry(2, delay=0)
+        async def function():
+            raise errors.pop(0)
+
+        with self.assertRaises(SuperPuperException) as context:
+            run(function())
+        self.assertIsNone(context.exception.__context__)
+
+    @mock.patch('time.sleep')
+    def test_asyncio_sleep_is_used(self, sleep):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=0, step=1)
+        async def function():
+            counter()
+
+        delays = []
+
+        async def async_sleep(delay, result=None):
+            delays.append(delay)
+            return result
+
+        with mock.patch('asyncio.sleep', async_sleep):
+            self.assertRaises(SuperPuperException, run, function())
+
+        self.assertFalse(sleep.called)
+        self.assertEqual(delays, [0, 1])
+
+    def test_event_loop_is_not_blocked(self):
+        delay = 0.05
+
+        @decorators.retry(2, delay=delay)
+        async def function(counter):
+            if not counter:
+                counter.append(1)
+                raise SuperPuperException()
+            return len(counter)
+
+        async def main():
+            return await asyncio.gather(*[function([]) for _ in range(10)])
+
+        started = time.time()
+        self.assertEqual(run(main()), [1] * 10)
+        self.assertLess(time.time() - started, delay * 5)
+
+
+class AsyncCircuitBreakerTestCase(base.TestCase):
+
+    def test_cancelled_trial_is_released(self):
+        clock = mock.Mock(return_value=0)
+        breaker = circuit.CircuitBreaker(1, RECOVERY_TIMEOUT, clock=clock)
+        breaker.record_failure()
+        clock.return_value = RECOVERY_TIMEOUT
+
+        @decorators.retry(RETRY_ATTEMPTS, circuit_breaker=breaker)
+        async def function():
+            await asyncio.sleep(10)
+
+        self.assertRaises(asyncio.TimeoutError, run,
+                          asyncio.wait_for(function(), 0.01))
+        self.assertEqual(breaker.state, circuit.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+
+
+class AsyncNetworkRetryTestCase(base.TestCase):
+
+    def test_network_failure_is_retried(self):
+        counter = mock.Mock(side_effect=[socket.timeout(), "OK"])
+
+        @network.retry(RETRY_ATTEMPTS, delay=0)
+        async def function():
+            return counter()
+
+        self.assertEqual(run(function()), "OK")
+        self.assertEqual(counter.call_count, 2)
+
+    def test_default_parameters(self):
+        counter = mock.Mock(side_effect=[socket.timeout(), "OK"])
+
+        @network.aretry()
+        async def function():
+            return counter()
+
+        with mock.patch.object(network.defaults, "HTTP_RETRY_DELAY", 0):
+            self.assertEqual(run(function()), "OK")
+
+    def test_asyncio_errors_are_network_failures(self):
+        self.assertTrue(network.is_network_failure(
+            asyncio.TimeoutError()))
+        self.assertTrue(network.is_network_failure(
+            asyncio.IncompleteReadError(b"", 10)))
+        self.assertFalse(network.is_network_failure(
+            SuperPuperException()))
+
+
+class AsyncBatchRetryTestCase(base.TestCase):
+
+    def test_coroutine_batch_function(self):
+        calls = []
+        failures = set([2])
+
+        @batches.retry_batch(decorators.RetryPolicy(2))
+        async def function(items):
+            calls.append(list(items))
+            results = []
+            for item in items:
+                if item in failures:
+                    failures.remove(item)
+                    results.append(SuperPuperException(item))
+                else:
+                    results.append(item * 10)
+            return results
+
+        self.assertEqual(run(function([1, 2])), [10, 20])
+        self.assertEqual(calls, [[1, 2], [2]])
+
+
+class AsyncVirtualClockTestCase(base.TestCase):
+
+    def test_asyncio_sleep_is_simulated(self):
+        clock = clocks.VirtualClock()
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=3600)
+        async def function():
+            return counter()
+
+        with clock.patch():
+            self.assertEqual(run(function()), "OK")
+
+        self.assertEqual(clock.sleeps, [3600])
+
+
+class AsyncHedgingTestCase(base.TestCase):
+
+    def test_coroutine_function_is_hedged(self):
+        calls = itertools.count(1)
+
+        @hedging.hedge(delay=0.01)
+        async def function():
+            if next(calls) == 1:
+                await asyncio.sleep(5)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(run(function()), "fast")
+
+
+class AsyncRateLimitedRetryTestCase(base.TestCase):
+
+    def test_coroutine_awaits_tokens(self):
+        clock = clocks.VirtualClock()
+        limiter = ratelimit.RateLimiter(rate=1, burst=2, retry_reserve=1,
+                                        clock=clock)
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK",
+                                         "OK", "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, rate_limiter=limiter)
+        async def function():
+            return counter()
+
+        with clock.patch():
+            for _ in range(3):
+                self.assertEqual(run(function()), "OK")
+
+        # The retry and the third call wait, the second call takes the
+        # token refilled meanwhile
+        self.assertEqual(clock.sleeps, [1, 1])
+
+
+class AsyncPolicyRegistryTestCase(base.TestCase):
+
+    def test_coroutine_function(self):
+        policies = registry.PolicyRegistry()
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+        policies.register("api", {"attempts_number": 2, "delay": 0})
+
+        @policies.retry("api")
+        async def function():
+            return counter()
+
+        self.assertEqual(run(function()), "OK")
+        self.assertEqual(counter.call_count, 2)
+
+
+class AsyncTracingTestCase(base.TestCase):
+
+    def test_coroutine_function(self):
+        exporter = tracing.InMemoryExporter()
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK", "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=0,
+                          listeners=[tracing.TracingListener(exporter)])
+        async def function():
+            return counter()
+
+        async def main():
+            return await asyncio.gather(function(), function())
+
+        run(main())
+
+        calls = [span for span in exporter.spans
+                 if span.name == tracing.CALL_SPAN]
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(exporter.spans), 5)
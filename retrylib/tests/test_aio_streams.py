@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from retrylib import decorators
+from retrylib import streams
+from retrylib.tests import base
+from retrylib.tests import test_aio
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def collect(function, *args):
+    """Returns items of async generator function(*args)"""
+    async def items():
+        return [item async for item in function(*args)]
+    return test_aio.run(items())
+
+
+class AsyncStreamRetryTestCase(base.TestCase):
+
+    def test_async_stream_is_resumed(self):
+        calls = []
+        failures = set([2])
+
+        @streams.retry_stream(
+            decorators.RetryPolicy(2),
+            resume=streams.resume_from("start", lambda n: n + 1))
+        async def function(start=0):
+            calls.append(start)
+            for number in range(start, 4):
+                if number in failures:
+                    failures.remove(number)
+                    raise SuperPuperException()
+                yield number
+
+        self.assertEqual(collect(function), [0, 1, 2, 3])
+        self.assertEqual(calls, [0, 2])
+
+    def test_async_attempts_are_exhausted(self):
+        calls = []
+
+        @streams.retry_stream(decorators.RetryPolicy(2))
+        async def function():
+            calls.append(1)
+            raise SuperPuperException()
+            yield
+
+        self.assertRaises(SuperPuperException, collect, function)
+        self.assertEqual(len(calls), 2)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+import mock
+
+from retrylib import backoff
+from retrylib import decorators
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 5
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def get_delays(strategy, count):
+    delays = []
+    previous_delay = None
+    for attempt in range(1, count + 1):
+        previous_delay = strategy.get_delay(attempt, previous_delay)
+        delays.append(previous_delay)
+    return delays
+
+
+class BackoffTestCase(base.TestCase):
+
+    def test_linear(self):
+        strategy = backoff.LinearBackoff(delay=1, step=2, max_delay=6)
+        self.assertEqual(get_delays(strategy, 5), [1, 3, 5, 6, 6])
+
+    def test_exponential(self):
+        strategy = backoff.ExponentialBackoff(delay=1, factor=2,
+                                              max_delay=10)
+        self.assertEqual(get_delays(strategy, 5), [1, 2, 4, 8, 10])
+
+    def test_exponential_doesnt_overflow(self):
+        strategy = backoff.ExponentialBackoff(delay=1, factor=2,
+                                              max_delay=10)
+        self.assertEqual(strategy.get_delay(100000, 10), 10)
+
+    def test_full_jitter(self):
+        rng = mock.Mock()
+        rng.uniform.side_effect = lambda a, b: b / 2.0
+        strategy = backoff.FullJitterBackoff(delay=2, rng=rng)
+
+        self.assertEqual(get_delays(strategy, 3), [1, 2, 4])
+        rng.uniform.assert_called_with(0, 8)
+
+    def test_equal_jitter(self):
+        strategy = backoff.EqualJitterBackoff(delay=2, max_delay=8,
+                                              rng=random.Random(42))
+        for attempt, ceiling in enumerate([2, 4, 8, 8], 1):
+            delay = strategy.get_delay(attempt, None)
+            self.assertTrue(ceiling / 2.0 <= delay <= ceiling)
+
+    def test_decorrelated_jitter(self):
+        strategy = backoff.DecorrelatedJitterBackoff(
+            delay=1, max_delay=20, rng=random.Random(42))
+        previous_delay = None
+        for attempt in range(1, 20):
+            delay = strategy.get_delay(attempt, previous_delay)
+            self.assertTrue(1 <= delay <= 20)
+            if previous_delay is not None:
+                self.assertTrue(delay <= previous_delay * 3)
+            previous_delay = delay
+
+    def test_first_delay_is_jittered(self):
+        delays = set(
+            backoff.DecorrelatedJitterBackoff(
+                delay=1, max_delay=20, rng=random.Random(seed)).get_delay(
+                    1, None)
+            for seed in range(10))
+        self.assertGreater(len(delays), 1)
+        for delay in delays:
+            self.assertTrue(1 <= delay <= 3)
+
+    def test_rng_makes_delays_deterministic(self):
+        first = backoff.DecorrelatedJitterBackoff(rng=random.Random(1))
+        second = backoff.DecorrelatedJitterBackoff(rng=random.Random(1))
+        self.assertEqual(get_delays(first, 10), get_delays(second, 10))
+
+    @mock.patch('time.sleep')
+    def test_decorator_uses_strategy(self, sleep):
+
+        @decorators.retry(RETRY_ATTEMPTS,
+                          backoff=backoff.ExponentialBackoff(delay=1))
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+        sleep.assert_has_calls([mock.call(1), mock.call(2), mock.call(4),
+                                mock.call(8)])
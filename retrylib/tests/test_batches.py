@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import mock
+
+from retrylib import batches
+from retrylib import circuit
+from retrylib import decorators
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def flaky_store(failures=None, error=SuperPuperException):
+    """Returns batch function failing items as many times as failures say
+
+    Python 2 can decorate only functions with __name__, so it isn't a
+    callable object.
+    """
+    failures = dict(failures or {})
+
+    def store(items):
+        store.calls.append(list(items))
+        results = []
+        for item in items:
+            if failures.get(item):
+                failures[item] -= 1
+                results.append(error(item))
+            else:
+                results.append(item * 10)
+        return results
+
+    store.calls = []
+    return store
+
+
+@mock.patch('time.sleep')
+class BatchRetryTestCase(base.TestCase):
+
+    def test_only_failed_items_are_resubmitted(self, sleep):
+        store = flaky_store({2: 1, 4: 2})
+        function = decorators.RetryPolicy(3, delay=1).wrap_batch(store)
+
+        self.assertEqual(function([1, 2, 3, 4]), [10, 20, 30, 40])
+        self.assertEqual(store.calls, [[1, 2, 3, 4], [2, 4], [4]])
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_batch_error_carries_results(self, sleep):
+        store = flaky_store({3: 1})
+
+        @batches.retry_batch(decorators.RetryPolicy(2))
+        def function(items):
+            results = store(items)
+            if any(isinstance(r, Exception) for r in results):
+                raise batches.BatchError(results)
+            return results
+
+        self.assertEqual(function([1, 2, 3]), [10, 20, 30])
+        self.assertEqual(store.calls, [[1, 2, 3], [3]])
+
+    def test_given_up_items_are_reported(self, sleep):
+        store = flaky_store({2: 5})
+        function = decorators.RetryPolicy(2).wrap_batch(store)
+
+        with self.assertRaises(batches.BatchError) as error:
+            function([1, 2, 3])
+
+        self.assertEqual(error.exception.failed, [1])
+        self.assertEqual(error.exception.results[0], 10)
+        self.assertEqual(error.exception.results[2], 30)
+        self.assertIsInstance(error.exception.errors[0], SuperPuperException)
+        self.assertEqual(len(store.calls), 2)
+
+    def test_retry_on_is_applied_per_item(self, sleep):
+        calls = []
+
+        @batches.retry_batch(decorators.RetryPolicy(
+            3, retry_on=SuperPuperException))
+        def function(items):
+            calls.append(list(items))
+            if len(calls) == 1:
+                return [SuperPuperException(), ValueError()]
+            return [item * 10 for item in items]
+
+        with self.assertRaises(batches.BatchError) as error:
+            function([1, 2])
+
+        self.assertEqual(error.exception.results[0], 10)
+        self.assertIsInstance(error.exception.results[1], ValueError)
+        self.assertEqual(calls, [[1, 2], [1]])
+
+    def test_whole_batch_failure_is_retried(self, sleep):
+        store = flaky_store()
+        side_effect = [SuperPuperException(), store]
+        function = decorators.RetryPolicy(2).wrap_batch(
+            lambda items: side_effect.pop(0)(items))
+
+        self.assertEqual(function([1, 2]), [10, 20])
+
+    def test_not_retriable_batch_failure(self, sleep):
+        counter = mock.Mock(side_effect=ValueError())
+
+        def store(items):
+            counter(items)
+
+        function = decorators.RetryPolicy(
+            3, retry_on=SuperPuperException).wrap_batch(store)
+
+        self.assertRaises(ValueError, function, [1, 2])
+        self.assertEqual(counter.call_count, 1)
+
+    def test_not_retriable_failure_of_all_items_is_recorded(self, sleep):
+        breaker = circuit.CircuitBreaker(failure_threshold=1,
+                                         retry_on=ValueError)
+        store = flaky_store({1: 1, 2: 1}, error=ValueError)
+        function = decorators.RetryPolicy(
+            3, retry_on=SuperPuperException,
+            circuit_breaker=breaker).wrap_batch(store)
+
+        self.assertRaises(batches.BatchError, function, [1, 2])
+        self.assertTrue(breaker.is_open())
+
+    def test_chunks(self, sleep):
+        store = flaky_store({3: 1})
+        function = decorators.RetryPolicy(2).wrap_batch(store,
+                                                        chunk_size=2)
+
+        self.assertEqual(function([1, 2, 3, 4, 5]), [10, 20, 30, 40, 50])
+        self.assertEqual(store.calls, [[1, 2], [3, 4], [3], [5]])
+
+    def test_method_items_argument(self, sleep):
+        store = flaky_store({1: 1})
+
+        class Client(object):
+
+            @batches.retry_batch(decorators.RetryPolicy(2), items_arg=1)
+            def upsert(self, items, table):
+                return store(items)
+
+        self.assertEqual(Client().upsert([1, 2], "table"), [10, 20])
+        self.assertEqual(store.calls, [[1, 2], [1]])
+
+    def test_wrong_number_of_results(self, sleep):
+        function = decorators.RetryPolicy(2).wrap_batch(lambda items: [])
+
+        self.assertRaises(ValueError, function, [1])
+
+    def test_empty_batch(self, sleep):
+        store = flaky_store()
+        function = decorators.RetryPolicy(2).wrap_batch(store)
+
+        self.assertEqual(function([]), [])
+        self.assertEqual(store.calls, [])
+
+    def test_deadline_kwarg_isnt_passed_without_deadline(self, sleep):
+        store = flaky_store()
+        policy = decorators.RetryPolicy(2, deadline_kwarg="timeout")
+
+        @batches.retry_batch(policy)
+        def function(items, **kwargs):
+            self.assertEqual(kwargs, {})
+            return store(items)
+
+        self.assertEqual(function([1]), [10])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import mock
+
+from retrylib import budget
+from retrylib import decorators
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 5
+WINDOW = 10
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class RetryBudgetTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RetryBudgetTestCase, self).setUp()
+        self.clock = FakeClock()
+        self.budget = budget.RetryBudget(ratio=0.5, min_retries_per_second=0,
+                                         window=WINDOW, clock=self.clock)
+
+    def test_retries_are_limited_by_successes(self):
+        for _ in range(4):
+            self.budget.deposit()
+
+        self.assertTrue(self.budget.try_withdraw())
+        self.assertTrue(self.budget.try_withdraw())
+        self.assertFalse(self.budget.try_withdraw())
+
+    def test_min_retries_are_allowed(self):
+        retry_budget = budget.RetryBudget(ratio=0, min_retries_per_second=1,
+                                          window=2, clock=self.clock)
+
+        self.assertTrue(retry_budget.try_withdraw())
+        self.assertTrue(retry_budget.try_withdraw())
+        self.assertFalse(retry_budget.try_withdraw())
+
+    def test_old_successes_expire(self):
+        for _ in range(4):
+            self.budget.deposit()
+
+        self.clock.now = WINDOW
+
+        self.assertFalse(self.budget.try_withdraw())
+
+    def test_counters_from_all_threads_are_used(self):
+        threads = [threading.Thread(target=self.budget.deposit)
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.budget._totals(), (4, 0))
+        used = [shard for shard in self.budget._shards
+                if any(shard.successes)]
+        self.assertEqual(len(used), 4)
+
+    @mock.patch('time.sleep')
+    def test_decorator_gives_up_when_budget_is_spent(self, sleep):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(RETRY_ATTEMPTS, retry_budget=self.budget)
+        def function(fail):
+            if fail:
+                counter()
+            return "OK"
+
+        for _ in range(4):
+            self.assertEqual(function(False), "OK")
+
+        self.assertRaises(SuperPuperException, function, True)
+        self.assertEqual(counter.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
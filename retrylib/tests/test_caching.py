@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import mock
+
+from retrylib import budget
+from retrylib import caching
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def plain(counter):
+    """Returns function calling mock counter
+
+    Python 2 can decorate only functions with __name__.
+    """
+
+    def function(*args, **kwargs):
+        return counter(*args, **kwargs)
+
+    return function
+
+
+def wait_refresh(cache):
+    for _ in range(500):
+        if not cache._refreshing:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("Refresh isn't finished")
+
+
+@mock.patch('time.sleep')
+class RetryCacheTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RetryCacheTestCase, self).setUp()
+        self.clock = clocks.VirtualClock()
+
+    def _cache(self, **kwargs):
+        kwargs.setdefault("ttl", 10)
+        kwargs.setdefault("max_stale", 100)
+        return caching.RetryCache(clock=self.clock, **kwargs)
+
+    def test_fresh_result_is_cached(self, sleep):
+        counter = mock.Mock(side_effect=lambda x: x * 2)
+        function = decorators.retry(3, cache=self._cache())(plain(counter))
+
+        self.assertEqual(function(1), 2)
+        self.assertEqual(function(1), 2)
+        self.assertEqual(function(x=1), 2)
+        self.assertEqual(counter.call_count, 2)
+
+    def test_expired_result_is_refreshed(self, sleep):
+        counter = mock.Mock(side_effect=["old", "new"])
+        function = decorators.retry(3, cache=self._cache())(plain(counter))
+
+        function()
+        self.clock.advance(10)
+
+        self.assertEqual(function(), "new")
+
+    def test_stale_result_is_returned_while_retrying(self, sleep):
+        counter = mock.Mock(side_effect=["old", SuperPuperException(),
+                                         "new"])
+        cache = self._cache()
+        function = decorators.retry(3, delay=10, cache=cache)(plain(counter))
+
+        function()
+        self.clock.advance(20)
+
+        self.assertEqual(function(), "old")
+        wait_refresh(cache)
+        self.assertEqual(function(), "new")
+        self.assertEqual(counter.call_count, 3)
+
+    def test_stale_result_is_retried_with_remaining_attempts(self, sleep):
+        counter = mock.Mock(side_effect=["old"] + [SuperPuperException()] * 3)
+        cache = self._cache()
+        function = decorators.retry(3, cache=cache)(plain(counter))
+
+        function()
+        self.clock.advance(20)
+
+        self.assertEqual(function(), "old")
+        wait_refresh(cache)
+        self.assertEqual(counter.call_count, 4)
+
+    def test_stale_result_is_returned_when_circuit_is_open(self, sleep):
+        for stale_while_retrying in [True, False]:
+            counter = mock.Mock(return_value="old")
+            breaker = circuit.CircuitBreaker(failure_threshold=1)
+            function = decorators.retry(
+                3, circuit_breaker=breaker, cache=self._cache(
+                    stale_while_retrying=stale_while_retrying))(plain(counter))
+
+            function()
+            breaker.record_failure()
+            self.clock.advance(20)
+
+            self.assertEqual(function(), "old")
+            self.assertEqual(counter.call_count, 1)
+
+    def test_stale_result_is_returned_when_budget_is_spent(self, sleep):
+        counter = mock.Mock(side_effect=["old", SuperPuperException(),
+                                         "new"])
+        cache = self._cache()
+        retry_budget = budget.RetryBudget(ratio=0, min_retries_per_second=0,
+                                          clock=self.clock)
+        function = decorators.retry(3, retry_budget=retry_budget,
+                                    cache=cache)(plain(counter))
+
+        function()
+        self.clock.advance(20)
+
+        self.assertEqual(function(), "old")
+        wait_refresh(cache)
+        self.assertEqual(counter.call_count, 2)
+
+    def test_stale_result_is_returned_when_attempts_fail(self, sleep):
+        counter = mock.Mock(side_effect=["old"] + [SuperPuperException()] * 3)
+        function = decorators.retry(
+            3, cache=self._cache(stale_while_retrying=False))(plain(counter))
+
+        function()
+        self.clock.advance(20)
+
+        self.assertEqual(function(), "old")
+        self.assertEqual(counter.call_count, 4)
+
+    def test_too_stale_result_isnt_returned(self, sleep):
+        counter = mock.Mock(side_effect=["old"] + [SuperPuperException()] * 3)
+        function = decorators.retry(3, cache=self._cache())(plain(counter))
+
+        function()
+        self.clock.advance(110)
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 4)
+
+    def test_not_retriable_error_isnt_hidden(self, sleep):
+        counter = mock.Mock(side_effect=["old", ValueError()])
+        function = decorators.retry(3, retry_on=SuperPuperException,
+                                    cache=self._cache())(plain(counter))
+
+        function()
+        self.clock.advance(20)
+
+        self.assertRaises(ValueError, function)
+
+    def test_refresh_ahead(self, sleep):
+        counter = mock.Mock(side_effect=["old", "new"])
+        cache = self._cache(refresh_ahead=0.5)
+        function = decorators.retry(3, cache=cache)(plain(counter))
+
+        function()
+        self.clock.advance(6)
+
+        self.assertEqual(function(), "old")
+        wait_refresh(cache)
+        self.assertEqual(function(), "new")
+
+    def test_least_recently_used_result_is_evicted(self, sleep):
+        counter = mock.Mock(side_effect=lambda x: x)
+        function = decorators.retry(3, cache=self._cache(maxsize=2))(
+            plain(counter))
+
+        function(1)
+        function(2)
+        function(1)
+        function(3)
+        function(1)
+        function(2)
+
+        self.assertEqual([c[0][0] for c in counter.call_args_list],
+                         [1, 2, 3, 2])
+
+    def test_unhashable_arguments_arent_cached(self, sleep):
+        counter = mock.Mock(return_value="OK")
+        function = decorators.retry(3, cache=self._cache())(plain(counter))
+
+        function([1])
+        function([1])
+
+        self.assertEqual(counter.call_count, 2)
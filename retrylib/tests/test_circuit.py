@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+
+import mock
+
+from retrylib import circuit
+from retrylib import decorators
+from retrylib import network
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 3
+FAILURE_THRESHOLD = 3
+RECOVERY_TIMEOUT = 10
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class DontRetryException(Exception):
+    pass
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTestCase, self).setUp()
+        self.clock = FakeClock()
+        self.breaker = circuit.CircuitBreaker(FAILURE_THRESHOLD,
+                                              RECOVERY_TIMEOUT,
+                                              clock=self.clock)
+
+    def _open(self):
+        for _ in range(FAILURE_THRESHOLD):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(FAILURE_THRESHOLD - 1):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.assertRaises(circuit.CircuitOpenError,
+                          self.breaker.before_call)
+
+    def test_success_resets_failures(self):
+        for _ in range(FAILURE_THRESHOLD - 1):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_half_open_allows_limited_trial_calls(self):
+        self._open()
+        self.clock.now = RECOVERY_TIMEOUT
+
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_trial_success_closes_circuit(self):
+        self._open()
+        self.clock.now = RECOVERY_TIMEOUT
+        self.breaker.before_call()
+
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_trial_failure_opens_circuit(self):
+        self._open()
+        self.clock.now = RECOVERY_TIMEOUT
+        self.breaker.before_call()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_released_trial_lets_another_one_through(self):
+        self._open()
+        self.clock.now = RECOVERY_TIMEOUT
+        self.breaker.before_call()
+
+        self.breaker.release_trial()
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_lost_trial_expires(self):
+        self._open()
+        self.clock.now = RECOVERY_TIMEOUT
+        self.breaker.before_call()
+
+        self.clock.now += RECOVERY_TIMEOUT - 1
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.now += 1
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+
+class RetryWithCircuitBreakerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RetryWithCircuitBreakerTestCase, self).setUp()
+        self.breaker = circuit.CircuitBreaker(FAILURE_THRESHOLD,
+                                              RECOVERY_TIMEOUT)
+
+    @mock.patch('time.sleep')
+    def test_open_circuit_fails_without_sleep(self, sleep):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(RETRY_ATTEMPTS * 2, circuit_breaker=self.breaker)
+        def function():
+            counter()
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, FAILURE_THRESHOLD)
+        self.assertEqual(sleep.call_count, FAILURE_THRESHOLD - 1)
+
+        sleep.reset_mock()
+        self.assertRaises(circuit.CircuitOpenError, function)
+        self.assertEqual(counter.call_count, FAILURE_THRESHOLD)
+        self.assertFalse(sleep.called)
+
+    @mock.patch('time.sleep')
+    def test_breaker_is_shared_between_functions(self, sleep):
+
+        @network.retry(RETRY_ATTEMPTS, delay=0,
+                       circuit_breaker=self.breaker)
+        def first():
+            raise socket.timeout()
+
+        @network.retry(RETRY_ATTEMPTS, delay=0,
+                       circuit_breaker=self.breaker)
+        def second():
+            return "OK"
+
+        self.assertRaises(socket.timeout, first)
+        self.assertRaises(circuit.CircuitOpenError, second)
+
+    def test_not_retriable_errors_dont_open_circuit(self):
+
+        @decorators.retry(RETRY_ATTEMPTS, retry_on=SuperPuperException,
+                          circuit_breaker=self.breaker)
+        def function():
+            raise DontRetryException()
+
+        for _ in range(FAILURE_THRESHOLD):
+            self.assertRaises(DontRetryException, function)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_breaker_classification(self):
+        breaker = circuit.CircuitBreaker(1, RECOVERY_TIMEOUT,
+                                         retry_on=network.is_network_failure)
+
+        breaker.record_error(SuperPuperException(), True)
+        self.assertEqual(breaker.state, circuit.CLOSED)
+
+        breaker.record_error(socket.timeout(), False)
+        self.assertEqual(breaker.state, circuit.OPEN)
+
+    def test_interrupted_trial_is_released(self):
+        clock = FakeClock()
+        breaker = circuit.CircuitBreaker(1, RECOVERY_TIMEOUT, clock=clock)
+        breaker.record_failure()
+        clock.now = RECOVERY_TIMEOUT
+
+        @decorators.retry(RETRY_ATTEMPTS, circuit_breaker=breaker)
+        def function():
+            raise KeyboardInterrupt()
+
+        self.assertRaises(KeyboardInterrupt, function)
+        self.assertEqual(breaker.state, circuit.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from retrylib import classifier
+from retrylib import decorators
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class SubException(SuperPuperException):
+    pass
+
+
+class StatusException(Exception):
+
+    def __init__(self, status):
+        super(StatusException, self).__init__(status)
+        self.status = status
+
+
+class ExceptionClassifierTestCase(base.TestCase):
+
+    def test_exception_types(self):
+        rules = classifier.ExceptionClassifier(SuperPuperException)
+
+        self.assertTrue(rules.need_to_retry(SuperPuperException()))
+        self.assertTrue(rules.need_to_retry(SubException()))
+        self.assertFalse(rules.need_to_retry(ValueError()))
+
+    def test_status_codes(self):
+        rules = classifier.ExceptionClassifier(
+            Exception,
+            status_rules=[classifier.StatusRule(
+                StatusException, lambda exc: exc.status)],
+            status_codes=[503])
+
+        self.assertTrue(rules.need_to_retry(StatusException(503)))
+        self.assertFalse(rules.need_to_retry(StatusException(404)))
+        self.assertTrue(rules.need_to_retry(ValueError()))
+
+    def test_predicates(self):
+        rules = classifier.ExceptionClassifier(
+            predicates=[lambda exc: "temporary" in str(exc)])
+
+        self.assertTrue(rules.need_to_retry(ValueError("temporary")))
+        self.assertFalse(rules.need_to_retry(ValueError("permanent")))
+
+    def test_decision_is_cached_per_class(self):
+        rules = classifier.ExceptionClassifier(SuperPuperException)
+
+        rules.need_to_retry(SubException())
+        with mock.patch.object(rules, "_compile") as compile_rules:
+            self.assertTrue(rules.need_to_retry(SubException()))
+        self.assertFalse(compile_rules.called)
+
+    def test_cache_is_bounded(self):
+        rules = classifier.ExceptionClassifier(SuperPuperException,
+                                               cache_size=2)
+        for exc_class in (SuperPuperException, SubException, ValueError):
+            rules.need_to_retry(exc_class())
+
+        self.assertEqual(list(rules._cache), [SubException, ValueError])
+
+    def test_classifier_as_retry_on(self):
+        rules = classifier.ExceptionClassifier(SuperPuperException)
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(3, retry_on=rules)
+        def function():
+            counter()
+
+        with mock.patch('time.sleep'):
+            self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 3)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import mock
+
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class VirtualClockTestCase(base.TestCase):
+
+    def setUp(self):
+        super(VirtualClockTestCase, self).setUp()
+        self.clock = clocks.VirtualClock()
+
+    def test_sleep_advances_time(self):
+        self.clock.sleep(10)
+        self.clock.advance(5)
+
+        self.assertEqual(self.clock.monotonic(), 15)
+        self.assertEqual(self.clock(), 15)
+        self.assertEqual(self.clock.sleeps, [10])
+
+    def test_long_backoff_is_simulated(self):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(5, delay=60, step=60)
+        def function():
+            counter()
+
+        started = time.time()
+        monotonic = decorators.monotonic
+        with self.clock.patch():
+            self.assertRaises(SuperPuperException, function)
+
+        self.assertEqual(self.clock.sleeps, [60, 120, 180, 240])
+        self.assertEqual(self.clock.slept, 600)
+        self.assertLess(time.time() - started, 1)
+        self.assertIs(decorators.monotonic, monotonic)
+
+    def test_deadline_uses_virtual_time(self):
+
+        @decorators.retry(-1, delay=4, deadline=10)
+        def function():
+            raise SuperPuperException()
+
+        with self.clock.patch():
+            self.assertRaises(SuperPuperException, function)
+
+        self.assertEqual(self.clock.sleeps, [4, 4, 2])
+
+    def test_circuit_breaker_recovers_in_virtual_time(self):
+        with self.clock.patch():
+            breaker = circuit.CircuitBreaker(failure_threshold=1,
+                                             recovery_timeout=30)
+            breaker.record_failure()
+            self.assertFalse(breaker.allow_request())
+            time.sleep(30)
+            self.assertTrue(breaker.allow_request())
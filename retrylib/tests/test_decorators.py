@@ -14,12 +14,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+import sys
+import traceback
+import unittest
+
 import mock
 
 from retrylib.tests import base
 
 import retrylib
 from retrylib import decorators
+from retrylib import logs
 
 
 RETRY_ATTEMPTS = 5
@@ -119,6 +125,37 @@ class RetryTestCase(base.TestCase):
             mock.call(MAX_DELAY)
         ])
 
+    @mock.patch('time.sleep')
+    def test_errors_of_retries_arent_chained(self, sleep):
+        for kwargs in [{}, {"deadline": 60}]:
+            errors = [SuperPuperException("first"),
+                      SuperPuperException("last")]
+
+            @decorators.retry(2, **kwargs)
+            def function():
+                raise errors.pop(0)
+
+            with self.assertRaises(SuperPuperException) as context:
+                function()
+            self.assertEqual(str(context.exception), "last")
+            self.assertIsNone(getattr(context.exception, "__context__",
+                                      None))
+
+    @mock.patch('time.sleep')
+    def test_traceback_of_error_is_kept(self, sleep):
+        for kwargs in [{}, {"deadline": 60}]:
+            for attempts in [1, 2]:
+
+                @decorators.retry(attempts, **kwargs)
+                def function():
+                    raise SuperPuperException()
+
+                try:
+                    function()
+                except SuperPuperException:
+                    frames = traceback.extract_tb(sys.exc_info()[2])
+                self.assertEqual(frames[-1][2], "function")
+
     def test_retry_works_with_function_without_parameters(self):
         @decorators.retry(RETRY_ATTEMPTS, delay=0)
         def function_without_parameters():
@@ -253,3 +290,246 @@ class LoggerTestCase(base.TestCase):
 
         self.assertRaises(SuperPuperException,
                           obj.reliable_method)
+
+
+class RetryPolicyTestCase(base.TestCase):
+
+    def test_policy_is_immutable(self):
+        policy = decorators.RetryPolicy(RETRY_ATTEMPTS)
+
+        self.assertRaises(AttributeError, setattr, policy, "delay", 1)
+        self.assertRaises(AttributeError, setattr, policy, "foo", 1)
+
+    def test_policy_is_compiled_once(self):
+        policy = decorators.RetryPolicy(
+            RETRY_ATTEMPTS, retry_on=(SuperPuperException,))
+
+        @policy
+        def function():
+            return "OK"
+
+        self.assertIs(function.retry_policy, policy)
+        self.assertIsInstance(policy.catch_strategy,
+                              decorators.CatchExceptionStrategy)
+        self.assertEqual(function(), "OK")
+
+    def test_catch_strategy_is_accepted_as_is(self):
+        strategy = decorators.CatchExceptionStrategy(SuperPuperException)
+        policy = decorators.RetryPolicy(RETRY_ATTEMPTS, retry_on=strategy)
+
+        self.assertIs(policy.catch_strategy, strategy)
+
+    @mock.patch('time.sleep')
+    def test_call_retries_function(self, sleep):
+        policy = decorators.RetryPolicy(RETRY_ATTEMPTS)
+        func = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        self.assertEqual(policy.call(func, 1, a=2), "OK")
+        func.assert_called_with(1, a=2)
+        self.assertEqual(func.call_count, 2)
+
+    def test_logger_is_not_looked_up_on_success(self):
+        obj = mock.Mock()
+
+        @decorators.retry(RETRY_ATTEMPTS)
+        def method(self):
+            return "OK"
+
+        self.assertEqual(method(obj), "OK")
+        self.assertFalse(obj.get_logger.called)
+
+
+class DeadlineTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DeadlineTestCase, self).setUp()
+        self.now = 0
+        patcher = mock.patch.object(decorators, "monotonic",
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('time.sleep', side_effect=self._sleep)
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _sleep(self, seconds):
+        self.now += seconds
+
+    def test_last_delay_is_shortened(self):
+
+        @decorators.retry(-1, delay=4, deadline=10)
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+        self.sleep.assert_has_calls([mock.call(4), mock.call(4),
+                                     mock.call(2)])
+        self.assertEqual(self.now, 10)
+
+    def test_attempt_that_cannot_finish_is_skipped(self):
+        counter = mock.Mock()
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=1, deadline=10)
+        def function():
+            counter()
+            self.now += 4
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 2)
+        self.sleep.assert_called_once_with(1)
+
+    def test_remaining_time_is_passed(self):
+        remaining = []
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=1, deadline=10,
+                          deadline_kwarg="timeout")
+        def function(timeout):
+            remaining.append(timeout)
+            if len(remaining) < 3:
+                raise SuperPuperException()
+            return "OK"
+
+        self.assertEqual(function(), "OK")
+        self.assertEqual(remaining, [10, 9, 8])
+
+    @unittest.skipIf(decorators.contextvars is None,
+                     "contextvars is missing")
+    def test_remaining_time_is_available(self):
+        remaining = []
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=1, deadline=10)
+        def function():
+            remaining.append(decorators.remaining_time())
+            if len(remaining) < 3:
+                raise SuperPuperException()
+            return "OK"
+
+        self.assertEqual(function(), "OK")
+        self.assertEqual(remaining, [10, 9, 8])
+        self.assertIsNone(decorators.remaining_time())
+
+
+class LazyLoggingTestCase(base.TestCase):
+
+    @mock.patch('time.sleep')
+    def test_message_isnt_formatted_if_disabled(self, sleep):
+        logger = logging.getLogger("retrylib.tests.disabled")
+        logger.setLevel(logging.ERROR)
+
+        @decorators.retry(RETRY_ATTEMPTS, logger=logger)
+        def function():
+            raise SuperPuperException()
+
+        with mock.patch.object(logger, "warning") as warning:
+            self.assertRaises(SuperPuperException, function)
+        self.assertFalse(warning.called)
+
+    @mock.patch('time.sleep')
+    def test_exception_is_formatted_by_logging(self, sleep):
+        logger = mock.MagicMock()
+        error = SuperPuperException("boom")
+
+        @decorators.retry(2, logger=logger)
+        def function():
+            raise error
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertIn(error, logger.warning.call_args[0])
+
+    @mock.patch('time.sleep')
+    def test_similar_retries_are_suppressed(self, sleep):
+        logger = mock.MagicMock()
+        now = [0]
+
+        with mock.patch.object(logs, "monotonic", lambda: now[0]):
+
+            @decorators.retry(RETRY_ATTEMPTS, logger=logger,
+                              log_interval=10)
+            def function():
+                raise SuperPuperException()
+
+            self.assertRaises(SuperPuperException, function)
+            self.assertRaises(SuperPuperException, function)
+            self.assertEqual(logger.warning.call_count, 1)
+
+            now[0] = 10
+            self.assertRaises(SuperPuperException, function)
+
+        self.assertEqual(logger.warning.call_count, 2)
+        message, args = (logger.warning.call_args[0][0],
+                         logger.warning.call_args[0][1:])
+        self.assertEqual(message % args,
+                         "Retry: Call to function failed due to "
+                         "SuperPuperException: , retry attempt #1/4 after "
+                         "0s, suppressed 7 similar retries in last 10s")
+
+    @mock.patch('time.sleep')
+    def test_object_logger_is_looked_up_once(self, sleep):
+
+        class TestClass(object):
+            def __init__(self):
+                self.get_logger = mock.Mock(return_value=mock.MagicMock())
+
+            @decorators.retry(RETRY_ATTEMPTS)
+            def reliable_method(self):
+                raise SuperPuperException()
+
+        obj = TestClass()
+        self.assertRaises(SuperPuperException, obj.reliable_method)
+        self.assertRaises(SuperPuperException, obj.reliable_method)
+
+        self.assertEqual(obj.get_logger.call_count, 1)
+        self.assertEqual(obj.get_logger.return_value.warning.call_count,
+                         (RETRY_ATTEMPTS - 1) * 2)
+
+
+class AllocationTestCase(base.TestCase):
+
+    def setUp(self):
+        super(AllocationTestCase, self).setUp()
+        # Mock loggers would keep every call
+        self.logger = logging.Logger("allocation")
+        self.logger.addHandler(logging.NullHandler())
+
+    def test_retry_state_has_no_dict(self):
+        policy = decorators.RetryPolicy(RETRY_ATTEMPTS)
+        state = decorators.RetryState(policy, len, (), {})
+
+        self.assertFalse(hasattr(state, "__dict__"))
+
+    @base.requires_tracemalloc
+    def test_success_path_allocates_like_forwarding_function(self):
+
+        def function(*args, **kwargs):
+            return None
+
+        def forwarding(*args, **kwargs):
+            return function(*args, **kwargs)
+
+        decorated = decorators.retry(RETRY_ATTEMPTS)(function)
+
+        self.assertTrue(decorated.retry_policy.fast_path)
+        self.assertLessEqual(
+            base.allocation_peak(lambda: decorated(1, a=2)),
+            base.allocation_peak(lambda: forwarding(1, a=2)))
+
+    @mock.patch.object(decorators, "RetryState",
+                       side_effect=AssertionError("RetryState is created"))
+    def test_success_path_creates_no_state(self, retry_state):
+        function = decorators.retry(RETRY_ATTEMPTS)(lambda: "OK")
+
+        self.assertEqual(function(), "OK")
+
+    @base.requires_tracemalloc
+    @mock.patch('time.sleep', lambda delay: None)
+    def test_failure_path_memory_does_not_grow_with_attempts(self):
+
+        def function():
+            raise SuperPuperException()
+
+        few = decorators.retry(10, logger=self.logger)(function)
+        many = decorators.retry(200, logger=self.logger)(function)
+
+        self.assertLessEqual(base.allocation_peak(many),
+                             base.allocation_peak(few))
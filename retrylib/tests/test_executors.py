@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import threading
+
+import mock
+
+from retrylib import circuit
+from retrylib import decorators
+from retrylib import executors
+from retrylib.tests import base
+from retrylib import tracing
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class RetryingExecutorTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RetryingExecutorTestCase, self).setUp()
+        self.pool = futures.ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        super(RetryingExecutorTestCase, self).tearDown()
+
+    @mock.patch('time.sleep')
+    def test_failed_task_is_rescheduled(self, sleep):
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+        executor = executors.RetryingExecutor(
+            self.pool, decorators.RetryPolicy(3, delay=0.01))
+
+        future = executor.submit(counter, 1, key="value")
+
+        self.assertEqual(future.result(timeout=5), "OK")
+        self.assertEqual(counter.call_count, 2)
+        counter.assert_called_with(1, key="value")
+        self.assertFalse(sleep.called)
+        executor.shutdown()
+
+    def test_attempts_are_exhausted(self):
+        counter = mock.Mock(side_effect=SuperPuperException())
+        executor = executors.RetryingExecutor(
+            self.pool, decorators.RetryPolicy(3))
+
+        future = executor.submit(counter)
+
+        self.assertRaises(SuperPuperException, future.result, 5)
+        self.assertEqual(counter.call_count, 3)
+        executor.shutdown()
+
+    def test_not_retriable_error(self):
+        counter = mock.Mock(side_effect=ValueError())
+        executor = executors.RetryingExecutor(
+            self.pool, decorators.RetryPolicy(
+                3, retry_on=SuperPuperException))
+
+        self.assertRaises(ValueError, executor.submit(counter).result, 5)
+        self.assertEqual(counter.call_count, 1)
+        executor.shutdown()
+
+    def test_worker_is_free_during_backoff(self):
+        finished = []
+        failed = threading.Event()
+        side_effect = [SuperPuperException(), "slow"]
+
+        def slow():
+            result = side_effect.pop(0)
+            if isinstance(result, Exception):
+                failed.set()
+                raise result
+            finished.append(result)
+            return result
+
+        def fast():
+            finished.append("fast")
+            return "fast"
+
+        with executors.RetryingExecutor(
+                self.pool, decorators.RetryPolicy(2, delay=0.2)) as executor:
+            slow_future = executor.submit(slow)
+            failed.wait(5)
+            fast_future = executor.submit(fast)
+            self.assertEqual(fast_future.result(timeout=5), "fast")
+            self.assertEqual(slow_future.result(timeout=5), "slow")
+
+        self.assertEqual(finished, ["fast", "slow"])
+
+    def test_map(self):
+        side_effect = {2: [SuperPuperException()]}
+
+        def function(number):
+            if side_effect.get(number):
+                raise side_effect[number].pop()
+            return number * 10
+
+        with executors.RetryingExecutor(
+                self.pool, decorators.RetryPolicy(2)) as executor:
+            self.assertEqual(list(executor.map(function, [1, 2, 3])),
+                             [10, 20, 30])
+
+    def test_shutdown_without_wait_cancels_delayed_retries(self):
+        counter = mock.Mock(side_effect=SuperPuperException())
+        executor = executors.RetryingExecutor(
+            self.pool, decorators.RetryPolicy(3, delay=60))
+        future = executor.submit(counter)
+        while not executor._timers:
+            threading.Event().wait(0.01)
+
+        executor.shutdown(wait=False)
+
+        self.assertTrue(future.cancelled())
+        self.assertEqual(counter.call_count, 1)
+        self.assertRaises(RuntimeError, executor.submit, counter)
+
+    def test_circuit_open(self):
+        breaker = circuit.CircuitBreaker(failure_threshold=1)
+        breaker.record_failure()
+        counter = mock.Mock()
+        executor = executors.RetryingExecutor(
+            self.pool, decorators.RetryPolicy(3, circuit_breaker=breaker))
+
+        self.assertRaises(circuit.CircuitOpenError,
+                          executor.submit(counter).result, 5)
+        self.assertFalse(counter.called)
+        executor.shutdown()
+
+    def test_calls_are_traced_across_threads(self):
+        exporter = tracing.InMemoryExporter()
+        policy = decorators.RetryPolicy(
+            2, listeners=[tracing.TracingListener(exporter)])
+        side_effect = {1: [SuperPuperException()],
+                       2: [SuperPuperException()]}
+
+        def function(number):
+            if side_effect[number]:
+                raise side_effect[number].pop()
+            return number
+
+        with executors.RetryingExecutor(self.pool, policy) as executor:
+            self.assertEqual(list(executor.map(function, [1, 2])), [1, 2])
+
+        calls = [span for span in exporter.spans
+                 if span.name == tracing.CALL_SPAN]
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(exporter.spans), 6)
+        for call in calls:
+            self.assertIsNone(call.parent)
+            self.assertEqual(call.attributes["retry.outcome"],
+                             tracing.SUCCESS)
+            self.assertEqual(call.attributes["retry.attempts"], 2)
+            attempts = [span for span in exporter.spans
+                        if span.parent is call]
+            self.assertEqual(
+                [span.attributes["retry.outcome"] for span in attempts],
+                [tracing.RETRY, tracing.SUCCESS])
+
+        # Calls finished by executor threads aren't parents of later calls
+        exporter.clear()
+        policy.call(function, 1)
+        self.assertIsNone(exporter.spans[-1].parent)
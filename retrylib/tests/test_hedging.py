@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import socket
+import sys
+import threading
+import traceback
+
+from retrylib import hedging
+from retrylib.tests import base
+
+
+HEDGE_DELAY = 0.01
+TIMEOUT = 5
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class HedgingTestCase(base.TestCase):
+
+    def setUp(self):
+        super(HedgingTestCase, self).setUp()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.calls = itertools.count(1)
+
+    def test_fast_call_isnt_hedged(self):
+
+        @hedging.hedge(delay=TIMEOUT)
+        def function():
+            return next(self.calls)
+
+        self.assertEqual(function(), 1)
+        self.assertEqual(next(self.calls), 2)
+
+    def test_slow_attempt_is_hedged(self):
+
+        @hedging.hedge(delay=HEDGE_DELAY)
+        def function():
+            if next(self.calls) == 1:
+                self.release.wait(TIMEOUT)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(function(), "fast")
+
+    def test_network_failure_is_replaced(self):
+
+        @hedging.hedge(delay=TIMEOUT)
+        def function():
+            if next(self.calls) == 1:
+                raise socket.timeout()
+            return "OK"
+
+        self.assertEqual(function(), "OK")
+
+    def test_not_retriable_error_is_raised(self):
+
+        @hedging.hedge(delay=TIMEOUT)
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+
+    def test_last_error_is_raised(self):
+
+        @hedging.hedge(delay=TIMEOUT, max_hedges=2)
+        def function():
+            next(self.calls)
+            raise socket.timeout()
+
+        self.assertRaises(socket.timeout, function)
+        self.assertEqual(next(self.calls), 4)
+
+    def test_traceback_of_error_is_kept(self):
+
+        @hedging.hedge(delay=TIMEOUT, max_hedges=0)
+        def function():
+            raise socket.timeout()
+
+        try:
+            function()
+        except socket.timeout:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.assertEqual(frames[-1][2], "function")
+
+    def test_concurrent_hedges_are_limited(self):
+        hedger = hedging.Hedger(delay=HEDGE_DELAY, max_concurrent_hedges=0)
+
+        @hedger
+        def function():
+            if next(self.calls) == 1:
+                self.release.wait(HEDGE_DELAY * 10)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(function(), "slow")
+
+
+class LatencyTrackerTestCase(base.TestCase):
+
+    def test_percentile(self):
+        tracker = hedging.LatencyTracker(percentile=0.9, window=100,
+                                         min_samples=10)
+        for latency in range(9):
+            tracker.record(latency)
+        self.assertIsNone(tracker.value)
+
+        for latency in range(9, 100):
+            tracker.record(latency)
+        self.assertEqual(tracker.value, 90)
+
+    def test_old_latencies_are_forgotten(self):
+        tracker = hedging.LatencyTracker(percentile=0.5, window=10,
+                                         min_samples=10)
+        for latency in [100] * 10 + [1] * 10:
+            tracker.record(latency)
+        self.assertEqual(tracker.value, 1)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from retrylib import decorators
+from retrylib import listeners
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 3
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class RecordingListener(listeners.RetryListener):
+
+    def __init__(self):
+        self.events = []
+
+    def on_attempt(self, event):
+        self.events.append(("attempt", event.attempt))
+
+    def on_retry(self, event):
+        self.events.append(("retry", event.attempt, event.delay))
+
+    def on_giveup(self, event):
+        self.events.append(("giveup", event.attempt,
+                            event.error.__class__))
+
+    def on_success(self, event):
+        self.events.append(("success", event.attempt))
+
+
+class ListenersTestCase(base.TestCase):
+
+    def setUp(self):
+        super(ListenersTestCase, self).setUp()
+        self.listener = RecordingListener()
+
+    @mock.patch('time.sleep')
+    def test_success_after_retry(self, sleep):
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=1, listeners=[self.listener])
+        def function():
+            return counter()
+
+        self.assertEqual(function(), "OK")
+        self.assertEqual(self.listener.events,
+                         [("attempt", 1), ("retry", 1, 1), ("attempt", 2),
+                          ("success", 2)])
+
+    @mock.patch('time.sleep')
+    def test_giveup(self, sleep):
+
+        @decorators.retry(2, delay=1, listeners=[self.listener])
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(self.listener.events,
+                         [("attempt", 1), ("retry", 1, 1), ("attempt", 2),
+                          ("giveup", 2, SuperPuperException)])
+
+    def test_event_has_function_name_and_elapsed_time(self):
+        listener = mock.Mock()
+
+        @decorators.retry(RETRY_ATTEMPTS, listeners=[listener])
+        def function():
+            return "OK"
+
+        function()
+
+        event = listener.on_success.call_args[0][0]
+        self.assertTrue(event.func_name.endswith(".function"))
+        self.assertGreaterEqual(event.elapsed, 0)
+
+
+class MetricsCollectorTestCase(base.TestCase):
+
+    def setUp(self):
+        super(MetricsCollectorTestCase, self).setUp()
+        self.collector = listeners.MetricsCollector(buckets=(0.1, 1))
+
+    def _event(self, attempt=1, elapsed=0.5):
+        return listeners.RetryEvent("module.function", attempt, elapsed)
+
+    def test_counters(self):
+        self.collector.on_attempt(self._event())
+        self.collector.on_retry(self._event())
+        self.collector.on_attempt(self._event(2))
+        self.collector.on_success(self._event(2))
+
+        metrics = self.collector.get_metrics("module.function")
+        self.assertEqual((metrics.attempts, metrics.retries,
+                          metrics.successes, metrics.giveups),
+                         (2, 1, 1, 0))
+
+    def test_prometheus_format(self):
+        self.collector.on_success(self._event(elapsed=0.05))
+        self.collector.on_giveup(self._event(elapsed=5))
+
+        text = self.collector.to_prometheus()
+
+        self.assertIn('retrylib_successes_total{function="module.function"}'
+                      ' 1\n', text)
+        self.assertIn('retrylib_giveups_total{function="module.function"}'
+                      ' 1\n', text)
+        self.assertIn('# TYPE retrylib_call_duration_seconds histogram\n',
+                      text)
+        for bound, count in (("0.1", 1), ("1.0", 1), ("+Inf", 2)):
+            self.assertIn('retrylib_call_duration_seconds_bucket{'
+                          'function="module.function",le="%s"} %s\n' %
+                          (bound, count), text)
+        self.assertIn('retrylib_call_duration_seconds_count{'
+                      'function="module.function"} 2\n', text)
+
+    @mock.patch('time.sleep')
+    def test_collector_as_listener(self, sleep):
+
+        @decorators.retry(RETRY_ATTEMPTS, listeners=[self.collector])
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+
+        metrics = self.collector.get_metrics(
+            listeners.get_func_name(function))
+        self.assertEqual(metrics.attempts, RETRY_ATTEMPTS)
+        self.assertEqual(metrics.giveups, 1)
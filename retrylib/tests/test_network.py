@@ -15,9 +15,13 @@
 # limitations under the License.
 
 import mock
+import requests
 import socket
+import sys
+import traceback
 from six.moves import http_client, urllib
 
+from retrylib import decorators
 from retrylib import network
 from retrylib.tests import base
 
@@ -64,3 +68,163 @@ class RetryTestCase(base.TestCase):
     def test_must_retry_one_time_and_return_correct_result(self):
         self.assertIsNone(self._target.retry_method_works_correct())
         self.assertEqual(self._target.retry_count.call_count, 1)
+
+    def test_errors_of_retries_arent_chained(self):
+        errors = [socket.timeout("first"), socket.timeout("last")]
+
+        @network.retry(2, delay=0)
+        def function():
+            raise errors.pop(0)
+
+        with self.assertRaises(socket.timeout) as context:
+            function()
+        self.assertIsNone(getattr(context.exception, "__context__", None))
+
+    def test_traceback_of_error_is_kept(self):
+
+        @network.retry(2, delay=0)
+        def function():
+            raise socket.timeout()
+
+        try:
+            function()
+        except socket.timeout:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.assertEqual(frames[-1][2], "function")
+
+
+class DefaultsTestCase(base.TestCase):
+
+    @mock.patch('time.sleep')
+    def test_changed_defaults_are_used(self, sleep):
+        counter = mock.Mock(side_effect=socket.timeout())
+
+        @network.retry()
+        def function():
+            counter()
+
+        with mock.patch.object(network.defaults, "HTTP_RETRY_ATTEMPTS", 5):
+            self.assertRaises(socket.timeout, function)
+        self.assertEqual(counter.call_count, 5)
+
+
+class RetryAfterTestCase(base.TestCase):
+
+    def _requests_error(self, status_code, headers):
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers.update(headers)
+        return requests.exceptions.HTTPError(response=response)
+
+    def test_too_many_requests_is_network_failure(self):
+        self.assertTrue(network.is_network_failure(
+            self._requests_error(429, {})))
+
+    def test_parse_seconds(self):
+        self.assertEqual(network.parse_retry_after("120"), 120)
+        self.assertEqual(network.parse_retry_after(" 1.5 "), 1.5)
+        self.assertIsNone(network.parse_retry_after("soon"))
+
+    @mock.patch('time.time')
+    def test_parse_http_date(self, time):
+        time.return_value = 1445412480  # Wed, 21 Oct 2015 07:28:00 GMT
+
+        self.assertEqual(
+            network.parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT"), 30)
+        self.assertEqual(
+            network.parse_retry_after("Wed, 21 Oct 2015 07:27:00 GMT"), 0)
+
+    def test_get_retry_after_from_urllib_error(self):
+        error = urllib.error.HTTPError(
+            "FakeUrl", network.TOO_MANY_REQUESTS, "FakeMessage",
+            {"Retry-After": "7"}, None)
+
+        self.assertEqual(network.get_retry_after(error), 7)
+
+    def test_get_retry_after_from_urllib_error_without_fp(self):
+        error = urllib.error.HTTPError(
+            "FakeUrl", network.TOO_MANY_REQUESTS, "FakeMessage", None, None)
+
+        self.assertIsNone(network.get_retry_after(error))
+
+    def test_get_retry_after_without_header(self):
+        self.assertIsNone(network.get_retry_after(
+            self._requests_error(503, {})))
+        self.assertIsNone(network.get_retry_after(socket.timeout()))
+
+    @mock.patch('time.sleep')
+    def test_server_delay_is_used_and_limited(self, sleep):
+        errors = [self._requests_error(429, {"Retry-After": "5"}),
+                  self._requests_error(503, {"Retry-After": "100"}),
+                  self._requests_error(503, {}),
+                  self._requests_error(503, {})]
+
+        @network.retry(4, delay=1, step=1, max_delay=10)
+        def function():
+            raise errors.pop(0)
+
+        self.assertRaises(requests.exceptions.HTTPError, function)
+        sleep.assert_has_calls([mock.call(5), mock.call(10), mock.call(3)])
+
+    @mock.patch('time.sleep')
+    def test_server_delay_may_be_ignored(self, sleep):
+
+        @network.retry(2, delay=1, retry_after=None)
+        def function():
+            raise self._requests_error(503, {"Retry-After": "5"})
+
+        self.assertRaises(requests.exceptions.HTTPError, function)
+        sleep.assert_called_once_with(1)
+
+
+class IsNetworkFailureTestCase(base.TestCase):
+
+    def _requests_error(self, status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return requests.exceptions.HTTPError(response=response)
+
+    def test_http_errors_are_classified_by_status_code(self):
+        self.assertTrue(network.is_network_failure(
+            self._requests_error(503)))
+        self.assertFalse(network.is_network_failure(
+            self._requests_error(404)))
+        self.assertFalse(network.is_network_failure(
+            urllib.error.HTTPError("FakeUrl", 404, "FakeMessage",
+                                   None, None)))
+
+    def test_connection_errors(self):
+        self.assertTrue(network.is_network_failure(socket.timeout()))
+        self.assertTrue(network.is_network_failure(
+            requests.exceptions.ConnectionError()))
+        self.assertTrue(network.is_network_failure(
+            http_client.BadStatusLine("")))
+        self.assertFalse(network.is_network_failure(ValueError()))
+
+
+class AllocationTestCase(base.TestCase):
+
+    @base.requires_tracemalloc
+    def test_success_path_allocates_like_forwarding_function(self):
+
+        def function(*args, **kwargs):
+            return None
+
+        def forwarding(*args, **kwargs):
+            return function(*args, **kwargs)
+
+        expected = base.allocation_peak(lambda: forwarding(1, a=2))
+        for decorator in (network.retry(RETRY_ATTEMPTS, delay=0),
+                          network.retry()):
+            decorated = decorator(function)
+            self.assertLessEqual(
+                base.allocation_peak(lambda: decorated(1, a=2)), expected)
+
+    @mock.patch.object(decorators, "RetryState",
+                       side_effect=AssertionError("RetryState is created"))
+    def test_success_path_creates_no_state(self, retry_state):
+        for decorator in (network.retry(RETRY_ATTEMPTS, delay=0),
+                          network.retry()):
+            function = decorator(lambda: "OK")
+
+            self.assertEqual(function(), "OK")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+import unittest
+
+import retrylib
+from retrylib import network
+from retrylib.tests import base
+
+
+class LazyImportTestCase(base.TestCase):
+
+    def _run(self, code):
+        return subprocess.check_output([sys.executable, "-c", code])
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     "module __getattr__ is missing")
+    def test_network_isnt_imported_with_package(self):
+        output = self._run("import sys, retrylib; "
+                           "print('requests' in sys.modules, "
+                           "'retrylib.network' in sys.modules)")
+
+        self.assertEqual(output.split(), [b"False", b"False"])
+
+    def test_submodule_is_imported_on_access(self):
+        self.assertIs(retrylib.network, network)
+        self.assertIs(retrylib.retry, retrylib.decorators.retry)
+
+    def test_unknown_attribute(self):
+        self.assertRaises(AttributeError, getattr, retrylib, "unknown")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import mock
+
+from retrylib import clocks
+from retrylib import decorators
+from retrylib import ratelimit
+from retrylib.tests import base
+
+
+RETRY_ATTEMPTS = 3
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class RateLimiterTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RateLimiterTestCase, self).setUp()
+        self.clock = clocks.VirtualClock()
+        self.limiter = ratelimit.RateLimiter(rate=2, burst=3,
+                                             retry_reserve=1,
+                                             clock=self.clock)
+
+    def test_burst_is_allowed(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.reserve(), 0)
+
+        self.assertEqual(self.limiter.reserve(), 0.5)
+
+    def test_first_attempts_are_served_in_order(self):
+        for _ in range(3):
+            self.limiter.reserve()
+
+        self.assertEqual(
+            [self.limiter.reserve() for _ in range(3)], [0.5, 1, 1.5])
+        self.clock.advance(1.5)
+        self.assertEqual(self.limiter.tokens, 0)
+
+    def test_tokens_are_refilled_up_to_burst(self):
+        for _ in range(3):
+            self.limiter.reserve()
+        self.clock.advance(10)
+
+        self.assertEqual(self.limiter.tokens, 3)
+
+    def test_retries_leave_reserve_to_first_attempts(self):
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY), 0)
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY), 0)
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY), 0.5)
+
+    def test_first_attempt_takes_reserved_token(self):
+        self.limiter.reserve(ratelimit.RETRY)
+        self.limiter.reserve(ratelimit.RETRY)
+
+        self.assertEqual(self.limiter.reserve(), 0)
+
+    def test_retry_waits_for_borrowed_tokens(self):
+        for _ in range(4):
+            self.limiter.reserve()
+
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY), 1.5)
+
+    def test_wait_counts_toward_delay(self):
+        for _ in range(3):
+            self.limiter.reserve()
+
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY, delay=2), 2)
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY, delay=0.5),
+                         1)
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY, delay=0.5),
+                         1.5)
+
+    def test_delayed_retry_does_not_slow_first_attempts(self):
+        self.assertEqual(self.limiter.reserve(ratelimit.RETRY, delay=10),
+                         10)
+
+        for _ in range(3):
+            self.assertEqual(self.limiter.reserve(), 0)
+
+    def test_reserved_token_is_taken_when_call_is_made(self):
+        limiter = ratelimit.RateLimiter(rate=1, burst=1, clock=self.clock)
+        limiter.reserve(ratelimit.RETRY, delay=10)
+
+        self.clock.advance(10)
+
+        self.assertEqual(limiter.tokens, 0)
+        self.assertEqual(limiter.reserve(), 1)
+
+    def test_nothing_is_reserved_beyond_max_wait(self):
+        for _ in range(3):
+            self.limiter.reserve()
+
+        self.assertIsNone(self.limiter.reserve(max_wait=0.4))
+        self.assertFalse(self.limiter.try_acquire())
+        self.assertEqual(self.limiter.tokens, 0)
+
+    def test_acquire_sleeps(self):
+        limiter = ratelimit.RateLimiter(rate=10, burst=1, clock=self.clock)
+
+        with self.clock.patch():
+            limiter.acquire()
+            limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [0.1])
+
+    def test_parameters_are_validated(self):
+        self.assertRaises(ValueError, ratelimit.RateLimiter, rate=0)
+        self.assertRaises(ValueError, ratelimit.RateLimiter, rate=1,
+                          burst=2, retry_reserve=2)
+
+    def test_limiter_is_thread_safe(self):
+        limiter = ratelimit.RateLimiter(rate=1, burst=100,
+                                        clock=self.clock)
+
+        waits = []
+
+        def reserve():
+            for _ in range(50):
+                waits.append(limiter.reserve())
+
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(waits), [0] * 100 + list(range(1, 101)))
+
+
+class RateLimitedRetryTestCase(base.TestCase):
+
+    def setUp(self):
+        super(RateLimitedRetryTestCase, self).setUp()
+        self.clock = clocks.VirtualClock()
+        self.limiter = ratelimit.RateLimiter(rate=1, burst=2,
+                                             retry_reserve=1,
+                                             clock=self.clock)
+
+    def test_policy_has_no_fast_path(self):
+        policy = decorators.RetryPolicy(RETRY_ATTEMPTS,
+                                        rate_limiter=self.limiter)
+
+        self.assertFalse(policy.fast_path)
+
+    def test_first_attempts_wait_for_tokens(self):
+
+        @decorators.retry(RETRY_ATTEMPTS, rate_limiter=self.limiter)
+        def function():
+            return "OK"
+
+        with self.clock.patch():
+            for _ in range(3):
+                self.assertEqual(function(), "OK")
+
+        self.assertEqual(self.clock.sleeps, [1])
+
+    def test_waiting_for_token_is_part_of_delay(self):
+        counter = mock.Mock(side_effect=[SuperPuperException(),
+                                         SuperPuperException(), "OK"])
+
+        @decorators.retry(RETRY_ATTEMPTS, delay=0.5,
+                          rate_limiter=self.limiter)
+        def function():
+            return counter()
+
+        with self.clock.patch():
+            self.assertEqual(function(), "OK")
+
+        # The first retry takes the second token of burst only after
+        # refill as it is reserved for first attempts
+        self.assertEqual(self.clock.sleeps, [1, 1])
+
+    def test_retry_gives_up_at_deadline(self):
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        with self.clock.patch():
+            limiter = ratelimit.RateLimiter(rate=0.1, burst=2,
+                                            retry_reserve=1)
+
+            @decorators.retry(RETRY_ATTEMPTS, deadline=5,
+                              rate_limiter=limiter)
+            def function():
+                counter()
+
+            self.assertRaises(SuperPuperException, function)
+
+        self.assertEqual(counter.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import socket
+
+import mock
+
+from retrylib import backoff
+from retrylib import decorators
+from retrylib import registry
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+@mock.patch('time.sleep')
+class PolicyRegistryTestCase(base.TestCase):
+
+    def setUp(self):
+        super(PolicyRegistryTestCase, self).setUp()
+        self.registry = registry.PolicyRegistry()
+
+    def test_decorated_function_uses_current_policy(self, sleep):
+        counter = mock.Mock(side_effect=SuperPuperException())
+        self.registry.register("api", {"attempts_number": 2, "delay": 1})
+
+        @self.registry.retry("api")
+        def function():
+            counter()
+
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 2)
+
+        self.registry.register("api", {"attempts_number": 4})
+        counter.reset_mock()
+        self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 4)
+
+    def test_function_may_be_decorated_before_loading(self, sleep):
+        counter = mock.Mock(side_effect=[SuperPuperException(), "OK"])
+
+        @self.registry.retry("late")
+        def function():
+            return counter()
+
+        self.assertRaises(KeyError, function)
+        self.registry.load_json(json.dumps({"late": {"attempts_number": 2}}))
+        self.assertEqual(function(), "OK")
+
+    def test_default_policy(self, sleep):
+        reg = registry.PolicyRegistry(default={"attempts_number": 3})
+
+        self.assertEqual(reg.get("anything").attempts_number, 3)
+
+    def test_options_are_parsed(self, sleep):
+        policy = registry.make_policy({
+            "attempts_number": 5,
+            "retry_on": ["socket.timeout", "socket.error"],
+            "backoff": {"strategy": "exponential", "delay": 0.5,
+                        "max_delay": 10},
+            "deadline": 30})
+
+        self.assertIsInstance(policy.backoff, backoff.ExponentialBackoff)
+        self.assertTrue(policy.need_to_retry(socket.timeout()))
+        self.assertFalse(policy.need_to_retry(ValueError()))
+        self.assertEqual(policy.deadline, 30)
+
+    def test_invalid_config_changes_nothing(self, sleep):
+        self.registry.load({"a": {"attempts_number": 2},
+                            "b": {"attempts_number": 2}})
+
+        self.assertRaises(ValueError, self.registry.load,
+                          {"a": {"attempts_number": 5},
+                           "b": {"attempts": 5}})
+        self.assertRaises(ValueError, self.registry.load,
+                          {"a": {"attempts_number": 5,
+                                 "backoff": {"strategy": "unknown"}}})
+        self.assertEqual(self.registry.get("a").attempts_number, 2)
+
+    def test_replace(self, sleep):
+        self.registry.load({"a": {"attempts_number": 2},
+                            "b": {"attempts_number": 2}})
+        self.registry.load({"a": {"attempts_number": 3}}, replace=True)
+
+        self.assertEqual(self.registry.names(), ["a"])
+        self.assertRaises(KeyError, self.registry.get, "b")
+
+    def test_load_env(self, sleep):
+        self.registry.load_env(environ={
+            "RETRYLIB_POLICY_BILLING": '{"attempts_number": 7}',
+            "OTHER": "1"})
+
+        self.assertEqual(self.registry.names(), ["billing"])
+        self.assertEqual(self.registry.get("billing").attempts_number, 7)
+
+    def test_policy_object(self, sleep):
+        policy = decorators.RetryPolicy(3)
+        self.registry.register("a", policy)
+
+        self.assertIs(self.registry.get("a"), policy)
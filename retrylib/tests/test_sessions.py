@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import requests
+from requests import exceptions
+
+from retrylib import sessions
+from retrylib.tests import base
+
+
+URL = "http://example.com/path"
+
+
+class FakeConnection(object):
+
+    def __init__(self, dropped):
+        self.dropped = dropped
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def is_connection_dropped(conn):
+    return conn.dropped
+
+
+class EvictDroppedConnectionsTestCase(base.TestCase):
+
+    @mock.patch.object(sessions.urllib3_connection, "is_connection_dropped",
+                       is_connection_dropped)
+    def test_only_dropped_connections_are_evicted(self):
+        session = requests.Session()
+        pool = session.get_adapter(URL).poolmanager.connection_from_url(URL)
+        healthy = FakeConnection(dropped=False)
+        dropped = FakeConnection(dropped=True)
+        pool.pool.queue.extend([healthy, dropped])
+
+        self.assertEqual(sessions.evict_dropped_connections(session, URL), 1)
+
+        self.assertTrue(dropped.closed)
+        self.assertFalse(healthy.closed)
+        self.assertIn(healthy, pool.pool.queue)
+        self.assertNotIn(dropped, pool.pool.queue)
+        self.assertEqual(pool.pool.qsize(), pool.pool.maxsize + 2)
+
+    def test_closed_pool(self):
+        session = requests.Session()
+        pool = session.get_adapter(URL).poolmanager.connection_from_url(URL)
+        pool.close()
+
+        self.assertEqual(sessions.evict_dropped_connections(session, URL), 0)
+
+
+@mock.patch('time.sleep')
+class RetryingSessionTestCase(base.TestCase):
+
+    def test_connection_error_is_retried_on_same_session(self, sleep):
+        session = mock.Mock()
+        response = mock.Mock()
+        session.request.side_effect = [exceptions.ConnectionError(),
+                                       response]
+        retrying = sessions.RetryingSession(session, attempts_number=3,
+                                            delay=1)
+
+        with mock.patch.object(sessions,
+                               "evict_dropped_connections") as evict:
+            self.assertIs(retrying.get(URL, timeout=5), response)
+
+        evict.assert_called_once_with(session, URL)
+        session.request.assert_called_with("GET", URL, timeout=5,
+                                           allow_redirects=True)
+        self.assertEqual(session.request.call_count, 2)
+        self.assertFalse(session.mount.called)
+
+    def test_error_statuses_are_raised(self, sleep):
+        session = mock.Mock()
+        response = requests.Response()
+        response.status_code = 503
+        session.request.return_value = response
+        retrying = sessions.RetryingSession(session, attempts_number=2,
+                                            delay=1, raise_for_status=True)
+
+        self.assertRaises(exceptions.HTTPError, retrying.post, URL)
+        self.assertEqual(session.request.call_count, 2)
+
+    def test_not_retriable_status(self, sleep):
+        session = mock.Mock()
+        response = requests.Response()
+        response.status_code = 404
+        session.request.return_value = response
+        retrying = sessions.RetryingSession(session, attempts_number=2,
+                                            delay=1, raise_for_status=True)
+
+        self.assertRaises(exceptions.HTTPError, retrying.delete, URL)
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_pool_sizing(self, sleep):
+        retrying = sessions.RetryingSession(pool_connections=3,
+                                            pool_maxsize=20)
+
+        self.assertEqual(retrying.pool_connections, 3)
+        self.assertEqual(retrying.pool_maxsize, 20)
+        self.assertFalse(retrying.pool_block)
+        pool = retrying.session.get_adapter(
+            URL).poolmanager.connection_from_url(URL)
+        self.assertEqual(pool.pool.maxsize, 20)
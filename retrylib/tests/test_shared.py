@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib import shared
+from retrylib.tests import base
+from retrylib.tests import fake_redis
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+class BackendTestsMixin(object):
+
+    def test_incr(self):
+        self.assertEqual(self.backend.incr("a"), 1)
+        self.assertEqual(self.backend.incr("a", 5), 6)
+        self.assertEqual(self.backend.get_many(["a", "b"]), [6, 0])
+
+    def test_set_and_delete(self):
+        self.backend.set("a", 10)
+        self.assertEqual(self.backend.get("a"), 10)
+        self.backend.delete("a")
+        self.assertEqual(self.backend.get("a"), 0)
+        self.assertEqual(self.backend.incr("a"), 1)
+
+
+class MemoryBackendTestCase(BackendTestsMixin, base.TestCase):
+
+    def setUp(self):
+        super(MemoryBackendTestCase, self).setUp()
+        self.clock = clocks.VirtualClock(1000)
+        self.backend = shared.MemoryBackend(clock=self.clock)
+
+    def test_expiration(self):
+        self.backend.incr("a", ttl=10)
+        self.clock.advance(5)
+        self.assertEqual(self.backend.incr("a", ttl=10), 2)
+        self.clock.advance(5)
+        self.assertEqual(self.backend.get("a"), 0)
+
+
+class MmapBackendTestCase(BackendTestsMixin, base.TestCase):
+
+    def setUp(self):
+        super(MmapBackendTestCase, self).setUp()
+        self.clock = clocks.VirtualClock(1000)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "state")
+        self.backend = shared.MmapBackend(self.path, slots=8,
+                                          clock=self.clock)
+        self.addCleanup(self.backend.close)
+
+    def test_state_is_shared_through_file(self):
+        other = shared.MmapBackend(self.path, slots=8, clock=self.clock)
+        self.addCleanup(other.close)
+
+        self.backend.incr("a", 3)
+
+        self.assertEqual(other.incr("a"), 4)
+        self.assertEqual(self.backend.get("a"), 4)
+
+    def test_expired_slots_are_reused(self):
+        for index in range(8):
+            self.backend.incr("key-%s" % index, ttl=10)
+        self.assertRaises(RuntimeError, self.backend.incr, "other")
+
+        self.clock.advance(10)
+
+        self.assertEqual(self.backend.incr("other"), 1)
+        self.assertEqual(self.backend.get("key-0"), 0)
+
+
+class RedisBackendTestCase(BackendTestsMixin, base.TestCase):
+
+    def setUp(self):
+        super(RedisBackendTestCase, self).setUp()
+        self.server = fake_redis.FakeRedisServer().start()
+        self.addCleanup(self.server.stop)
+        self.backend = shared.RedisBackend(port=self.server.port,
+                                           prefix="test:")
+        self.addCleanup(self.backend.close)
+
+    def test_ttl_is_set_on_creation(self):
+        self.backend.incr("a", ttl=10)
+
+        self.assertEqual(self.backend.incr("a", ttl=10), 2)
+        self.assertEqual(self.server.commands,
+                         [b"MULTI", b"SET", b"INCRBY", b"EXEC"] * 2)
+        self.assertIsNotNone(self.server.values[b"test:a"][1])
+
+    def test_errors(self):
+        self.assertRaises(shared.RedisError, self.backend.execute,
+                          ("UNKNOWN", ))
+        self.assertEqual(self.backend.execute(("PING", )), [b"PONG"])
+
+
+class SharedCircuitBreakerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(SharedCircuitBreakerTestCase, self).setUp()
+        self.clock = clocks.VirtualClock(1000)
+        self.backend = shared.MemoryBackend(clock=self.clock)
+
+    def _breaker(self):
+        return shared.SharedCircuitBreaker(
+            self.backend, "db", failure_threshold=2, recovery_timeout=30,
+            sync_interval=1, clock=self.clock, wall_clock=self.clock)
+
+    def test_circuit_opened_by_other_process(self):
+        first, second = self._breaker(), self._breaker()
+        self.assertTrue(second.allow_request())
+
+        first.record_failure()
+        first.record_failure()
+        self.assertTrue(second.allow_request())
+
+        self.clock.advance(1)
+        self.assertFalse(second.allow_request())
+        self.assertEqual(second.state, circuit.OPEN)
+
+        self.clock.advance(29)
+        self.assertTrue(second.allow_request())
+        second.record_success()
+        self.assertEqual(self.backend.get("circuit:db:open-until"), 0)
+
+    def test_backend_is_read_once_per_interval(self):
+        breaker = self._breaker()
+        with mock.patch.object(self.backend, "get_many",
+                               return_value=[0]) as get_many:
+            for _ in range(10):
+                breaker.allow_request()
+        self.assertEqual(get_many.call_count, 1)
+
+    def test_backend_failure_is_ignored(self):
+        breaker = self._breaker()
+        with mock.patch.object(self.backend, "get_many",
+                               side_effect=IOError()):
+            self.assertTrue(breaker.allow_request())
+
+
+class SharedRetryBudgetTestCase(base.TestCase):
+
+    def setUp(self):
+        super(SharedRetryBudgetTestCase, self).setUp()
+        self.clock = clocks.VirtualClock(1000)
+        self.backend = shared.MemoryBackend(clock=self.clock)
+
+    def _budget(self):
+        return shared.SharedRetryBudget(
+            self.backend, "api", ratio=0.5, min_retries_per_second=0,
+            window=10, sync_interval=1, clock=self.clock)
+
+    def test_successes_of_other_processes_are_counted(self):
+        first, second = self._budget(), self._budget()
+        self.assertFalse(second.can_retry())
+
+        for _ in range(3):
+            first.deposit()
+        self.clock.advance(1)
+        first.deposit()
+
+        self.clock.advance(1)
+        self.assertTrue(second.try_withdraw())
+        self.assertTrue(second.try_withdraw())
+        self.assertFalse(second.try_withdraw())
+
+    def test_shared_totals_expire_when_backend_fails(self):
+        first, second = self._budget(), self._budget()
+        for _ in range(4):
+            first.deposit()
+        self.clock.advance(1)
+        first.deposit()
+        self.clock.advance(1)
+        self.assertTrue(second.can_retry())
+
+        with mock.patch.object(self.backend, "get_many",
+                               side_effect=IOError()):
+            self.clock.advance(9)
+            self.assertTrue(second.can_retry())
+            self.clock.advance(1)
+            self.assertFalse(second.can_retry())
+
+    def test_local_counters_expire_when_backend_fails(self):
+        budget = self._budget()
+        with mock.patch.object(self.backend, "incr", side_effect=IOError()):
+            for _ in range(4):
+                budget.deposit()
+            self.assertTrue(budget.can_retry())
+
+            self.clock.advance(10)
+            self.assertFalse(budget.can_retry())
+            budget.deposit()
+            budget.deposit()
+            self.assertTrue(budget.try_withdraw())
+            self.assertFalse(budget.try_withdraw())
+
+    def test_budget_with_policy(self):
+        budget = self._budget()
+        counter = mock.Mock(side_effect=SuperPuperException())
+
+        @decorators.retry(5, retry_budget=budget)
+        def function():
+            counter()
+
+        with self.clock.patch():
+            self.assertRaises(SuperPuperException, function)
+        self.assertEqual(counter.call_count, 1)
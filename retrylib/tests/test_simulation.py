@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from retrylib import circuit
+from retrylib import clocks
+from retrylib import decorators
+from retrylib import ratelimit
+from retrylib import simulation
+from retrylib.tests import base
+
+
+CALLS = 1000
+
+
+class FailureModelTestCase(base.TestCase):
+
+    def setUp(self):
+        super(FailureModelTestCase, self).setUp()
+        self.rng = random.Random(1)
+
+    def test_outage_windows(self):
+        model = simulation.OutageWindows([(20, 30), (0, 10)])
+
+        self.assertTrue(model.is_failure(5, self.rng))
+        self.assertFalse(model.is_failure(10, self.rng))
+        self.assertTrue(model.is_failure(25, self.rng))
+        self.assertFalse(model.is_failure(35, self.rng))
+
+    def test_failure_latency(self):
+        model = simulation.BernoulliFailures(1, latency=0.1,
+                                             failure_latency=5)
+
+        self.assertEqual(model.attempt(0, self.rng), (True, 5))
+
+    def test_latency_distributions(self):
+        lognormal = simulation.lognormal_latency(0.1, 0.5)
+        exponential = simulation.exponential_latency(0.1)
+
+        self.assertGreater(lognormal(self.rng), 0)
+        self.assertGreater(exponential(self.rng), 0)
+
+    def test_models_are_abstract(self):
+        self.assertRaises(TypeError, simulation.FailureModel)
+        self.assertRaises(TypeError, simulation.RandomFailures)
+
+    def test_replay_repeats_outcomes(self):
+        model = simulation.Replay([(True, 1), (False, 2)])
+
+        self.assertEqual([model.attempt(0, None) for _ in range(3)],
+                         [(True, 1), (False, 2), (True, 1)])
+        self.assertRaises(ValueError, simulation.Replay, [])
+
+
+class SimulateTestCase(base.TestCase):
+
+    def test_calls_without_failures(self):
+        policy = decorators.RetryPolicy(3, delay=1)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(0, latency=0.5),
+            calls=CALLS)
+
+        self.assertEqual(report.calls, CALLS)
+        self.assertEqual(report.successes, CALLS)
+        self.assertEqual(report.amplification, 1)
+        self.assertEqual(report.attempts_per_call, {1: CALLS})
+        self.assertEqual(report.percentile(99), 0.5)
+
+    def test_backoff_delays_are_simulated(self):
+        policy = decorators.RetryPolicy(3, delay=1, step=1)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(1, latency=0.5),
+            calls=CALLS)
+
+        self.assertEqual(report.failures, CALLS)
+        self.assertEqual(report.amplification, 3)
+        self.assertEqual(report.percentile(50), 0.5 * 3 + 1 + 2)
+
+    def test_replayed_failures(self):
+        policy = decorators.RetryPolicy(3, delay=1)
+        report = simulation.simulate(
+            policy, simulation.Replay([(True, 0), (False, 0)]), calls=CALLS)
+
+        self.assertEqual(report.successes, CALLS)
+        self.assertEqual(report.attempts_per_call, {2: CALLS})
+        self.assertEqual(report.percentile(100), 1)
+
+    def test_outage_is_retried_after_it_ends(self):
+        policy = decorators.RetryPolicy(2, delay=100)
+        report = simulation.simulate(
+            policy, simulation.OutageWindows([(0, 10)]), calls=20)
+
+        self.assertEqual(report.successes, 20)
+        self.assertEqual(report.attempts_per_call, {1: 10, 2: 10})
+
+    def test_amplification_of_random_failures(self):
+        policy = decorators.RetryPolicy(3)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(0.5), calls=CALLS * 10,
+            poisson=True, seed=1)
+
+        # 1 + 0.5 + 0.25 attempts per call are expected
+        self.assertAlmostEqual(report.amplification, 1.75, delta=0.05)
+        self.assertAlmostEqual(float(report.failures) / report.calls, 0.125,
+                               delta=0.02)
+
+    def test_results_are_reproducible(self):
+        policy = decorators.RetryPolicy(3, delay=1)
+        model = simulation.BernoulliFailures(
+            0.3, latency=simulation.exponential_latency(0.1))
+
+        self.assertEqual(
+            simulation.simulate(policy, model, CALLS, seed=1).as_dict(),
+            simulation.simulate(policy, model, CALLS, seed=1).as_dict())
+
+    def test_circuit_breaker_rejects_calls(self):
+        clock = clocks.VirtualClock()
+        breaker = circuit.CircuitBreaker(failure_threshold=2,
+                                         recovery_timeout=100, clock=clock)
+        policy = decorators.RetryPolicy(1, circuit_breaker=breaker)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(1), calls=10, clock=clock)
+
+        self.assertEqual(report.attempts_per_call, {1: 2, 0: 8})
+        self.assertEqual(report.attempts, 2)
+
+    def test_concurrent_calls_share_rate_limiter(self):
+        clock = clocks.VirtualClock()
+        limiter = ratelimit.RateLimiter(rate=1, clock=clock)
+        policy = decorators.RetryPolicy(3, rate_limiter=limiter)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(0), calls=5, interval=0,
+            clock=clock)
+
+        self.assertEqual(list(report.latencies), [0, 1, 2, 3, 4])
+
+    def test_time_isnt_patched_by_default(self):
+        monotonic = decorators.monotonic
+
+        class Model(simulation.BernoulliFailures):
+
+            def is_failure(test_model, now, rng):
+                self.assertIs(decorators.monotonic, monotonic)
+                return False
+
+        report = simulation.simulate(decorators.RetryPolicy(3), Model(0),
+                                     calls=1)
+
+        self.assertEqual(report.successes, 1)
+
+    def test_deadline_is_simulated_with_patched_clock(self):
+        policy = decorators.RetryPolicy(3, delay=1, deadline=5)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(1, latency=1.5), calls=10,
+            patch_clock=True)
+
+        self.assertEqual(report.attempts_per_call, {2: 10})
+
+    def test_clock_is_patched_for_deadline_by_default(self):
+        policy = decorators.RetryPolicy(10, delay=5, deadline=7)
+        report = simulation.simulate(
+            policy, simulation.BernoulliFailures(1.0), calls=10)
+
+        self.assertEqual(report.amplification, 3.0)
+        self.assertEqual(report.percentile(50), 7)
+
+    def test_no_calls(self):
+        report = simulation.simulate(decorators.RetryPolicy(3),
+                                     simulation.BernoulliFailures(0),
+                                     calls=0)
+
+        self.assertEqual(report.amplification, 0)
+        self.assertIsNone(report.percentile(50))
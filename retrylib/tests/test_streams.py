@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import mock
+
+from retrylib import decorators
+from retrylib import streams
+from retrylib.tests import base
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+def flaky_stream(fail_after=(), error=SuperPuperException):
+    """Returns generator function yielding numbers from start
+
+    It fails once after each item in fail_after. Python 2 can decorate
+    only functions with __name__, so it isn't a callable object.
+    """
+
+    def stream(start=0, stop=5):
+        stream.calls.append(start)
+        for number in range(start, stop):
+            if number in stream.fail_after:
+                stream.fail_after.remove(number)
+                raise error()
+            yield number
+
+    stream.fail_after = set(fail_after)
+    stream.calls = []
+    return stream
+
+
+@mock.patch('time.sleep')
+class StreamRetryTestCase(base.TestCase):
+
+    def test_stream_without_failures(self, sleep):
+        stream = flaky_stream()
+        function = decorators.RetryPolicy(3).wrap_stream(stream)
+
+        self.assertEqual(list(function()), [0, 1, 2, 3, 4])
+        self.assertEqual(stream.calls, [0])
+        self.assertFalse(sleep.called)
+
+    def test_stream_is_restarted_skipping_yielded_items(self, sleep):
+        stream = flaky_stream(fail_after=[3])
+        function = decorators.RetryPolicy(3, delay=1).wrap_stream(stream)
+
+        self.assertEqual(list(function()), [0, 1, 2, 3, 4])
+        self.assertEqual(stream.calls, [0, 0])
+        sleep.assert_called_once_with(1)
+
+    def test_recovered_stream_succeeds_once(self, sleep):
+        stream = flaky_stream(fail_after=[2])
+        listener = mock.Mock()
+        policy = decorators.RetryPolicy(3, listeners=[listener])
+
+        @policy.wrap_stream
+        def function():
+            return stream()
+
+        self.assertEqual(list(function()), [0, 1, 2, 3, 4])
+        self.assertEqual(listener.on_attempt.call_count, 2)
+        self.assertEqual(listener.on_retry.call_count, 1)
+        self.assertEqual(listener.on_success.call_count, 1)
+        self.assertFalse(listener.on_giveup.called)
+
+    def test_stream_is_resumed_from_last_item(self, sleep):
+        stream = flaky_stream(fail_after=[2, 4])
+        policy = decorators.RetryPolicy(2)
+
+        @streams.retry_stream(
+            policy, resume=streams.resume_from("start", lambda n: n + 1))
+        def function(start=0):
+            return stream(start)
+
+        self.assertEqual(list(function()), [0, 1, 2, 3, 4])
+        self.assertEqual(stream.calls, [0, 2, 4])
+
+    def test_attempts_are_exhausted_without_progress(self, sleep):
+        stream = flaky_stream()
+        stream.fail_after = mock.MagicMock()
+        stream.fail_after.__contains__.return_value = True
+        function = decorators.RetryPolicy(3).wrap_stream(stream)
+
+        self.assertRaises(SuperPuperException, list, function())
+        self.assertEqual(len(stream.calls), 3)
+
+    def test_not_retriable_error(self, sleep):
+        stream = flaky_stream(fail_after=[1], error=ValueError)
+        function = decorators.RetryPolicy(
+            3, retry_on=SuperPuperException).wrap_stream(stream)
+        iterator = function()
+
+        self.assertEqual(next(iterator), 0)
+        self.assertRaises(ValueError, next, iterator)
+
+    def test_error_thrown_by_consumer_is_not_retried(self, sleep):
+        stream = flaky_stream()
+        function = decorators.RetryPolicy(3).wrap_stream(stream)
+        iterator = function()
+        next(iterator)
+
+        self.assertRaises(SuperPuperException, iterator.throw,
+                          SuperPuperException())
+        self.assertEqual(stream.calls, [0])
+
+    def test_zero_attempts(self, sleep):
+        stream = flaky_stream()
+        function = decorators.RetryPolicy(0).wrap_stream(stream)
+
+        self.assertEqual(list(function()), [])
+        self.assertEqual(stream.calls, [])
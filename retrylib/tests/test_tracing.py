@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from retrylib import decorators
+from retrylib.tests import base
+from retrylib import tracing
+
+
+class SuperPuperException(Exception):
+    pass
+
+
+@mock.patch('time.sleep')
+class TracingListenerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(TracingListenerTestCase, self).setUp()
+        self.exporter = tracing.InMemoryExporter()
+        self.listener = tracing.TracingListener(self.exporter)
+
+    def test_spans_of_retried_call(self, sleep):
+        counter = mock.Mock(side_effect=[SuperPuperException("boom"), "OK"])
+
+        @decorators.retry(3, delay=2, listeners=[self.listener])
+        def function():
+            return counter()
+
+        function()
+
+        first, second, call = self.exporter.spans
+        self.assertEqual(call.name, tracing.CALL_SPAN)
+        self.assertIsNone(call.parent)
+        self.assertEqual(call.attributes["retry.outcome"], tracing.SUCCESS)
+        self.assertEqual(call.attributes["retry.attempts"], 2)
+        self.assertEqual(call.attributes["retry.total_delay"], 2)
+
+        self.assertEqual(first.parent_id, call.span_id)
+        self.assertEqual(first.attributes["retry.attempt"], 1)
+        self.assertEqual(first.attributes["retry.outcome"], tracing.RETRY)
+        self.assertEqual(first.attributes["exception.type"],
+                         "SuperPuperException")
+        self.assertNotIn("retry.delay", first.attributes)
+
+        self.assertEqual(second.parent_id, call.span_id)
+        self.assertEqual(second.attributes["retry.attempt"], 2)
+        self.assertEqual(second.attributes["retry.delay"], 2)
+        self.assertEqual(second.attributes["retry.outcome"],
+                         tracing.SUCCESS)
+
+    def test_spans_of_failed_call(self, sleep):
+
+        @decorators.retry(2, listeners=[self.listener])
+        def function():
+            raise SuperPuperException()
+
+        self.assertRaises(SuperPuperException, function)
+
+        spans = self.exporter.spans
+        self.assertEqual([span.attributes["retry.outcome"] for span in spans],
+                         [tracing.RETRY, tracing.GIVEUP, tracing.GIVEUP])
+        self.assertEqual(spans[-1].attributes["exception.type"],
+                         "SuperPuperException")
+        self.assertIsInstance(spans[-1].error, SuperPuperException)
+
+    def test_nested_calls(self, sleep):
+
+        @decorators.retry(2, listeners=[self.listener])
+        def inner():
+            return "OK"
+
+        @decorators.retry(2, listeners=[self.listener])
+        def outer():
+            return inner()
+
+        outer()
+
+        inner_attempt, inner_call, outer_attempt, outer_call = (
+            self.exporter.spans)
+        self.assertEqual(inner_call.parent_id, outer_attempt.span_id)
+        self.assertIsNone(outer_call.parent)
+
+    def test_detached_call(self, sleep):
+        policy = decorators.RetryPolicy(2, listeners=[self.listener])
+
+        @decorators.retry(2, listeners=[self.listener])
+        def inner():
+            return "OK"
+
+        @decorators.retry(2, listeners=[self.listener])
+        def outer():
+            started, state = tracing.run_detached(policy.start_call, len,
+                                                  (), {})
+            inner()
+            state.on_success()
+
+        outer()
+
+        (inner_attempt, inner_call, detached_attempt, detached_call,
+         outer_attempt, outer_call) = self.exporter.spans
+        self.assertIsNone(detached_call.parent)
+        self.assertEqual(inner_call.parent_id, outer_attempt.span_id)
+
+    def test_opentelemetry_exporter(self, sleep):
+        otel_trace = mock.Mock()
+        tracer = mock.Mock()
+        with mock.patch.object(tracing, "otel_trace", otel_trace), \
+                mock.patch.object(tracing, "otel_context") as otel_context:
+            listener = tracing.TracingListener(
+                tracing.OpenTelemetryExporter(tracer))
+
+            @decorators.retry(2, listeners=[listener])
+            def function():
+                raise SuperPuperException()
+
+            self.assertRaises(SuperPuperException, function)
+
+        self.assertEqual(tracer.start_span.call_count, 3)
+        self.assertEqual(otel_context.attach.call_count, 2)
+        self.assertEqual(otel_context.detach.call_count, 2)
+        call_span = tracer.start_span.return_value
+        self.assertEqual(call_span.end.call_count, 3)
+        call_span.record_exception.assert_called_with(mock.ANY)
+
+
+class TracingDisabledTestCase(base.TestCase):
+
+    def test_fast_path_without_listeners(self):
+
+        @decorators.retry(3)
+        def function():
+            return "OK"
+
+        with mock.patch.object(decorators.RetryPolicy, "call") as call:
+            self.assertEqual(function(), "OK")
+        self.assertFalse(call.called)
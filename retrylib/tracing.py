@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Sergey Bunatyan <sergey.bunatyan@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracing spans of retried calls
+
+TracingListener is a listener emitting a span per retried call and a
+child span per attempt. Gaps between attempt spans are backoff delays,
+they are also recorded as retry.delay attribute of the next attempt.
+Spans are passed to exporter: InMemoryExporter keeps them for tests,
+OpenTelemetryExporter recreates them with OpenTelemetry tracer.
+
+Calls of functions decorated without listeners aren't traced and pay
+nothing for it.
+"""
+
+import itertools
+import threading
+import time
+import weakref
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_context = otel_trace = None
+
+from retrylib import listeners
+
+
+CALL_SPAN = "retry"
+ATTEMPT_SPAN = "retry.attempt"
+
+SUCCESS = "success"
+RETRY = "retry"
+GIVEUP = "giveup"
+
+_span_ids = itertools.count(1)
+
+# Threads starting calls detached from running ones
+_detached = threading.local()
+
+
+def run_detached(func, *args):
+    """Calls func(*args) hiding running calls from TracingListener
+
+    Calls started by func get no parent and aren't seen as running
+    afterwards, as if func is called in another thread or asyncio task.
+    It is used by RetryingExecutor, whose attempts don't run in the
+    caller's context. func must not switch asyncio tasks.
+    """
+    _detached.depth = getattr(_detached, "depth", 0) + 1
+    try:
+        return func(*args)
+    finally:
+        _detached.depth -= 1
+
+
+class Span(object):
+    """Finished or running span
+
+    @ivar start_time, end_time: wall clock time in seconds
+    """
+
+    __slots__ = ("span_id", "name", "parent", "start_time", "end_time",
+                 "attributes", "error", "context")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.span_id = next(_span_ids)
+        self.name = name
+        self.parent = parent
+        self.start_time = time.time()
+        self.end_time = None
+        self.attributes = dict(attributes or ())
+        self.error = None
+        # Exporter specific data
+        self.context = None
+
+    @property
+    def parent_id(self):
+        return None if self.parent is None else self.parent.span_id
+
+    @property
+    def duration(self):
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def end(self, outcome, error=None):
+        self.end_time = time.time()
+        self.attributes["retry.outcome"] = outcome
+        if error is not None:
+            self.error = error
+            self.attributes["exception.type"] = error.__class__.__name__
+            self.attributes["exception.message"] = str(error)
+
+    def __repr__(self):
+        return "Span(%r, span_id=%r, parent_id=%r, attributes=%r)" % (
+            self.name, self.span_id, self.parent_id, self.attributes)
+
+
+class SpanExporter(object):
+    """Base exporter, spans are ignored"""
+
+    def on_start(self, span):
+        """Span has been started"""
+
+    def on_end(self, span):
+        """Span has been finished, attempts finish before their call"""
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in order of finishing"""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def on_end(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            del self.spans[:]
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """Recreates spans with OpenTelemetry tracer
+
+    Call spans are children of the span current when call starts, attempt
+    spans are made current while attempts run, so spans of instrumented
+    libraries used by function become their children.
+    """
+
+    def __init__(self, tracer=None):
+        """Creates exporter starting spans with OpenTelemetry tracer
+
+        @param tracer: opentelemetry.trace.Tracer
+                       (default: tracer named retrylib)
+        """
+        if otel_trace is None:
+            raise ImportError("opentelemetry-api is required")
+        self.tracer = tracer or otel_trace.get_tracer("retrylib")
+
+    def on_start(self, span):
+        context = None
+        if span.parent is not None:
+            context = otel_trace.set_span_in_context(span.parent.context[0])
+        native = self.tracer.start_span(
+            span.name, context=context,
+            start_time=int(span.start_time * 1e9))
+        token = None
+        if span.parent is not None:
+            token = otel_context.attach(
+                otel_trace.set_span_in_context(native))
+        span.context = (native, token)
+
+    def on_end(self, span):
+        native, token = span.context
+        if token is not None:
+            otel_context.detach(token)
+        native.set_attributes(span.attributes)
+        if span.error is not None and span.attributes.get(
+                "retry.outcome") == GIVEUP:
+            native.record_exception(span.error)
+            native.set_status(otel_trace.Status(
+                otel_trace.StatusCode.ERROR, str(span.error)))
+        native.end(end_time=int(span.end_time * 1e9))
+
+
+class _Call(object):
+
+    __slots__ = ("span", "attempt_span", "delay", "total_delay")
+
+    def __init__(self, span):
+        self.span = span
+        self.attempt_span = None
+        self.delay = None
+        self.total_delay = 0
+
+    @property
+    def finished(self):
+        return self.span.end_time is not None
+
+
+class TracingListener(listeners.RetryListener):
+    """Emits span per retried call and child span per attempt
+
+    Calls are tracked by RetryEvent.call, so their events may be delivered
+    in any thread, e.g. by RetryingExecutor callbacks. Call span is a child
+    of the attempt running in the thread or asyncio task where the call
+    starts, calls submitted to RetryingExecutor have no parent.
+    """
+
+    def __init__(self, exporter):
+        """Creates listener sending spans of calls to exporter
+
+        @param exporter: SpanExporter
+        """
+        self.exporter = exporter
+        # Calls that are never finished (e.g. cancelled) are forgotten with
+        # their RetryState
+        self._calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        if contextvars is not None:
+            self._running = contextvars.ContextVar(
+                "retrylib_calls_%x" % id(self), default=())
+        else:
+            self._local = threading.local()
+
+    def _get_running(self):
+        if contextvars is not None:
+            return self._running.get()
+        return getattr(self._local, "calls", ())
+
+    def _set_running(self, calls):
+        if contextvars is not None:
+            self._running.set(calls)
+        else:
+            self._local.calls = calls
+
+    def _start(self, name, parent, attributes):
+        span = Span(name, parent, attributes)
+        self.exporter.on_start(span)
+        return span
+
+    def _end(self, span, outcome, error=None):
+        span.end(outcome, error)
+        self.exporter.on_end(span)
+
+    def _start_call(self, event):
+        detached = getattr(_detached, "depth", 0)
+        # Calls finished in another thread or task are still here
+        running = () if detached else tuple(
+            call for call in self._get_running() if not call.finished)
+        parent = None
+        if running:
+            # Call is made by an attempt of another retried call
+            parent = running[-1].attempt_span or running[-1].span
+        call = _Call(self._start(CALL_SPAN, parent,
+                                 {"retry.function": event.func_name}))
+        if not detached:
+            self._set_running(running + (call, ))
+        with self._lock:
+            self._calls[event.call] = call
+        return call
+
+    def _get_call(self, event):
+        if event.call is None:
+            return None
+        with self._lock:
+            return self._calls.get(event.call)
+
+    def on_attempt(self, event):
+        if event.call is None:
+            return
+        call = self._get_call(event)
+        if call is None:
+            call = self._start_call(event)
+        elif call.attempt_span is not None:
+            # Previous attempt has been interrupted without on_retry
+            self._end(call.attempt_span, RETRY)
+        attributes = {"retry.function": event.func_name,
+                      "retry.attempt": event.attempt}
+        if call.delay is not None:
+            attributes["retry.delay"] = call.delay
+        call.attempt_span = self._start(ATTEMPT_SPAN, call.span, attributes)
+
+    def on_retry(self, event):
+        call = self._get_call(event)
+        if call is None:
+            return
+        call.delay = event.delay
+        call.total_delay += event.delay
+        if call.attempt_span is not None:
+            self._end(call.attempt_span, RETRY, event.error)
+            call.attempt_span = None
+
+    def on_success(self, event):
+        self._finish(event, SUCCESS)
+
+    def on_giveup(self, event):
+        self._finish(event, GIVEUP)
+
+    def _finish(self, event, outcome):
+        if event.call is None:
+            return
+        with self._lock:
+            call = self._calls.pop(event.call, None)
+        if call is None:
+            return
+        if call.attempt_span is not None:
+            self._end(call.attempt_span, outcome, event.error)
+            call.attempt_span = None
+        call.span.attributes["retry.attempts"] = event.attempt
+        call.span.attributes["retry.total_delay"] = call.total_delay
+        self._end(call.span, outcome, event.error)
+        running = self._get_running()
+        if call in running:
+            self._set_running(tuple(c for c in running if c is not call))